@@ -1,6 +1,8 @@
 # app/app.py
 
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI
@@ -12,14 +14,160 @@ from fastapi.staticfiles import StaticFiles
 from app.routers.agent import router as image_processor
 # TODO 8: Importar el router file_info
 from app.routers import file_info
+from app.routers.jobs import router as jobs_router
+from app.constants import Constants
+from app.middleware.body_limits import BodyLimit, BodyLimitMiddleware
+from app.middleware.request_id import REQUEST_ID_HEADER, RequestIdMiddleware
+from app.services.ai_service import GeminiService
+from app.services.cache_service import ExtractionCache
+from app.services.hedging import HedgePolicy
+from app.services.image_preprocessing import ImagePreprocessor
+from app.services.job_service import JobStore, JobWorkerPool
+from app.services.json_codec import FastJSONResponse
+from app.services.logging_service import ParrotLogger as appLogger
+from app.services.model_cascade import ModelCascade
+from app.services.near_duplicates import NearDuplicateIndex
+from app.services.pdf_splitter import PdfSplitter
+from app.services.rate_limiter import AdaptiveLimiter, RetryPolicy
+from app.services.singleflight import SingleFlight
+from app.services.upload_service import (
+    JSON_CONTENT_TYPE,
+    MULTIPART_CONTENT_TYPE,
+    OCTET_STREAM_CONTENT_TYPE,
+)
+
+
+def _log_task_error(logger, task: asyncio.Task, description: str):
+    """Registra la excepcion de una tarea en segundo plano (si no se cancelo)"""
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(
+            f"{description} failed: {task.exception()}",
+            logger_name="App"
+        )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Crea los recursos compartidos del proceso al arrancar.
+
+    Se instancia un unico GeminiService (con su cliente y pool HTTP) que
+    reutilizan todas las peticiones a traves de ``get_gemini_service``.
+    """
+    logger = appLogger(name="image_processor")
+    cache = ExtractionCache(logger) if Constants.CACHE_ENABLED else None
+    single_flight = SingleFlight(logger) if Constants.SINGLE_FLIGHT_ENABLED else None
+    limiter = AdaptiveLimiter(logger) if Constants.LIMITER_ENABLED else None
+    preprocessor = ImagePreprocessor(logger) if Constants.PREPROCESS_ENABLED else None
+    try:
+        app.state.gemini_service = GeminiService(
+            logger,
+            cache=cache,
+            single_flight=single_flight,
+            limiter=limiter,
+            retry_policy=RetryPolicy(logger),
+            preprocessor=preprocessor,
+            pdf_splitter=PdfSplitter(logger) if Constants.PDF_SPLIT_ENABLED else None,
+            cascade=ModelCascade(logger) if Constants.GEMINI_MODEL_CASCADE else None,
+            hedging=HedgePolicy(logger) if Constants.HEDGING_ENABLED else None,
+            near_duplicates=(
+                NearDuplicateIndex(logger)
+                if Constants.NEAR_DUPLICATE_ENABLED and cache is not None else None
+            ),
+        )
+    except Exception as e:
+        # El servicio arranca igualmente; los endpoints de Gemini devolveran 503
+        logger.error(
+            f"Gemini service unavailable, Gemini endpoints disabled: {e}",
+            logger_name="App"
+        )
+        app.state.gemini_service = None
+    
+    app.state.prompt_warm_up = None
+    if app.state.gemini_service is not None:
+        # Registro en segundo plano de la cache de contexto del prompt por defecto.
+        # Se guarda la tarea para que no la recoja el GC y poder cancelarla al parar
+        app.state.prompt_warm_up = asyncio.create_task(
+            app.state.gemini_service.prompt_registry.warm_up()
+        )
+        app.state.prompt_warm_up.add_done_callback(
+            lambda task: _log_task_error(logger, task, "Prompt cache warm-up")
+        )
+    
+    # Cola persistente de trabajos: al arrancar se retoman los pendientes
+    job_store = None
+    app.state.job_pool = None
+    if Constants.JOBS_ENABLED and app.state.gemini_service is not None:
+        try:
+            job_store = JobStore(logger)
+        except Exception as e:
+            # Sin disco escribible (p. ej. sistema de ficheros de solo lectura)
+            # la API arranca igualmente; /v1/jobs devolvera 503
+            logger.error(
+                f"Job store unavailable, /v1/jobs disabled: {e}",
+                logger_name="App"
+            )
+        else:
+            app.state.job_pool = JobWorkerPool(logger, job_store, app.state.gemini_service)
+            app.state.job_pool.start()
+    yield
+    if app.state.job_pool is not None:
+        await app.state.job_pool.stop()
+        app.state.job_pool = None
+    if job_store is not None:
+        job_store.close()
+    if app.state.prompt_warm_up is not None:
+        app.state.prompt_warm_up.cancel()
+        await asyncio.gather(app.state.prompt_warm_up, return_exceptions=True)
+        app.state.prompt_warm_up = None
+    if app.state.gemini_service is not None:
+        await app.state.gemini_service.close()
+    app.state.gemini_service = None
+    if cache is not None:
+        cache.close()
+    if preprocessor is not None:
+        preprocessor.close()
+    # Escribir los logs que queden en la cola antes de salir
+    appLogger.shutdown()
 
 
 app = FastAPI(
     title="MAPFRE - Image Processing API",
     description="API for extracting information from images using Gemini",
     version="1.0.0",
+    lifespan=lifespan,
+    # Respuestas serializadas con orjson (libreria estandar si no esta instalado)
+    default_response_class=FastJSONResponse,
 )
 
+# Límites de tamaño y tipo del cuerpo, antes de leerlo (413 / 415)
+# Se añade antes que CORS para que los rechazos lleven también las cabeceras CORS
+if Constants.BODY_LIMITS_ENABLED:
+    upload_limits = BodyLimit({
+        JSON_CONTENT_TYPE: Constants.MAX_JSON_BODY_BYTES,
+        MULTIPART_CONTENT_TYPE: Constants.MAX_UPLOAD_BYTES,
+        OCTET_STREAM_CONTENT_TYPE: Constants.MAX_UPLOAD_BYTES,
+    })
+    json_limits = BodyLimit({JSON_CONTENT_TYPE: Constants.MAX_JSON_BODY_BYTES})
+    app.add_middleware(
+        BodyLimitMiddleware,
+        limits={
+            "/v1/image/process-image": upload_limits,
+            "/v1/image/process-image/stream": json_limits,
+            "/v1/image/process-batch": BodyLimit({JSON_CONTENT_TYPE: Constants.MAX_BATCH_BODY_BYTES}),
+            "/v1/jobs": json_limits,
+            "/v1/files/get-info": upload_limits,
+        },
+        default=BodyLimit({
+            JSON_CONTENT_TYPE: Constants.MAX_DEFAULT_BODY_BYTES,
+            MULTIPART_CONTENT_TYPE: Constants.MAX_DEFAULT_BODY_BYTES,
+            OCTET_STREAM_CONTENT_TYPE: Constants.MAX_DEFAULT_BODY_BYTES,
+            "application/x-www-form-urlencoded": Constants.MAX_DEFAULT_BODY_BYTES,
+            "": Constants.MAX_DEFAULT_BODY_BYTES,
+        }),
+        logger=appLogger(name="image_processor"),
+    )
+
 # Añadimos CORS ya que se necesita para poder hacer peticiones
 app.add_middleware(
     CORSMiddleware,
@@ -27,10 +175,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[REQUEST_ID_HEADER],
 )
 
+# El request ID se asigna lo primero para que todos los logs (y los rechazos) lo lleven
+app.add_middleware(RequestIdMiddleware)
+
 # Incluimos los routers
 app.include_router(image_processor, prefix="/v1/image")
+app.include_router(jobs_router, prefix="/v1/jobs")
 # Incluimos los routers de file_info
 # TODO 9: Registrar el router en la aplicación y añade el  prefix="/v1/files"
 app.include_router(file_info.router, prefix="/v1/files")
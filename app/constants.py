@@ -110,6 +110,163 @@ class Constants:
     GEMINI_API_KEY: str = os.environ.get("GEMINI_API_KEY")
     GEMINI_MODEL: str = os.environ.get("GEMINI_MODEL")
     
+    # Backend del modelo: "gemini" o "fake" (local, sin red, para carga/CI)
+    MODEL_BACKEND: str = os.environ.get("MODEL_BACKEND", "gemini").lower()
+    FAKE_BACKEND_LATENCY_MS: float = float(os.environ.get("FAKE_BACKEND_LATENCY_MS", "1500"))
+    FAKE_BACKEND_LATENCY_DISTRIBUTION: str = os.environ.get("FAKE_BACKEND_LATENCY_DISTRIBUTION", "lognormal")
+    FAKE_BACKEND_LATENCY_SIGMA: float = float(os.environ.get("FAKE_BACKEND_LATENCY_SIGMA", "0.4"))
+    FAKE_BACKEND_ERROR_RATE: float = float(os.environ.get("FAKE_BACKEND_ERROR_RATE", "0"))
+    FAKE_BACKEND_RATE_LIMIT_RATE: float = float(os.environ.get("FAKE_BACKEND_RATE_LIMIT_RATE", "0"))
+    FAKE_BACKEND_SEED: int = int(os.environ.get("FAKE_BACKEND_SEED", "42"))
+    FAKE_BACKEND_RESPONSE_PATH: str = os.environ.get("FAKE_BACKEND_RESPONSE_PATH", "")
+    
+    # Pool HTTP compartido del cliente Gemini (keep-alive)
+    GEMINI_HTTP_MAX_CONNECTIONS: int = int(os.environ.get("GEMINI_HTTP_MAX_CONNECTIONS", "100"))
+    GEMINI_HTTP_MAX_KEEPALIVE: int = int(os.environ.get("GEMINI_HTTP_MAX_KEEPALIVE", "20"))
+    GEMINI_HTTP_KEEPALIVE_EXPIRY: float = float(os.environ.get("GEMINI_HTTP_KEEPALIVE_EXPIRY", "60"))
+    GEMINI_HTTP_TIMEOUT_MS: int = int(os.environ.get("GEMINI_HTTP_TIMEOUT_MS", "120000"))
+    
+    # Cache de contexto de Gemini para el prompt por defecto
+    CONTEXT_CACHE_ENABLED: bool = os.environ.get("CONTEXT_CACHE_ENABLED", "false").lower() == "true"
+    CONTEXT_CACHE_TTL_SECONDS: int = int(os.environ.get("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+    
+    # Cascada de modelos: lista separada por comas, del mas barato al mas capaz.
+    # Vacia = solo GEMINI_MODEL
+    GEMINI_MODEL_CASCADE: list = [
+        model.strip()
+        for model in os.environ.get("GEMINI_MODEL_CASCADE", "").split(",")
+        if model.strip()
+    ]
+    CASCADE_REQUIRED_FIELDS: list = [
+        field.strip()
+        for field in os.environ.get(
+            "CASCADE_REQUIRED_FIELDS",
+            "filiacion_asegurado,numero_documento,Profesional_prescriptor,prescripcion,fecha_realizacion,origen_patologia"
+        ).split(",")
+        if field.strip()
+    ]
+    CASCADE_MAX_NULL_FIELDS: int = int(os.environ.get("CASCADE_MAX_NULL_FIELDS", "2"))
+    # Vacio = sin umbral de confianza (avg_logprobs)
+    CASCADE_MIN_AVG_LOGPROBS: float = (
+        float(os.environ["CASCADE_MIN_AVG_LOGPROBS"])
+        if os.environ.get("CASCADE_MIN_AVG_LOGPROBS") else None
+    )
+    
+    # Hedging: segunda llamada si la primera supera el percentil de latencia reciente
+    HEDGING_ENABLED: bool = os.environ.get("HEDGING_ENABLED", "false").lower() == "true"
+    HEDGE_PERCENTILE: float = float(os.environ.get("HEDGE_PERCENTILE", "95"))
+    HEDGE_MIN_DELAY_MS: float = float(os.environ.get("HEDGE_MIN_DELAY_MS", "500"))
+    # Llamadas extra permitidas por llamada (0.05 = como mucho un 5% mas de gasto)
+    HEDGE_BUDGET_RATIO: float = float(os.environ.get("HEDGE_BUDGET_RATIO", "0.05"))
+    HEDGE_BUDGET_BURST: float = float(os.environ.get("HEDGE_BUDGET_BURST", "10"))
+    HEDGE_MIN_SAMPLES: int = int(os.environ.get("HEDGE_MIN_SAMPLES", "20"))
+    HEDGE_WINDOW: int = int(os.environ.get("HEDGE_WINDOW", "200"))
+    
+    # Plazo total por extraccion (incluye cola y reintentos)
+    GEMINI_REQUEST_DEADLINE_SECONDS: float = float(os.environ.get("GEMINI_REQUEST_DEADLINE_SECONDS", "120"))
+    
+    # Reintentos ante errores transitorios de Gemini (429/5xx)
+    GEMINI_RETRY_MAX_ATTEMPTS: int = int(os.environ.get("GEMINI_RETRY_MAX_ATTEMPTS", "4"))
+    GEMINI_RETRY_BASE_DELAY: float = float(os.environ.get("GEMINI_RETRY_BASE_DELAY", "0.5"))
+    GEMINI_RETRY_MAX_DELAY: float = float(os.environ.get("GEMINI_RETRY_MAX_DELAY", "8"))
+    
+    # Limitador adaptativo de concurrencia hacia Gemini (AIMD)
+    LIMITER_ENABLED: bool = os.environ.get("LIMITER_ENABLED", "true").lower() == "true"
+    LIMITER_INITIAL: int = int(os.environ.get("LIMITER_INITIAL", "16"))
+    LIMITER_MIN: int = int(os.environ.get("LIMITER_MIN", "1"))
+    LIMITER_MAX: int = int(os.environ.get("LIMITER_MAX", "64"))
+    LIMITER_BACKOFF_RATIO: float = float(os.environ.get("LIMITER_BACKOFF_RATIO", "0.5"))
+    LIMITER_LATENCY_TOLERANCE: float = float(os.environ.get("LIMITER_LATENCY_TOLERANCE", "2.0"))
+    
+    # Preprocesado de imagenes antes de enviarlas a Gemini
+    PREPROCESS_ENABLED: bool = os.environ.get("PREPROCESS_ENABLED", "true").lower() == "true"
+    PREPROCESS_MAX_LONG_EDGE: int = int(os.environ.get("PREPROCESS_MAX_LONG_EDGE", "2048"))
+    PREPROCESS_GRAYSCALE: bool = os.environ.get("PREPROCESS_GRAYSCALE", "false").lower() == "true"
+    PREPROCESS_JPEG_QUALITY: int = int(os.environ.get("PREPROCESS_JPEG_QUALITY", "85"))
+    PREPROCESS_WORKERS: int = int(os.environ.get("PREPROCESS_WORKERS", "4"))
+    
+    # Division de PDFs multipagina en rangos extraidos en paralelo. Opcional:
+    # cada rango es una llamada al modelo (menos latencia, mas coste)
+    PDF_SPLIT_ENABLED: bool = os.environ.get("PDF_SPLIT_ENABLED", "false").lower() == "true"
+    PDF_PAGES_PER_CHUNK: int = int(os.environ.get("PDF_PAGES_PER_CHUNK", "1"))
+    PDF_MAX_PAGES: int = int(os.environ.get("PDF_MAX_PAGES", "50"))
+    
+    # Cache de resultados de extraccion
+    CACHE_ENABLED: bool = os.environ.get("CACHE_ENABLED", "true").lower() == "true"
+    CACHE_MAX_ENTRIES: int = int(os.environ.get("CACHE_MAX_ENTRIES", "1024"))
+    CACHE_TTL_SECONDS: float = float(os.environ.get("CACHE_TTL_SECONDS", "86400"))
+    CACHE_DISK_PATH: str = os.environ.get("CACHE_DISK_PATH", "")
+    CACHE_DISK_MAX_ENTRIES: int = int(os.environ.get("CACHE_DISK_MAX_ENTRIES", "100000"))
+    
+    # Agrupacion de extracciones identicas en vuelo
+    SINGLE_FLIGHT_ENABLED: bool = os.environ.get("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+    
+    # Procesamiento por lotes (/v1/image/process-batch)
+    BATCH_MAX_ITEMS: int = int(os.environ.get("BATCH_MAX_ITEMS", "500"))
+    BATCH_DEFAULT_CONCURRENCY: int = int(os.environ.get("BATCH_DEFAULT_CONCURRENCY", "8"))
+    BATCH_MAX_CONCURRENCY: int = int(os.environ.get("BATCH_MAX_CONCURRENCY", "32"))
+    
+    # Cola de trabajos asincronos (/v1/jobs)
+    JOBS_ENABLED: bool = os.environ.get("JOBS_ENABLED", "true").lower() == "true"
+    JOBS_DB_PATH: str = os.environ.get("JOBS_DB_PATH", "data/jobs.sqlite")
+    JOBS_WORKERS: int = int(os.environ.get("JOBS_WORKERS", "4"))
+    JOBS_POLL_INTERVAL: float = float(os.environ.get("JOBS_POLL_INTERVAL", "2"))
+    JOBS_LEASE_SECONDS: float = float(os.environ.get("JOBS_LEASE_SECONDS", "600"))
+    JOBS_MAX_ATTEMPTS: int = int(os.environ.get("JOBS_MAX_ATTEMPTS", "3"))
+    # Espera antes de reintentar un trabajo si Gemini no esta disponible (se dobla en cada intento)
+    JOBS_RETRY_DELAY_SECONDS: float = float(os.environ.get("JOBS_RETRY_DELAY_SECONDS", "30"))
+    JOBS_RETENTION_SECONDS: float = float(os.environ.get("JOBS_RETENTION_SECONDS", "86400"))
+    
+    # Subidas application/octet-stream: bytes en memoria antes de volcar a disco
+    # (multipart usa el spool de Starlette, 1 MB)
+    UPLOAD_SPOOL_MAX_MEMORY: int = int(os.environ.get("UPLOAD_SPOOL_MAX_MEMORY", str(1024 * 1024)))
+    
+    # Deteccion de casi-duplicados (otra foto o escaneo del mismo volante) por
+    # hash perceptual de NEAR_DUPLICATE_HASH_SIZE^2 bits. Con
+    # NEAR_DUPLICATE_SERVE se responde con el resultado anterior sin llamar al
+    # modelo (solo a NEAR_DUPLICATE_SERVE_MAX_DISTANCE bits o menos y con la
+    # imagen del mismo tamano); si no, solo se marca en la respuesta
+    NEAR_DUPLICATE_ENABLED: bool = os.environ.get("NEAR_DUPLICATE_ENABLED", "false").lower() == "true"
+    NEAR_DUPLICATE_HASH_SIZE: int = int(os.environ.get("NEAR_DUPLICATE_HASH_SIZE", "16"))
+    NEAR_DUPLICATE_MAX_DISTANCE: int = int(os.environ.get("NEAR_DUPLICATE_MAX_DISTANCE", "24"))
+    NEAR_DUPLICATE_SERVE_MAX_DISTANCE: int = int(os.environ.get("NEAR_DUPLICATE_SERVE_MAX_DISTANCE", "4"))
+    NEAR_DUPLICATE_MAX_ENTRIES: int = int(os.environ.get("NEAR_DUPLICATE_MAX_ENTRIES", "1000000"))
+    NEAR_DUPLICATE_SERVE: bool = os.environ.get("NEAR_DUPLICATE_SERVE", "false").lower() == "true"
+    
+    # Limites del cuerpo de las peticiones (413 si se superan, 415 si el
+    # Content-Type no se admite). El JSON lleva el archivo en Base64 (~4/3)
+    BODY_LIMITS_ENABLED: bool = os.environ.get("BODY_LIMITS_ENABLED", "true").lower() == "true"
+    MAX_UPLOAD_BYTES: int = int(os.environ.get("MAX_UPLOAD_BYTES", str(20 * 1024 * 1024)))
+    MAX_JSON_BODY_BYTES: int = int(os.environ.get("MAX_JSON_BODY_BYTES", str(28 * 1024 * 1024)))
+    MAX_BATCH_BODY_BYTES: int = int(os.environ.get("MAX_BATCH_BODY_BYTES", str(200 * 1024 * 1024)))
+    # Resto de rutas con cuerpo
+    MAX_DEFAULT_BODY_BYTES: int = int(os.environ.get("MAX_DEFAULT_BODY_BYTES", str(1024 * 1024)))
+    
+    # Envio a Kinesis Firehose por lotes (put_record_batch) en segundo plano.
+    # Firehose admite como maximo 500 registros y 4 MiB por lote
+    FIREHOSE_BATCH_MAX_RECORDS: int = int(os.environ.get("FIREHOSE_BATCH_MAX_RECORDS", "500"))
+    FIREHOSE_BATCH_MAX_BYTES: int = int(os.environ.get("FIREHOSE_BATCH_MAX_BYTES", str(4 * 1024 * 1024)))
+    FIREHOSE_FLUSH_INTERVAL: float = float(os.environ.get("FIREHOSE_FLUSH_INTERVAL", "1"))
+    FIREHOSE_MAX_QUEUE_RECORDS: int = int(os.environ.get("FIREHOSE_MAX_QUEUE_RECORDS", "20000"))
+    FIREHOSE_MAX_ATTEMPTS: int = int(os.environ.get("FIREHOSE_MAX_ATTEMPTS", "5"))
+    # Spool en disco de los registros que no se han podido entregar; se
+    # reenvian a FIREHOSE_REPLAY_MAX_RECORDS_PER_SECOND cuando el stream vuelve
+    FIREHOSE_SPOOL_DIR: str = os.environ.get("FIREHOSE_SPOOL_DIR", "data/firehose_spool")
+    FIREHOSE_SPOOL_MAX_BYTES: int = int(os.environ.get("FIREHOSE_SPOOL_MAX_BYTES", str(512 * 1024 * 1024)))
+    FIREHOSE_SPOOL_SEGMENT_BYTES: int = int(os.environ.get("FIREHOSE_SPOOL_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+    FIREHOSE_SPOOL_FSYNC: bool = os.environ.get("FIREHOSE_SPOOL_FSYNC", "true").lower() == "true"
+    FIREHOSE_REPLAY_MAX_RECORDS_PER_SECOND: float = float(os.environ.get("FIREHOSE_REPLAY_MAX_RECORDS_PER_SECOND", "200"))
+    
     # Configuracion de logging
     LOG_LEVEL: str = os.environ.get("LOG_LEVEL", "INFO")
+    # Logs por cola: un hilo formatea y escribe, la peticion solo encola.
+    # LOG_QUEUE_OVERFLOW con la cola llena: drop_debug_first (se descartan
+    # DEBUG y despues INFO; WARNING/ERROR esperan) o block (todos esperan)
+    LOG_QUEUE_ENABLED: bool = os.environ.get("LOG_QUEUE_ENABLED", "true").lower() == "true"
+    LOG_QUEUE_MAX_SIZE: int = int(os.environ.get("LOG_QUEUE_MAX_SIZE", "10000"))
+    LOG_QUEUE_OVERFLOW: str = os.environ.get("LOG_QUEUE_OVERFLOW", "drop_debug_first")
+    # text (formato de siempre) o json (un objeto por linea)
+    LOG_FORMAT: str = os.environ.get("LOG_FORMAT", "text").lower()
+    # Muestreo, p.ej. "DEBUG=0,INFO=0.1,Gemini_Service:INFO=0.5" (vacio = todo)
+    LOG_SAMPLE_RATES: str = os.environ.get("LOG_SAMPLE_RATES", "")
     
@@ -0,0 +1,45 @@
+"""
+Dependencias FastAPI compartidas por los routers
+"""
+from fastapi import HTTPException, Request
+
+from app.services.ai_service import GeminiService
+from app.services.job_service import JobWorkerPool
+
+
+def get_gemini_service(request: Request) -> GeminiService:
+    """
+    Devuelve el GeminiService compartido creado al arrancar la aplicacion
+
+    Args:
+        request: Request actual (da acceso a ``app.state``)
+
+    Returns:
+        GeminiService de proceso
+
+    Raises:
+        HTTPException: 503 si el cliente de Gemini no se pudo inicializar
+    """
+    gemini_service = getattr(request.app.state, "gemini_service", None)
+    if gemini_service is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Gemini service not available"
+        )
+    return gemini_service
+
+
+def get_job_pool(request: Request) -> JobWorkerPool:
+    """
+    Devuelve el pool de workers de la cola de trabajos
+
+    Raises:
+        HTTPException: 503 si la cola de trabajos esta desactivada
+    """
+    job_pool = getattr(request.app.state, "job_pool", None)
+    if job_pool is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Job queue not available"
+        )
+    return job_pool
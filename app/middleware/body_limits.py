@@ -0,0 +1,161 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, Optional
+
+from starlette.exceptions import HTTPException
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services import json_codec
+
+
+# Metodos cuyo cuerpo se comprueba
+BODY_METHODS = frozenset({"POST", "PUT", "PATCH"})
+
+
+@dataclass(frozen=True)
+class BodyLimit:
+    """Content-Types admitidos por una ruta y tamano maximo del cuerpo de cada uno"""
+    max_bytes: Dict[str, int]
+
+    def limit_for(self, content_type: str) -> Optional[int]:
+        """Bytes maximos para ``content_type`` o None si no se admite"""
+        return self.max_bytes.get(content_type)
+
+
+class BodyTooLarge(HTTPException):
+    """El cuerpo recibido por streaming ha superado el limite de la ruta
+
+    Es un ``HTTPException`` para que FastAPI no lo convierta en un 400 al
+    leer el cuerpo y su manejador de excepciones responda el 413.
+    """
+
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=_too_large(max_bytes))
+
+
+class BodyLimitMiddleware:
+    """Rechaza cuerpos demasiado grandes o de tipo no admitido antes de leerlos
+
+    Middleware ASGI puro (no ``BaseHTTPMiddleware``) para no tener que
+    bufferizar el cuerpo. Para cada peticion con cuerpo:
+
+        - 415 si el Content-Type no esta entre los admitidos por la ruta
+        - 413 si el Content-Length declarado supera el limite
+        - 413 si, sin Content-Length (chunked) o mintiendo en el, los bytes
+          recibidos superan el limite; se corta en cuanto se pasa, sin leer
+          el resto
+
+    Todo ocurre antes de que FastAPI parsee el JSON o el formulario, asi que
+    el modelo nunca se llama para estas peticiones.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        limits: Dict[str, BodyLimit],
+        default: Optional[BodyLimit] = None,
+        logger=None,
+    ):
+        """
+        Args:
+            app: Aplicacion ASGI envuelta
+            limits: Limites por ruta exacta (``scope["path"]``)
+            default: Limite para las rutas sin entrada en ``limits``; con None
+                no se comprueban
+            logger: ParrotLogger opcional para registrar los rechazos
+        """
+        self.app = app
+        self.limits = limits
+        self.default = default
+        self.logger = logger
+        self.name = "Body_Limit"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in BODY_METHODS:
+            await self.app(scope, receive, send)
+            return
+        rule = self.limits.get(scope["path"], self.default)
+        if rule is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = _headers(scope, (b"content-type", b"content-length"))
+        content_type = headers.get(b"content-type", b"").split(b";")[0].strip().lower().decode("latin-1")
+        max_bytes = rule.limit_for(content_type)
+        if max_bytes is None:
+            allowed = ", ".join(sorted(rule.max_bytes))
+            await self._reject(
+                send, 415, f"Unsupported Content-Type '{content_type or '-'}'; expected one of: {allowed}", scope
+            )
+            return
+
+        content_length = headers.get(b"content-length")
+        if content_length is not None:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                await self._reject(send, 400, "Invalid Content-Length header", scope)
+                return
+            if declared > max_bytes:
+                await self._reject(send, 413, _too_large(max_bytes), scope)
+                return
+
+        received = 0
+        response_started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    raise BodyTooLarge(max_bytes)
+            return message
+
+        async def tracking_send(message: Message):
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except BodyTooLarge as e:
+            if response_started:
+                # La respuesta ya esta en marcha (p.ej. un stream): solo se corta
+                raise
+            await self._reject(send, 413, e.detail, scope)
+            return
+        if received > max_bytes:
+            # El manejador de excepciones de FastAPI ya ha respondido el 413
+            self._log(413, _too_large(max_bytes), scope)
+
+    async def _reject(self, send: Send, status_code: int, detail: str, scope: Scope):
+        self._log(status_code, detail, scope)
+        body = json_codec.dumpb({"detail": detail})
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                # No se ha leido el cuerpo: la conexion no se puede reutilizar
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    def _log(self, status_code: int, detail: str, scope: Scope):
+        if self.logger is not None:
+            self.logger.warning(
+                f"{scope['method']} {scope['path']} rejected with {status_code}: {detail}",
+                logger_name=self.name
+            )
+
+
+def _headers(scope: Scope, names: Iterable[bytes]) -> Dict[bytes, bytes]:
+    wanted = set(names)
+    return {key: value for key, value in scope["headers"] if key in wanted}
+
+
+def _too_large(max_bytes: int) -> str:
+    return f"Request body too large; maximum is {max_bytes} bytes ({max_bytes / (1024 * 1024):.1f} MB)"
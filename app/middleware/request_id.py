@@ -0,0 +1,56 @@
+import re
+import uuid
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.logging_service import request_id_var
+
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+# Un ID recibido del cliente solo se acepta si es corto y sin caracteres raros
+VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+
+
+class RequestIdMiddleware:
+    """Asigna un request ID a cada peticion y lo deja en ``request_id_var``
+
+    Si el cliente (o el balanceador) envia ``X-Request-ID`` valido se
+    reutiliza; si no, se genera uno. Todos los logs de ParrotLogger de la
+    peticion lo llevan sin pasar ``req_id`` y se devuelve en la cabecera
+    ``X-Request-ID`` de la respuesta para poder buscarlos.
+    """
+
+    def __init__(self, app: ASGIApp, header_name: str = REQUEST_ID_HEADER):
+        self.app = app
+        self.header_name = header_name
+        self._header_key = header_name.lower().encode("latin-1")
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for key, value in scope["headers"]:
+            if key == self._header_key:
+                candidate = value.decode("latin-1")
+                if VALID_REQUEST_ID.match(candidate):
+                    request_id = candidate
+                break
+        if request_id is None:
+            request_id = uuid.uuid4().hex
+        encoded = request_id.encode("latin-1")
+
+        async def send_with_request_id(message: Message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((self._header_key, encoded))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
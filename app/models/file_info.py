@@ -0,0 +1,47 @@
+from pydantic import BaseModel, Field
+from typing import Optional
+
+class FileInfoRequest(BaseModel):
+    """Request para obtener información de archivo"""
+    file_base64: str = Field(..., description="Archivo en Base64")
+    filename: Optional[str] = Field(None, description="Nombre del archivo (opcional)")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "file_base64": "JVBERi0xLjQKJeLjz9MKMyAwIG9iago8PC9UeXBl",
+                "filename": "documento.pdf"
+            }
+        }
+
+class FileInfoResponse(BaseModel):
+    """Response con información del archivo"""
+    message: str
+    filename: str
+    file_type: str
+    file_size_kb: float
+    mime_type: Optional[str] = Field(None, description="MIME type detectado")
+    width: Optional[int] = Field(None, description="Ancho en píxeles (imágenes)")
+    height: Optional[int] = Field(None, description="Alto en píxeles (imágenes)")
+    pdf_version: Optional[str] = Field(None, description="Versión del PDF")
+    page_count: Optional[int] = Field(None, description="Número de páginas (PDF)")
+    has_text_layer: Optional[bool] = Field(
+        None,
+        description="True si el PDF tiene texto, False si parece escaneado (solo imágenes)"
+    )
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "message": "Archivo recibido correctamente",
+                "filename": "documento.pdf",
+                "file_type": "PDF",
+                "file_size_kb": 245.8,
+                "mime_type": "application/pdf",
+                "width": None,
+                "height": None,
+                "pdf_version": "1.4",
+                "page_count": 2,
+                "has_text_layer": False
+            }
+        }
@@ -0,0 +1,88 @@
+from typing import Literal, Optional
+
+from pydantic import BaseModel, ConfigDict, Field
+
+
+class VolanteData(BaseModel):
+    """Campos del volante MAPFRE Salud (ver ``ImagePrompts.VOLANTE_MAPFRE_PROMPT``)
+
+    Se envia a Gemini como ``response_schema`` del prompt por defecto, por lo
+    que solo puede usar lo que admite el esquema de la API (sin campos extra).
+    """
+    filiacion_asegurado: Optional[str] = Field(
+        default=None,
+        description="Datos del asegurado (nombre, apellidos, NIF o numero de poliza)"
+    )
+    codigo_servicio_concertado: Optional[str] = Field(
+        default=None,
+        description="Codigo numerico del servicio o centro medico concertado"
+    )
+    numero_documento: Optional[str] = Field(
+        default=None,
+        description="Numero unico de identificacion del volante"
+    )
+    Profesional_prescriptor: Optional[str] = Field(
+        default=None,
+        description="Nombre del medico que prescribe la prestacion"
+    )
+    Numero_de_colegiado: Optional[str] = Field(
+        default=None,
+        description="Numero de colegiado del medico prescriptor"
+    )
+    Especialidad: Optional[str] = Field(
+        default=None,
+        description="Especialidad medica del profesional prescriptor"
+    )
+    prescripcion: Optional[str] = Field(
+        default=None,
+        description="Texto o codigo del acto medico solicitado"
+    )
+    fecha_primeros_sintomas: Optional[str] = Field(
+        default=None,
+        description="Fecha de los primeros sintomas, tal como aparece (DD/MM/YYYY)"
+    )
+    motivos_sintomas: Optional[str] = Field(
+        default=None,
+        description="Motivos o sintomas del paciente"
+    )
+    prestacion_sanitaria: Optional[str] = Field(
+        default=None,
+        description="Codigo de acto, numero de sesiones o dias segun baremo literal"
+    )
+    numero_autorizacion: Optional[str] = Field(
+        default=None,
+        description="Numero de volante autorizado, si requiere autorizacion"
+    )
+    codigo_servicio_realizador: Optional[str] = Field(
+        default=None,
+        description="Codigo del centro o profesional que realiza la prestacion"
+    )
+    firma_profesional_realizador: Optional[bool] = Field(
+        default=None,
+        description="Existe firma manuscrita del profesional realizador"
+    )
+    firma_asegurado: Optional[bool] = Field(
+        default=None,
+        description="Existe firma manuscrita del asegurado"
+    )
+    firma_sello_prescriptor: Optional[bool] = Field(
+        default=None,
+        description="Existe firma y sello del medico prescriptor"
+    )
+    fecha_realizacion: Optional[str] = Field(
+        default=None,
+        description="Fecha de realizacion de la prestacion, tal como aparece (DD/MM/YYYY)"
+    )
+    origen_patologia: Optional[Literal["Enfermedad", "Accidente"]] = Field(
+        default=None,
+        description="Origen de la atencion"
+    )
+
+
+class VolanteExtraction(VolanteData):
+    """Volante extraido tal y como lo devuelve el API
+
+    Admite ademas los campos de servicio que anade la extraccion
+    (``_provenance``, ``_page_errors``, ``_blank_pages_skipped``...).
+    """
+    model_config = ConfigDict(extra="allow")
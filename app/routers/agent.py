@@ -1,13 +1,29 @@
+import asyncio
 import base64
+import math
 import os
 import sys
-from typing import Dict, Optional
+from typing import Any, AsyncIterator, Dict, List, Literal, Optional, Union
 
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 
+from app.dependencies import get_gemini_service
+from app.models.volante import VolanteExtraction
 from app.services.ai_service import GeminiService
+from app.services import json_codec
+from app.services.payload import FilePayload
 from app.services.logging_service import ParrotLogger as appLogger
+from app.services.rate_limiter import ModelUnavailableError
+from app.services.upload_service import (
+    OCTET_STREAM_CONTENT_TYPE,
+    UPLOAD_CONTENT_TYPES,
+    parse_json_body,
+    read_upload,
+    request_content_type,
+    upload_openapi,
+)
 from app.constants import Constants, ImagePrompts
 
 
@@ -24,6 +40,10 @@ class ImageRequest(BaseModel):
         default=None,
         description="Prompt personalizado. Si no se proporciona, se usa el prompt por defecto para volante MAPFRE Salud"
     )
+    use_cache: bool = Field(
+        default=True,
+        description="Si es False se ignora la cache de resultados y se llama siempre a Gemini"
+    )
     
     # Mantener compatibilidad con código anterior
     @property
@@ -34,19 +54,85 @@ class ImageRequest(BaseModel):
 
 class ImageResponse(BaseModel):
     """Response model for image processing"""
-    extracted_data: Dict
+    extracted_data: Union[Dict[str, Any], VolanteExtraction] = Field(
+        union_mode="left_to_right",
+        description="Campos del volante (prompt por defecto) o el JSON libre de un prompt personalizado"
+    )
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any], prompt: str) -> "ImageResponse":
+        """
+        Construye la respuesta, tipada como VolanteExtraction con el prompt por defecto
+
+        Args:
+            result: Dict devuelto por GeminiService
+            prompt: Prompt usado en la extraccion
+
+        Returns:
+            ImageResponse; si el resultado no cumple el esquema se devuelve tal cual
+        """
+        if prompt == ImagePrompts.VOLANTE_MAPFRE_PROMPT and "raw_response" not in result:
+            try:
+                return cls(extracted_data=VolanteExtraction.model_validate(result))
+            except ValidationError:
+                pass
+        return cls(extracted_data=result)
+
+
+class BatchImageRequest(BaseModel):
+    """Request model for batch image/PDF processing"""
+    items: List[ImageRequest] = Field(
+        min_length=1,
+        max_length=Constants.BATCH_MAX_ITEMS,
+        description="Documentos a procesar"
+    )
+    max_concurrency: Optional[int] = Field(
+        default=None,
+        ge=1,
+        le=Constants.BATCH_MAX_CONCURRENCY,
+        description="Llamadas simultaneas a Gemini para este lote. Por defecto BATCH_DEFAULT_CONCURRENCY"
+    )
+
+
+class BatchItemResult(BaseModel):
+    """Una linea NDJSON de la respuesta de /process-batch"""
+    index: int = Field(description="Posicion del documento en ``items``")
+    status: Literal["ok", "error"]
+    result: Optional[ImageResponse] = None
+    error: Optional[str] = None
 
 
 router = APIRouter()
 
 
-@router.post("/process-image", response_model=ImageResponse)
-async def process_image(request: ImageRequest) -> ImageResponse:
+@router.post(
+    "/process-image",
+    response_model=ImageResponse,
+    openapi_extra=upload_openapi(
+        ImageRequest,
+        {
+            "mime_type": {"type": "string"},
+            "prompt": {"type": "string"},
+            "use_cache": {"type": "boolean"},
+        },
+    ),
+)
+async def process_image(
+    http_request: Request,
+    gemini_service: GeminiService = Depends(get_gemini_service),
+) -> ImageResponse:
     """
     Process an image or PDF and extract information based on the provided prompt
     
+    El archivo puede llegar como JSON con ``file_base64`` (ImageRequest), como
+    formulario ``multipart/form-data`` (campo ``file`` y los mismos campos de
+    texto) o como cuerpo binario ``application/octet-stream`` con ``mime_type``,
+    ``prompt`` y ``use_cache`` en la query. Las subidas binarias evitan el
+    Base64 (~33% mas de bytes) y el parseo de un JSON de varios megas.
+    
     Args:
-        request: ImageRequest with base64 encoded file (image or PDF), mime_type, and optional extraction prompt
+        http_request: Request con el archivo en cualquiera de los tres formatos
+        gemini_service: Shared GeminiService injected by FastAPI
         
     Returns:
         ImageResponse with extracted data as JSON
@@ -58,26 +144,56 @@ async def process_image(request: ImageRequest) -> ImageResponse:
     """
     logger = appLogger(name="image_processor")
     
+    if request_content_type(http_request) in UPLOAD_CONTENT_TYPES:
+        try:
+            upload, fields = await read_upload(http_request)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        declared_mime_type = fields.get("mime_type") or upload.content_type
+        if declared_mime_type == OCTET_STREAM_CONTENT_TYPE:
+            declared_mime_type = None
+        # Sobre el fichero temporal: solo se lee entero si hay que llamar al modelo
+        payload = FilePayload.from_file(upload.file, upload.size, declared_mime_type, upload.filename)
+        mime_type = payload.mime_type or "image/jpeg"
+        prompt = fields.get("prompt")
+        use_cache = fields.get("use_cache", "true").lower() != "false"
+    else:
+        upload = None
+        request = await parse_json_body(http_request, ImageRequest)
+        # Se decodifica una sola vez, dentro de GeminiService
+        payload = FilePayload.from_base64(request.file_base64, request.mime_type)
+        mime_type = request.mime_type
+        prompt = request.prompt
+        use_cache = request.use_cache
+    
     try:
-        # Initialize Gemini service
-        gemini_service = GeminiService(logger)
-        
         # Usar prompt por defecto si no se proporciona uno personalizado
-        prompt_to_use = request.prompt if request.prompt else ImagePrompts.VOLANTE_MAPFRE_PROMPT
+        prompt_to_use = prompt if prompt else ImagePrompts.VOLANTE_MAPFRE_PROMPT
         
         # Process file with Gemini
-        file_type = "PDF" if request.mime_type == "application/pdf" else "imagen"
+        file_type = "PDF" if mime_type == "application/pdf" else "imagen"
         logger.info(f"Processing {file_type} with Gemini", logger_name="ImageProcessor")
         
-        result = await gemini_service.process_image(
-            image_base64=request.file_base64,
+        result = await gemini_service.process_file(
+            payload=payload,
             prompt=prompt_to_use,
-            mime_type=request.mime_type
+            mime_type=mime_type,
+            use_cache=use_cache
         )
         
         logger.info(f"{file_type.capitalize()} processed successfully", logger_name="ImageProcessor")
-        return ImageResponse(extracted_data=result)
+        return ImageResponse.from_result(result, prompt_to_use)
         
+    except ModelUnavailableError as e:
+        logger.warning(
+            f"Gemini unavailable: {e}",
+            logger_name="ImageProcessor"
+        )
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"Model temporarily unavailable: {str(e)}",
+            headers={"Retry-After": str(math.ceil(e.retry_after))}
+        )
     except Exception as e:
         logger.error(
             f"Error processing image: {e}",
@@ -93,3 +209,182 @@ async def process_image(request: ImageRequest) -> ImageResponse:
             status_code=500,
             detail=f"Error processing image: {str(e)}"
         )
+    finally:
+        if upload is not None:
+            await upload.close()
+
+
+@router.post("/process-image/stream")
+async def process_image_stream(
+    request: ImageRequest,
+    gemini_service: GeminiService = Depends(get_gemini_service),
+) -> StreamingResponse:
+    """
+    Process an image or PDF streaming the extracted fields as Server-Sent Events
+    
+    Cada campo de primer nivel se envia como un evento ``field`` en cuanto
+    Gemini termina de escribirlo, de modo que el cliente puede ir pintando el
+    formulario antes de tener la respuesta completa. Al final se envia un
+    evento ``result`` con el mismo cuerpo que ``/process-image`` o un evento
+    ``error`` si la extraccion falla.
+    
+    Args:
+        request: ImageRequest with base64 encoded file (image or PDF), mime_type, and optional extraction prompt
+        gemini_service: Shared GeminiService injected by FastAPI
+        
+    Returns:
+        StreamingResponse ``text/event-stream``
+    """
+    logger = appLogger(name="image_processor")
+    prompt_to_use = request.prompt if request.prompt else ImagePrompts.VOLANTE_MAPFRE_PROMPT
+    file_type = "PDF" if request.mime_type == "application/pdf" else "imagen"
+    logger.info(f"Streaming {file_type} extraction with Gemini", logger_name="ImageProcessor")
+
+    async def stream_events() -> AsyncIterator[str]:
+        try:
+            async for event, data in gemini_service.process_image_stream(
+                image_base64=request.file_base64,
+                prompt=prompt_to_use,
+                mime_type=request.mime_type,
+                use_cache=request.use_cache
+            ):
+                if event == "result":
+                    payload = ImageResponse.from_result(data, prompt_to_use).model_dump_json()
+                else:
+                    payload = json_codec.dumps(data)
+                yield f"event: {event}\ndata: {payload}\n\n"
+        except ModelUnavailableError as e:
+            logger.warning(f"Gemini unavailable: {e}", logger_name="ImageProcessor")
+            payload = json_codec.dumps({
+                "status_code": e.status_code,
+                "detail": f"Model temporarily unavailable: {str(e)}",
+                "retry_after": math.ceil(e.retry_after),
+            })
+            yield f"event: error\ndata: {payload}\n\n"
+        except Exception as e:
+            logger.error(f"Error streaming image extraction: {e}", logger_name="ImageProcessor")
+            payload = json_codec.dumps({
+                "status_code": 500,
+                "detail": f"Error processing image: {str(e)}",
+            })
+            yield f"event: error\ndata: {payload}\n\n"
+
+    return StreamingResponse(
+        stream_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/stats")
+async def get_stats(
+    gemini_service: GeminiService = Depends(get_gemini_service),
+) -> Dict:
+    """
+    Devuelve las metricas del servicio de extraccion de este worker
+
+    Returns:
+        Dict con los contadores de la cache de resultados, de las peticiones
+        agrupadas en vuelo, del limitador de concurrencia, de los reintentos,
+        de las respuestas reparadas o fuera de esquema, de la cascada de
+        modelos, de las llamadas hedged, del preprocesado de imagenes, de
+        los casi-duplicados detectados y de la cola de logs
+    """
+    cache = gemini_service.cache
+    single_flight = gemini_service.single_flight
+    limiter = gemini_service.limiter
+    retry_policy = gemini_service.retry_policy
+    return {
+        "cache": cache.stats() if cache is not None else {"enabled": False},
+        "single_flight": (
+            single_flight.stats() if single_flight is not None else {"enabled": False}
+        ),
+        "limiter": limiter.stats() if limiter is not None else {"enabled": False},
+        "retries": retry_policy.stats() if retry_policy is not None else {"enabled": False},
+        "prompts": gemini_service.prompt_registry.stats(),
+        "parsing": gemini_service.parse_stats(),
+        "cascade": (
+            gemini_service.cascade.stats()
+            if gemini_service.cascade is not None else {"enabled": False}
+        ),
+        "hedging": (
+            gemini_service.hedging.stats()
+            if gemini_service.hedging is not None else {"enabled": False}
+        ),
+        "preprocessing": (
+            gemini_service.preprocessor.stats()
+            if gemini_service.preprocessor is not None else {"enabled": False}
+        ),
+        "near_duplicates": (
+            gemini_service.near_duplicates.stats()
+            if gemini_service.near_duplicates is not None else {"enabled": False}
+        ),
+        "logging": appLogger.queue_stats(),
+    }
+
+
+@router.post("/process-batch")
+async def process_batch(
+    request: BatchImageRequest,
+    gemini_service: GeminiService = Depends(get_gemini_service),
+) -> StreamingResponse:
+    """
+    Process several images or PDFs in a single request
+    
+    Los documentos se envian a Gemini con una concurrencia limitada y cada
+    resultado se devuelve como una linea JSON (NDJSON) en cuanto termina, sin
+    esperar al resto del lote. El orden de las lineas es el de finalizacion;
+    ``index`` indica a que documento corresponde cada una.
+    
+    Args:
+        request: BatchImageRequest con los documentos y la concurrencia opcional
+        gemini_service: Shared GeminiService injected by FastAPI
+        
+    Returns:
+        StreamingResponse ``application/x-ndjson`` con un BatchItemResult por documento
+    """
+    logger = appLogger(name="image_processor")
+    concurrency = request.max_concurrency or Constants.BATCH_DEFAULT_CONCURRENCY
+    semaphore = asyncio.Semaphore(concurrency)
+    logger.info(
+        f"Processing batch of {len(request.items)} documents (concurrency={concurrency})",
+        logger_name="ImageProcessor"
+    )
+
+    async def process_item(index: int, item: ImageRequest) -> BatchItemResult:
+        async with semaphore:
+            prompt_to_use = item.prompt if item.prompt else ImagePrompts.VOLANTE_MAPFRE_PROMPT
+            try:
+                result = await gemini_service.process_image(
+                    image_base64=item.file_base64,
+                    prompt=prompt_to_use,
+                    mime_type=item.mime_type,
+                    use_cache=item.use_cache
+                )
+                return BatchItemResult(
+                    index=index,
+                    status="ok",
+                    result=ImageResponse.from_result(result, prompt_to_use)
+                )
+            except Exception as e:
+                logger.error(
+                    f"Error processing batch item {index}: {e}",
+                    logger_name="ImageProcessor"
+                )
+                return BatchItemResult(index=index, status="error", error=str(e))
+
+    async def stream_results() -> AsyncIterator[str]:
+        tasks = [
+            asyncio.create_task(process_item(index, item))
+            for index, item in enumerate(request.items)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                item_result = await next_done
+                yield item_result.model_dump_json(exclude_none=True) + "\n"
+        finally:
+            # Si el cliente se desconecta no seguimos gastando llamadas a Gemini
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
@@ -0,0 +1,78 @@
+import asyncio
+
+from fastapi import APIRouter, HTTPException, Request
+
+from app.models.file_info import FileInfoRequest, FileInfoResponse
+from app.services.file_info_service import FileInfoService
+from app.services.logging_service import ParrotLogger as LoggingService
+from app.services.payload import FilePayload
+from app.services.upload_service import (
+    UPLOAD_CONTENT_TYPES,
+    parse_json_body,
+    read_upload,
+    request_content_type,
+    upload_openapi,
+)
+
+router = APIRouter()
+
+logger = LoggingService(name="file_info")
+
+file_service = FileInfoService(logger)
+
+
+@router.post(
+    "/get-info",
+    response_model=FileInfoResponse,
+    summary="Información básica de un archivo",
+    description=(
+        "Recibe un archivo en Base64 (JSON), como formulario multipart (campo `file`) "
+        "o como cuerpo binario `application/octet-stream` y devuelve su tipo y tamaño"
+    ),
+    openapi_extra=upload_openapi(
+        FileInfoRequest,
+        {"filename": {"type": "string"}},
+    ),
+)
+async def get_file_info(request: Request):
+    """
+    Obtiene información básica de un archivo
+
+    - **file_base64**: Archivo codificado en Base64
+    - **filename**: Nombre del archivo (opcional)
+
+    Con multipart u octet-stream (``?filename=``) no hace falta codificar el
+    archivo en Base64: solo se leen su cabecera, su final y su tamaño.
+    
+    Además del tipo devuelve, si se pueden leer de la cabecera, las
+    dimensiones de las imágenes y la versión, el número de páginas y si
+    tiene texto o está escaneado de los PDF.
+
+    Returns información básica del archivo
+    """
+    if request_content_type(request) in UPLOAD_CONTENT_TYPES:
+        try:
+            upload, fields = await read_upload(request)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        try:
+            payload = FilePayload.from_file(
+                upload.file,
+                upload.size,
+                filename=fields.get("filename") or upload.filename
+            )
+            # Cabecera y final se leen del fichero temporal: fuera del event loop
+            result = await asyncio.to_thread(file_service.get_file_info, payload)
+            return FileInfoResponse(**result)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Error al procesar el archivo: {e}")
+        finally:
+            await upload.close()
+
+    file_request = await parse_json_body(request, FileInfoRequest)
+    try:
+        payload = FilePayload.from_base64(file_request.file_base64, filename=file_request.filename)
+        result = file_service.get_file_info(payload)
+        return FileInfoResponse(**result)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Error al procesar el archivo: {e}")
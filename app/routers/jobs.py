@@ -0,0 +1,132 @@
+from typing import AsyncIterator, Dict, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from app.constants import Constants, ImagePrompts
+from app.dependencies import get_job_pool
+from app.routers.agent import ImageRequest, ImageResponse
+from app.services.job_service import FINISHED_STATUSES, JobWorkerPool
+from app.services import json_codec
+from app.services.logging_service import ParrotLogger as appLogger
+
+
+class JobSubmitResponse(BaseModel):
+    """Response model for job submission"""
+    job_id: str
+    status: str
+    status_url: str
+    events_url: str
+
+
+class JobStatusResponse(BaseModel):
+    """Response model for job status"""
+    job_id: str
+    status: str = Field(description="queued, running, succeeded o failed")
+    attempts: int
+    created_at: float
+    updated_at: float
+    result: Optional[ImageResponse] = None
+    error: Optional[str] = None
+
+
+router = APIRouter()
+
+
+def _to_status_response(job: Dict) -> JobStatusResponse:
+    result = job.pop("result")
+    prompt = job.pop("prompt") or ImagePrompts.VOLANTE_MAPFRE_PROMPT
+    return JobStatusResponse(
+        **job,
+        result=ImageResponse.from_result(result, prompt) if result is not None else None,
+    )
+
+
+@router.post("", response_model=JobSubmitResponse, status_code=202)
+async def submit_job(
+    request: ImageRequest,
+    http_request: Request,
+    job_pool: JobWorkerPool = Depends(get_job_pool),
+) -> JobSubmitResponse:
+    """
+    Encola la extraccion de un documento y devuelve inmediatamente su job_id
+    
+    Args:
+        request: ImageRequest igual que en /v1/image/process-image
+        http_request: Request actual (para construir las URLs de seguimiento)
+        job_pool: Pool de workers compartido
+        
+    Returns:
+        JobSubmitResponse con el identificador y las URLs de estado y eventos
+    """
+    logger = appLogger(name="image_processor")
+    job_id = await job_pool.submit(request.model_dump())
+    logger.info(f"Job {job_id} queued", logger_name="JobsRouter")
+    status_url = str(http_request.url_for("get_job", job_id=job_id))
+    return JobSubmitResponse(
+        job_id=job_id,
+        status="queued",
+        status_url=status_url,
+        events_url=str(http_request.url_for("job_events", job_id=job_id)),
+    )
+
+
+@router.get("/{job_id}", response_model=JobStatusResponse)
+async def get_job(
+    job_id: str,
+    job_pool: JobWorkerPool = Depends(get_job_pool),
+) -> JobStatusResponse:
+    """
+    Devuelve el estado de un trabajo y, si ha terminado, su resultado o error
+    """
+    job = await job_pool.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _to_status_response(job)
+
+
+@router.get("/{job_id}/events")
+async def job_events(
+    job_id: str,
+    request: Request,
+    job_pool: JobWorkerPool = Depends(get_job_pool),
+) -> StreamingResponse:
+    """
+    Server-Sent Events con los cambios de estado de un trabajo
+    
+    Emite un evento ``status`` por cada cambio y termina con un evento
+    ``result`` (o ``error``) cuando el trabajo finaliza.
+    """
+    job = await job_pool.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def stream_events() -> AsyncIterator[str]:
+        current = job
+        last_status = None
+        while True:
+            if current["status"] != last_status:
+                last_status = current["status"]
+                status = _to_status_response(dict(current))
+                if last_status in FINISHED_STATUSES:
+                    event = "result" if status.error is None else "error"
+                    yield f"event: {event}\ndata: {status.model_dump_json()}\n\n"
+                    return
+                data = json_codec.dumps({"job_id": job_id, "status": last_status})
+                yield f"event: status\ndata: {data}\n\n"
+            else:
+                # Comentario SSE para mantener viva la conexion tras proxies
+                yield ": keep-alive\n\n"
+            if await request.is_disconnected():
+                return
+            await job_pool.wait_for_update(job_id, timeout=Constants.JOBS_POLL_INTERVAL)
+            current = await job_pool.get(job_id)
+            if current is None:
+                return
+
+    return StreamingResponse(
+        stream_events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
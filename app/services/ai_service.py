@@ -1,45 +1,106 @@
-import base64
-import json
+import asyncio
+import hashlib
 import os
 import sys
-from typing import Any, Dict
+import time
+from contextlib import AsyncExitStack
+from typing import Any, AsyncIterator, Dict, Tuple
 
-from google import genai
-from google.genai.types import Part, GenerateContentConfig
+from google.genai import errors as genai_errors
+from google.genai.types import Part
+from pydantic import ValidationError
 
 from app.constants import Constants
+from app.services.cache_service import ExtractionCache
+from app.services.file_probe import PROBE_HEAD_BYTES, PROBE_TAIL_BYTES, probe_file
+from app.services.hedging import HedgePolicy
+from app.services.image_preprocessing import ImagePreprocessor
+from app.services import json_codec
+from app.services.json_repair import repair_json
+from app.services.json_stream import IncrementalJsonObjectParser
+from app.services.model_backends import ModelBackend, ModelResponse, create_model_backend
+from app.services.model_cascade import ModelCascade
+from app.services.near_duplicates import NearDuplicateIndex, NearDuplicateMatch
+from app.services.payload import FilePayload
+from app.services.pdf_splitter import PdfSplitter
+from app.services.prompt_registry import CompiledPrompt, PromptRegistry, is_cached_content_missing
+from app.services.rate_limiter import AdaptiveLimiter, RetryPolicy, is_overload
+from app.services.singleflight import SingleFlight
+
 
 class GeminiService:
-    """Service for processing images with Gemini Vision API"""
+    """Service for processing images with Gemini Vision API
+    
+    A single instance is created at application startup and shared by all
+    requests (see ``app.dependencies.get_gemini_service``). The model is
+    reached through a ``ModelBackend``: Gemini by default, or the offline
+    fake backend when ``MODEL_BACKEND=fake``. With a ``ModelCascade`` each
+    extraction starts on the cheapest model and only escalates when the
+    result is not good enough.
+    """
     
-    def __init__(self, logger):
+    def __init__(
+        self,
+        logger,
+        backend: ModelBackend = None,
+        cache: ExtractionCache = None,
+        single_flight: SingleFlight = None,
+        limiter: AdaptiveLimiter = None,
+        retry_policy: RetryPolicy = None,
+        preprocessor: ImagePreprocessor = None,
+        pdf_splitter: PdfSplitter = None,
+        prompt_registry: PromptRegistry = None,
+        cascade: ModelCascade = None,
+        hedging: HedgePolicy = None,
+        near_duplicates: NearDuplicateIndex = None
+    ):
         self.logger = logger
         self.name = "Gemini_Service"
-        self._initialize_gemini()
+        self.cache = cache
+        self.single_flight = single_flight
+        self.limiter = limiter
+        self.retry_policy = retry_policy
+        self.preprocessor = preprocessor
+        self.pdf_splitter = pdf_splitter
+        self.cascade = cascade
+        self.hedging = hedging
+        self.near_duplicates = near_duplicates
+        self._parse_stats = {"repaired": 0, "unparseable": 0, "schema_invalid": 0}
+        self._initialize_backend(backend)
+        self.prompt_registry = prompt_registry or PromptRegistry(
+            logger, self.backend, self.model_name
+        )
 
-    def _initialize_gemini(self):
-        """Initialize Gemini client with API key and model"""
+    def _initialize_backend(self, backend: ModelBackend = None):
+        """Initialize the model backend (Gemini client with API key) and model"""
         try:
-            self.gemini_client = genai.Client(
-                api_key=Constants.GEMINI_API_KEY
+            self.backend = backend or create_model_backend(self.logger)
+            # With a cascade the first (cheapest) tier is the default model
+            self.model_name = (
+                self.cascade.models[0] if self.cascade is not None else Constants.GEMINI_MODEL
             )
-            self.model_name = Constants.GEMINI_MODEL
             self.logger.info(
-                "Gemini client initialized successfully",
+                f"Model backend '{self.backend.name}' initialized successfully",
                 logger_name=self.name
             )
         except Exception as e:
             self.logger.error(
-                f"Failed to initialize Gemini client: {e}",
+                f"Failed to initialize model backend: {e}",
                 logger_name=self.name
             )
             raise
 
+    async def close(self):
+        """Close the model backend (Gemini HTTP connection pool)"""
+        await self.backend.close()
+
     async def process_image(
         self,
         image_base64: str,
         prompt: str,
-        mime_type: str = "image/jpeg"
+        mime_type: str = "image/jpeg",
+        use_cache: bool = True,
+        deadline: float = None
     ) -> Dict[str, Any]:
         """
         Process an image or PDF with Gemini and extract information based on prompt
@@ -48,102 +109,605 @@ class GeminiService:
             image_base64: Base64 encoded file string (image or PDF)
             prompt: Instructions for what information to extract from the file
             mime_type: MIME type of the file (e.g., 'image/jpeg', 'image/png', 'application/pdf')
+            use_cache: If False the extraction cache is neither read nor written
+            deadline: Event loop time by which the model call (queueing and
+                retries included) must finish. Defaults to now +
+                GEMINI_REQUEST_DEADLINE_SECONDS
             
         Returns:
             Dict with extracted information as JSON
+            
+        Raises:
+            ModelUnavailableError: If Gemini is throttling/unavailable and the
+                call could not be completed before the deadline
+        """
+        payload = FilePayload.from_base64(image_base64, mime_type)
+        return await self.process_file(payload, prompt, mime_type, use_cache, deadline)
+
+    async def process_file(
+        self,
+        payload: FilePayload,
+        prompt: str,
+        mime_type: str = "image/jpeg",
+        use_cache: bool = True,
+        deadline: float = None
+    ) -> Dict[str, Any]:
         """
+        Process an image or PDF payload (Base64 request or binary upload) with Gemini
+        
+        The payload is decoded once here; the cache key is its SHA-256. An
+        uploaded file is only read whole after an exact cache miss.
+        
+        Args:
+            payload: Request file, decoded lazily
+            prompt: Instructions for what information to extract from the file
+            mime_type: MIME type of the file
+            use_cache: If False the extraction cache is neither read nor written
+            deadline: Event loop time by which the model call must finish.
+                Defaults to now + GEMINI_REQUEST_DEADLINE_SECONDS
+            
+        Returns:
+            Dict with extracted information as JSON
+            
+        Raises:
+            ModelUnavailableError: If Gemini is throttling/unavailable and the
+                call could not be completed before the deadline
+        """
+        if deadline is None:
+            deadline = (
+                asyncio.get_running_loop().time()
+                + Constants.GEMINI_REQUEST_DEADLINE_SECONDS
+            )
         try:
             file_type = "PDF" if mime_type == "application/pdf" else "imagen"
             self.logger.info(
-                f"Starting {file_type} processing with Gemini",
+                f"Starting {file_type} processing with Gemini ({payload.size} bytes)",
                 logger_name=self.name
             )
             
-            # Decode base64 file
-            try:
-                # Remove data URL prefix if present (e.g., "data:image/png;base64,")
-                if ',' in image_base64:
-                    image_base64 = image_base64.split(',')[1]
-                
-                file_bytes = base64.b64decode(image_base64)
+            preprocess = self.preprocessor is not None and self.preprocessor.supports(mime_type)
+            split_pdf = self.pdf_splitter is not None and mime_type == "application/pdf"
+            if preprocess:
+                variant = self.preprocessor.signature
+            elif split_pdf:
+                variant = self.pdf_splitter.signature
+            else:
+                variant = ""
+            
+            # Same file, prompt, mime_type and model share cache entry and in-flight call
+            request_key = ExtractionCache.build_key(
+                await payload.load_sha256(),
+                prompt,
+                mime_type,
+                self.cascade.signature if self.cascade is not None else self.model_name,
+                variant=variant
+            )
+            store_result = self.cache is not None and use_cache
+            
+            if self.cache is not None:
+                if not use_cache:
+                    self.cache.record_bypass()
+                else:
+                    # Look up the content-addressed cache before calling the model
+                    cached = await self._cache_call(self.cache.get, request_key)
+                    if cached is not None:
+                        self.logger.info(
+                            f"Cache hit for {file_type} ({request_key[:12]})",
+                            logger_name=self.name
+                        )
+                        return cached
+            
+            # An uploaded file is read off the event loop
+            await payload.load()
+            file_bytes = self._decode_file(payload, file_type)
+            
+            # Another photo or scan of an already processed document misses the exact cache
+            fingerprint = near_duplicate = None
+            near_duplicate_scope = self._near_duplicate_scope(prompt, variant)
+            if self.near_duplicates is not None and self.near_duplicates.supports(mime_type):
+                fingerprint = await self.near_duplicates.fingerprint(file_bytes, mime_type)
+                if fingerprint is not None:
+                    near_duplicate = self.near_duplicates.find(fingerprint, near_duplicate_scope)
+            if near_duplicate is not None:
                 self.logger.info(
-                    f"Decoded {file_type}: {len(file_bytes)} bytes",
+                    f"Probable duplicate of {near_duplicate.result_key[:12]}"
+                    f" (distance {near_duplicate.distance})",
                     logger_name=self.name
                 )
+                if store_result and self.near_duplicates.can_serve(near_duplicate):
+                    previous = await self._cache_call(self.cache.get, near_duplicate.result_key)
+                    if previous is not None:
+                        self.near_duplicates.record_served()
+                        return self._flag_near_duplicate(previous, near_duplicate, served=True)
+            
+            async def generate() -> Dict[str, Any]:
+                if split_pdf and not self._single_page_pdf(payload):
+                    result = await self._generate_pdf_pages(file_bytes, prompt, deadline)
+                else:
+                    model_bytes, model_mime_type = file_bytes, mime_type
+                    if preprocess:
+                        # Shrink the image off the event loop before uploading it
+                        preprocessed = await self.preprocessor.process(file_bytes, mime_type)
+                        model_bytes, model_mime_type = preprocessed.data, preprocessed.mime_type
+                    result = await self._generate(model_bytes, prompt, model_mime_type, deadline)
+                if store_result and self._is_cacheable(result):
+                    await self._cache_call(self.cache.set, request_key, result)
+                    if fingerprint is not None:
+                        self.near_duplicates.add(fingerprint, near_duplicate_scope, request_key)
+                return result
+            
+            if self.single_flight is None:
+                result = await generate()
+            else:
+                result = await self.single_flight.do(request_key, generate)
+            if near_duplicate is not None:
+                return self._flag_near_duplicate(result, near_duplicate, served=False)
+            return result
+                
+        except Exception as e:
+            self.logger.error(
+                f"Error processing image with Gemini: {e}",
+                logger_name=self.name
+            )
+            exc_type, exc_obj, exc_tb = sys.exc_info()
+            fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
+            self.logger.error(
+                f"{exc_type} en {fname} línea {exc_tb.tb_lineno}",
+                logger_name=self.name
+            )
+            raise
+
+    async def process_image_stream(
+        self,
+        image_base64: str,
+        prompt: str,
+        mime_type: str = "image/jpeg",
+        use_cache: bool = True
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Process an image or PDF streaming each extracted field as soon as Gemini writes it
+        
+        Los PDF se envian completos (sin dividir por paginas) para que los
+        campos salgan en el orden en que el modelo los genera. Solo se usa el
+        primer modelo de la cascada: los campos ya enviados no se pueden retirar.
+        
+        Args:
+            image_base64: Base64 encoded file string (image or PDF)
+            prompt: Instructions for what information to extract from the file
+            mime_type: MIME type of the file
+            use_cache: If False the extraction cache is neither read nor written
+            
+        Yields:
+            ``("field", {"name": ..., "value": ...})`` for each top-level field
+            and finally ``("result", extracted_data)`` with the complete result
+            
+        Raises:
+            ModelUnavailableError: If Gemini is throttling/unavailable and the
+                stream could not be opened before the deadline
+        """
+        deadline = (
+            asyncio.get_running_loop().time()
+            + Constants.GEMINI_REQUEST_DEADLINE_SECONDS
+        )
+        file_type = "PDF" if mime_type == "application/pdf" else "imagen"
+        self.logger.info(
+            f"Starting streamed {file_type} processing with Gemini",
+            logger_name=self.name
+        )
+        payload = FilePayload.from_base64(image_base64, mime_type)
+        file_bytes = self._decode_file(payload, file_type)
+        
+        preprocess = self.preprocessor is not None and self.preprocessor.supports(mime_type)
+        request_key = ExtractionCache.build_key(
+            payload.sha256,
+            prompt,
+            mime_type,
+            self.model_name,
+            variant=self.preprocessor.signature if preprocess else ""
+        )
+        if self.cache is not None:
+            if not use_cache:
+                self.cache.record_bypass()
+            else:
+                cached = await self._cache_call(self.cache.get, request_key)
+                if cached is not None:
+                    self.logger.info(
+                        f"Cache hit for streamed {file_type} ({request_key[:12]})",
+                        logger_name=self.name
+                    )
+                    for field_name, value in cached.items():
+                        yield "field", {"name": field_name, "value": value}
+                    yield "result", cached
+                    return
+        
+        model_bytes, model_mime_type = file_bytes, mime_type
+        if preprocess:
+            preprocessed = await self.preprocessor.process(file_bytes, mime_type)
+            model_bytes, model_mime_type = preprocessed.data, preprocessed.mime_type
+        
+        compiled = self.prompt_registry.get(prompt)
+        file_part = Part.from_bytes(data=model_bytes, mime_type=model_mime_type)
+        contents = compiled.contents(file_part)
+        config = compiled.generation_config()
+        
+        async with AsyncExitStack() as stack:
+            if self.limiter is not None:
+                # The slot is held for the whole stream, not only until the first chunk
+                await stack.enter_async_context(self.limiter.slot(deadline))
+            started = time.monotonic()
+            try:
+                stream, first_chunk = await self._open_stream(contents, config, deadline)
             except Exception as e:
-                self.logger.error(
-                    f"Failed to decode base64 {file_type}: {e}",
+                if self.limiter is not None:
+                    if is_overload(e):
+                        self.limiter.record_overload()
+                    else:
+                        self.limiter.record_error()
+                raise
+            stack.push_async_callback(stream.aclose)
+            
+            parser = IncrementalJsonObjectParser()
+            chunks = []
+            chunk = first_chunk
+            while chunk is not None:
+                chunks.append(chunk)
+                for field_name, value in parser.feed(chunk):
+                    yield "field", {"name": field_name, "value": value}
+                chunk = await anext(stream, None)
+            if self.limiter is not None:
+                self.limiter.record_success(time.monotonic() - started)
+        
+        result_text = "".join(chunks).strip()
+        if not result_text:
+            self.logger.warning("Empty streamed response from Gemini", logger_name=self.name)
+            yield "result", {"error": "No response from Gemini"}
+            return
+        result, _ = self._parse_response(result_text, compiled)
+        if self.cache is not None and use_cache and self._is_cacheable(result):
+            await self._cache_call(self.cache.set, request_key, result)
+        yield "result", result
+
+    async def _open_stream(self, contents, config, deadline: float):
+        """
+        Open a streamed generation and wait for its first chunk, with bounded retries
+        
+        Returns:
+            Tuple (stream iterator, first text chunk or None if the stream is empty)
+        """
+        async def open_stream():
+            stream = self.backend.generate_stream(self.model_name, contents, config)
+            try:
+                first_chunk = await anext(stream, None)
+            except BaseException:
+                await stream.aclose()
+                raise
+            return stream, first_chunk
+        
+        if self.retry_policy is None:
+            return await open_stream()
+        # The limiter slot is already held by the caller for the whole stream
+        return await self.retry_policy.run(open_stream, deadline)
+
+    def _near_duplicate_scope(self, prompt: str, variant: str) -> str:
+        """Only documents extracted with the same prompt, models and variant are compared"""
+        models = self.cascade.signature if self.cascade is not None else self.model_name
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+        return f"{models}|{variant}|{prompt_hash}"
+
+    @staticmethod
+    def _flag_near_duplicate(
+        result: Dict[str, Any],
+        match: NearDuplicateMatch,
+        served: bool
+    ) -> Dict[str, Any]:
+        """Copy of ``result`` with ``_near_duplicate`` (the cached entry is not modified)"""
+        return {
+            **result,
+            "_near_duplicate": {
+                "previous": match.result_key[:12],
+                "distance": match.distance,
+                "same_size": match.same_size,
+                "served_from_previous": served,
+            },
+        }
+
+    def _single_page_pdf(self, payload: FilePayload) -> bool:
+        """True if the PDF header/trailer already say it has one page (no split needed)"""
+        metadata = probe_file(
+            payload.header(PROBE_HEAD_BYTES),
+            payload.tail(PROBE_TAIL_BYTES),
+            payload.size
+        )
+        if metadata.page_count == 1:
+            self.logger.info(
+                "Single-page PDF, skipping page split",
+                logger_name=self.name
+            )
+            return True
+        return False
+
+    def _decode_file(self, payload: FilePayload, file_type: str) -> bytes:
+        """
+        Decode the payload (only the first call decodes the base64)
+        
+        Raises:
+            ValueError: If the payload is not valid base64
+        """
+        try:
+            decoded = payload.decoded
+            file_bytes = payload.data
+            if not decoded:
+                self.logger.info(
+                    f"Decoded {file_type}: {len(file_bytes)} bytes",
                     logger_name=self.name
                 )
-                raise ValueError(f"Invalid base64 {file_type} data")
-            
-            # Create the prompt with JSON output requirement
-            full_prompt = f"""{prompt}
-                IMPORTANTE: Devuelve ÚNICAMENTE un objeto JSON válido con los campos solicitados. 
-                No incluyas explicaciones adicionales, solo el JSON.
-                """
-            # Prepare the content parts for Gemini
-            contents = [
-                Part.from_bytes(
-                    data=file_bytes,
-                    mime_type=mime_type
-                ),
-                Part.from_text(text=full_prompt)
-            ]
-            
-            # Configure generation
-            config = GenerateContentConfig(
-                temperature=0.1,
-                response_mime_type="application/json"
+            return file_bytes
+        except Exception as e:
+            self.logger.error(
+                f"Failed to decode base64 {file_type}: {e}",
+                logger_name=self.name
             )
+            raise ValueError(f"Invalid base64 {file_type} data")
+
+    async def _generate(
+        self,
+        file_bytes: bytes,
+        prompt: str,
+        mime_type: str,
+        deadline: float,
+        page_chunk: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Call Gemini with the decoded file and parse the JSON answer
+        
+        Args:
+            file_bytes: Decoded file content
+            prompt: Instructions for what information to extract from the file
+            mime_type: MIME type of the file
+            deadline: Event loop time by which the call must finish
+            page_chunk: True for a page range after the first of a split
+                PDF. Those pages never carry the header fields, so the cascade
+                does not escalate them for null required fields (only for
+                parse, schema or confidence failures)
+            
+        Returns:
+            Dict with extracted information as JSON
+        """
+        file_type = "PDF" if mime_type == "application/pdf" else "imagen"
+        
+        # Prompt part and generation config are built once per prompt
+        compiled = self.prompt_registry.get(prompt)
+        file_part = Part.from_bytes(
+            data=file_bytes,
+            mime_type=mime_type
+        )
+        
+        models = self.cascade.models if self.cascade is not None else [self.model_name]
+        for tier, model in enumerate(models):
+            last_tier = tier == len(models) - 1
             
             # Generate content
             self.logger.info(
-                f"Calling Gemini API for {file_type} analysis",
+                f"Calling Gemini API ({model}) for {file_type} analysis",
                 logger_name=self.name
             )
-            
-            response = self.gemini_client.models.generate_content(
-                model=self.model_name,
-                contents=contents,
-                config=config
-            )
+            started = time.monotonic()
+            try:
+                response = await self._call_tier(model, compiled, file_part, deadline)
+            except Exception as e:
+                if self.cascade is None or last_tier:
+                    if self.cascade is not None:
+                        self.cascade.record(model, time.monotonic() - started, "error")
+                    raise
+                self.cascade.record(model, time.monotonic() - started, "error")
+                self.logger.warning(
+                    f"Model {model} failed ({e}), escalating to {models[tier + 1]}",
+                    logger_name=self.name
+                )
+                continue
+            elapsed = time.monotonic() - started
             
             # Extract and parse the response
             if response and response.text:
                 result_text = response.text.strip()
                 self.logger.info(
-                    f"Gemini response received: {result_text[:200]}...",
+                    "Gemini response received: %.200s...",
+                    result_text,
                     logger_name=self.name
                 )
-                
-                try:
-                    # Parse JSON response
-                    result = json.loads(result_text)
-                    return result
-                except json.JSONDecodeError as e:
-                    self.logger.error(
-                        f"Failed to parse Gemini response as JSON: {e}",
-                        logger_name=self.name
-                    )
-                    # Return raw text if JSON parsing fails
-                    return {"raw_response": result_text}
+                result, schema_valid = self._parse_response(result_text, compiled)
             else:
                 self.logger.warning(
                     "Empty response from Gemini",
                     logger_name=self.name
                 )
-                return {"error": "No response from Gemini"}
-                
-        except Exception as e:
-            self.logger.error(
-                f"Error processing image with Gemini: {e}",
+                result, schema_valid = {"error": "No response from Gemini"}, False
+            
+            if self.cascade is None:
+                return result
+            avg_logprobs = response.avg_logprobs if response else None
+            reason = self.cascade.assess(
+                result,
+                schema_valid,
+                typed=compiled.response_model is not None and not page_chunk,
+                avg_logprobs=avg_logprobs
+            )
+            self.cascade.record(model, elapsed, reason, avg_logprobs)
+            if reason is None or last_tier:
+                return result
+            self.logger.info(
+                f"Result from {model} rejected ({reason}), escalating to {models[tier + 1]}",
                 logger_name=self.name
             )
-            exc_type, exc_obj, exc_tb = sys.exc_info()
-            fname = os.path.split(exc_tb.tb_frame.f_code.co_filename)[1]
-            self.logger.error(
-                f"{exc_type} en {fname} línea {exc_tb.tb_lineno}",
+
+    async def _call_tier(
+        self,
+        model: str,
+        compiled: CompiledPrompt,
+        file_part: Part,
+        deadline: float
+    ) -> ModelResponse:
+        """
+        Call one model with the compiled prompt
+        
+        The prompt registered as cached content belongs to the registry model,
+        so other cascade tiers always send the full prompt.
+        """
+        use_cached = model == self.prompt_registry.model_name
+        try:
+            return await self._call_model(
+                compiled.contents(file_part, use_cached=use_cached),
+                compiled.generation_config(use_cached=use_cached),
+                deadline,
+                model
+            )
+        except genai_errors.ClientError as e:
+            if not (use_cached and compiled.cached_content and is_cached_content_missing(e)):
+                raise
+            # Cached prompt expired/deleted: send the full prompt instead
+            self.logger.warning(
+                f"Cached prompt rejected by Gemini ({e}), falling back to full prompt",
                 logger_name=self.name
             )
-            raise
+            self.prompt_registry.invalidate()
+            return await self._call_model(
+                compiled.contents(file_part, use_cached=False),
+                compiled.generation_config(use_cached=False),
+                deadline,
+                model
+            )
+
+    def _parse_response(
+        self,
+        result_text: str,
+        compiled: CompiledPrompt
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Parse the model answer, repairing near-miss JSON and validating the schema
+        
+        Args:
+            result_text: Text returned by the model
+            compiled: Prompt used for the call (carries the response schema, if any)
+            
+        Returns:
+            Tuple (parsed JSON normalized to the response schema when it
+            validates, or ``{"raw_response": ...}`` if the text cannot be
+            repaired; True if the result matches the schema)
+        """
+        try:
+            result = json_codec.loads(result_text)
+        except json_codec.JSONDecodeError as e:
+            try:
+                # Fenced, truncated or trailing-comma output: repair instead of a new call
+                result = repair_json(result_text)
+                self._parse_stats["repaired"] += 1
+                self.logger.warning(
+                    f"Gemini response was not valid JSON ({e}), repaired it",
+                    logger_name=self.name
+                )
+            except ValueError:
+                self._parse_stats["unparseable"] += 1
+                self.logger.error(
+                    f"Failed to parse Gemini response as JSON: {e}",
+                    logger_name=self.name
+                )
+                # Return raw text if JSON parsing fails
+                return {"raw_response": result_text}, False
+        
+        if compiled.response_model is None:
+            return result, True
+        try:
+            return compiled.response_model.model_validate(result).model_dump(), True
+        except ValidationError as e:
+            self._parse_stats["schema_invalid"] += 1
+            self.logger.warning(
+                f"Gemini response does not match {compiled.response_model.__name__}:"
+                f" {e.error_count()} errors",
+                logger_name=self.name
+            )
+            return result, False
+
+    def parse_stats(self) -> Dict[str, int]:
+        """Counters of repaired, unparseable and schema-invalid model answers"""
+        return dict(self._parse_stats)
+
+    async def _generate_pdf_pages(
+        self,
+        file_bytes: bytes,
+        prompt: str,
+        deadline: float
+    ) -> Dict[str, Any]:
+        """
+        Split a multi-page PDF, extract each page range in parallel and merge
+        
+        Args:
+            file_bytes: Decoded PDF content
+            prompt: Instructions for what information to extract from the file
+            deadline: Event loop time by which all page calls must finish
+            
+        Returns:
+            Merged extracted data with ``_provenance`` (pages per field) and,
+            if some range failed, ``_page_errors``
+        """
+        chunks, skipped = await asyncio.to_thread(self.pdf_splitter.split, file_bytes)
+        if len(chunks) == 1:
+            return await self._generate(chunks[0].data, prompt, "application/pdf", deadline)
+        
+        self.logger.info(
+            f"PDF split into {len(chunks)} page ranges ({skipped} blank pages skipped)",
+            logger_name=self.name
+        )
+        results = await asyncio.gather(
+            *[
+                # Solo el primer rango lleva la cabecera del volante
+                self._generate(chunk.data, prompt, "application/pdf", deadline, page_chunk=index > 0)
+                for index, chunk in enumerate(chunks)
+            ],
+            return_exceptions=True
+        )
+        if all(isinstance(result, Exception) for result in results):
+            # Ninguna pagina se ha podido extraer: se propaga el primer error
+            raise results[0]
+        
+        merged = self.pdf_splitter.merge(list(zip(chunks, results)))
+        if skipped:
+            merged["_blank_pages_skipped"] = skipped
+        return merged
+
+    async def _call_model(self, contents, config, deadline: float, model: str = None):
+        """
+        Call generate_content under the adaptive limiter with bounded retries
+        
+        With hedging enabled, a model call that is slower than usual gets a
+        second identical call inside the same limiter slot (the hedge budget
+        bounds the extra in-flight calls).
+        """
+        model = model or self.model_name
+        
+        async def generate():
+            return await self.backend.generate(model, contents, config)
+        
+        async def call():
+            if self.hedging is None:
+                return await generate()
+            return await self.hedging.run(model, generate)
+        
+        if self.retry_policy is None:
+            return await call()
+        return await self.retry_policy.run(call, deadline, self.limiter)
+
+    async def _cache_call(self, func, *args):
+        """Run a cache operation, off the event loop when it touches disk"""
+        if self.cache.disk_enabled:
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    @staticmethod
+    def _is_cacheable(result: Dict[str, Any]) -> bool:
+        """Only well-formed extractions are cached, never fallbacks or errors"""
+        return (
+            isinstance(result, dict)
+            and "raw_response" not in result
+            and "error" not in result
+            and "_page_errors" not in result
+        )
@@ -0,0 +1,253 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from app.constants import Constants
+from app.services import json_codec
+
+
+class ExtractionCache:
+    """Cache de resultados de extraccion direccionado por contenido
+
+    Dos niveles:
+        - Memoria: LRU acotado por numero de entradas y con TTL (por worker)
+        - Disco (opcional): SQLite en modo WAL, compartido por todos los
+          workers de uvicorn del mismo host
+
+    La clave es un hash del fichero decodificado, el prompt, el mime_type y
+    el modelo, de modo que cualquier cambio en uno de ellos invalida la entrada.
+    """
+
+    # Cada cuantas escrituras se purga el nivel de disco
+    DISK_PURGE_EVERY = 100
+
+    def __init__(
+        self,
+        logger,
+        max_entries: int = Constants.CACHE_MAX_ENTRIES,
+        ttl_seconds: float = Constants.CACHE_TTL_SECONDS,
+        disk_path: Optional[str] = Constants.CACHE_DISK_PATH,
+        disk_max_entries: int = Constants.CACHE_DISK_MAX_ENTRIES,
+    ):
+        self.logger = logger
+        self.name = "Extraction_Cache"
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk_max_entries = disk_max_entries
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "bypassed": 0,
+            "sets": 0,
+            "evictions": 0,
+        }
+
+        self._disk = None
+        self._disk_lock = threading.Lock()
+        self._disk_writes = 0
+        if disk_path:
+            self._initialize_disk(disk_path)
+
+    def _initialize_disk(self, disk_path: str):
+        """Abre (o crea) la base de datos SQLite del nivel de disco"""
+        try:
+            directory = os.path.dirname(disk_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._disk = sqlite3.connect(
+                disk_path, timeout=5.0, check_same_thread=False, isolation_level=None
+            )
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute("PRAGMA synchronous=NORMAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS extraction_cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " created_at REAL NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            self._disk.execute(
+                "CREATE INDEX IF NOT EXISTS idx_extraction_cache_created"
+                " ON extraction_cache (created_at)"
+            )
+            self.logger.info(
+                f"Disk cache tier enabled at {disk_path}",
+                logger_name=self.name
+            )
+        except sqlite3.Error as e:
+            self.logger.error(
+                f"Failed to open disk cache at {disk_path}: {e}",
+                logger_name=self.name
+            )
+            self._disk = None
+
+    @property
+    def disk_enabled(self) -> bool:
+        """True si el nivel de disco esta activo"""
+        return self._disk is not None
+
+    @staticmethod
+    def build_key(
+        file_digest: str, prompt: str, mime_type: str, model: str, variant: str = ""
+    ) -> str:
+        """
+        Calcula la clave de cache de una extraccion
+
+        Args:
+            file_digest: SHA-256 del fichero (``FilePayload.sha256``), calculado
+                una sola vez por peticion
+            prompt: Prompt usado (por defecto o personalizado)
+            mime_type: MIME type del fichero
+            model: Modelo de Gemini
+            variant: Configuracion adicional que altera lo que se envia al
+                modelo (p.ej. el preprocesado de imagen)
+
+        Returns:
+            Hash SHA-256 en hexadecimal
+        """
+        digest = hashlib.sha256()
+        for part in (
+            (model or "").encode("utf-8"),
+            (mime_type or "").encode("utf-8"),
+            (prompt or "").encode("utf-8"),
+            variant.encode("utf-8"),
+            file_digest.encode("ascii"),
+        ):
+            # Prefijo de longitud para que las fronteras entre campos no sean ambiguas
+            digest.update(len(part).to_bytes(8, "big"))
+            digest.update(part)
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Busca un resultado en memoria y, si no esta, en disco
+
+        Args:
+            key: Clave calculada con ``build_key``
+
+        Returns:
+            Copia del resultado cacheado o None si no existe o ha caducado
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return json_codec.loads(value)
+                del self._memory[key]
+
+        value = self._disk_get(key, now)
+        if value is not None:
+            with self._lock:
+                self._stats["disk_hits"] += 1
+            self._memory_set(key, value, now + self.ttl_seconds)
+            return json_codec.loads(value)
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        """
+        Guarda un resultado en ambos niveles
+
+        Args:
+            key: Clave calculada con ``build_key``
+            result: Resultado de la extraccion (serializable a JSON)
+        """
+        now = time.time()
+        value = json_codec.dumps(result)
+        self._memory_set(key, value, now + self.ttl_seconds)
+        self._disk_set(key, value, now)
+        with self._lock:
+            self._stats["sets"] += 1
+
+    def record_bypass(self):
+        """Contabiliza una peticion que ha pedido saltarse la cache"""
+        with self._lock:
+            self._stats["bypassed"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Devuelve contadores de aciertos/fallos y ocupacion"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = (
+            round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4)
+            if lookups else 0.0
+        )
+        stats["disk_enabled"] = self.disk_enabled
+        return stats
+
+    def _memory_set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._memory[key] = (expires_at, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def _disk_get(self, key: str, now: float) -> Optional[str]:
+        if self._disk is None:
+            return None
+        try:
+            with self._disk_lock:
+                row = self._disk.execute(
+                    "SELECT value FROM extraction_cache WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            self.logger.warning(
+                f"Disk cache read failed: {e}",
+                logger_name=self.name
+            )
+            return None
+
+    def _disk_set(self, key: str, value: str, now: float):
+        if self._disk is None:
+            return
+        try:
+            with self._disk_lock:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO extraction_cache (key, value, created_at, expires_at)"
+                    " VALUES (?, ?, ?, ?)",
+                    (key, value, now, now + self.ttl_seconds),
+                )
+                self._disk_writes += 1
+                if self._disk_writes % self.DISK_PURGE_EVERY:
+                    return
+                # Purga periodica de caducados y recorte por tamano
+                self._disk.execute(
+                    "DELETE FROM extraction_cache WHERE expires_at <= ?", (now,)
+                )
+                self._disk.execute(
+                    "DELETE FROM extraction_cache WHERE key IN ("
+                    " SELECT key FROM extraction_cache ORDER BY created_at DESC"
+                    " LIMIT -1 OFFSET ?)",
+                    (self.disk_max_entries,),
+                )
+        except sqlite3.Error as e:
+            self.logger.warning(
+                f"Disk cache write failed: {e}",
+                logger_name=self.name
+            )
+
+    def close(self):
+        """Cierra la conexion del nivel de disco"""
+        if self._disk is not None:
+            with self._disk_lock:
+                self._disk.close()
+            self._disk = None
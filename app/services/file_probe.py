@@ -0,0 +1,256 @@
+import re
+import struct
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+
+from app.services.payload import FILE_TYPE_MIME_TYPES, sniff_file_type
+
+
+# Bytes del principio del archivo que se leen para sacar los metadatos. Cubre
+# la cabecera de las imagenes (incluido un EXIF grande antes del SOF de un
+# JPEG) y el diccionario de linealizacion de un PDF
+PROBE_HEAD_BYTES = 64 * 1024
+
+# Bytes del final: trailer, startxref y, normalmente, el arbol de paginas
+PROBE_TAIL_BYTES = 16 * 1024
+
+# Marcadores SOF de JPEG (los que llevan dimensiones); C4, C8 y CC no lo son
+JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+PDF_VERSION_RE = re.compile(rb"%PDF-(\d\.\d)")
+PDF_CATALOG_VERSION_RE = re.compile(rb"/Type\s*/Catalog[^>]*?/Version\s*/(\d\.\d)")
+PDF_LINEARIZED_PAGES_RE = re.compile(rb"/Linearized\b[^>]*?/N\s+(\d+)")
+PDF_ROOT_RE = re.compile(rb"/Root\s+(\d+)\s+\d+\s+R")
+PDF_PAGES_REF_RE = re.compile(rb"/Pages\s+(\d+)\s+\d+\s+R")
+PDF_PAGES_COUNT_RE = re.compile(rb"/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b")
+PDF_COUNT_RE = re.compile(rb"/Count\s+(\d+)")
+PDF_IMAGE_RE = re.compile(rb"/Subtype\s*/Image\b")
+
+
+@dataclass
+class FileMetadata:
+    """Metadatos de un archivo obtenidos solo de su cabecera (y cola)
+
+    Los campos que no se han podido determinar con los bytes disponibles
+    quedan a None; ``complete`` indica si se ha visto el archivo entero.
+    """
+    file_type: str
+    mime_type: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    pdf_version: Optional[str] = None
+    page_count: Optional[int] = None
+    # True: el PDF tiene fuentes (texto); False: solo imagenes (escaneado)
+    has_text_layer: Optional[bool] = None
+    complete: bool = False
+    details: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def scanned(self) -> Optional[bool]:
+        """True si el PDF parece escaneado (imagenes sin capa de texto)"""
+        if self.has_text_layer is None:
+            return None
+        return not self.has_text_layer
+
+
+def probe_file(head: bytes, tail: bytes = b"", size: Optional[int] = None) -> FileMetadata:
+    """
+    Obtiene tipo, dimensiones, paginas y version de un archivo sin parsearlo
+
+    Trabaja sobre un prefijo (lo recibido de un stream o lo decodificado de un
+    Base64) y, opcionalmente, los ultimos bytes del archivo. No lanza
+    excepciones: lo que no se puede leer se devuelve como None.
+
+    Args:
+        head: Primeros bytes del archivo (o el archivo completo)
+        tail: Ultimos bytes del archivo, si ``head`` no llega al final
+        size: Tamano total en bytes; si coincide con ``len(head)`` se
+            considera que ``head`` es el archivo completo
+
+    Returns:
+        FileMetadata con lo que se haya podido determinar
+    """
+    complete = size is not None and len(head) >= size
+    file_type = sniff_file_type(head)
+    metadata = FileMetadata(
+        file_type=file_type,
+        mime_type=FILE_TYPE_MIME_TYPES.get(file_type),
+        complete=complete,
+    )
+    try:
+        if file_type == "PDF":
+            _probe_pdf(metadata, head, b"" if complete else tail)
+        else:
+            dimensions = _IMAGE_PROBES.get(file_type, _no_dimensions)(head)
+            if dimensions is not None:
+                metadata.width, metadata.height = dimensions
+    except (struct.error, IndexError, ValueError):
+        # Cabecera truncada o corrupta: se devuelve lo que haya
+        pass
+    return metadata
+
+
+def _no_dimensions(head: bytes) -> None:
+    return None
+
+
+def _png_dimensions(head: bytes) -> Optional[Tuple[int, int]]:
+    # Firma (8) + longitud (4) + "IHDR" (4) + ancho y alto en big-endian
+    if head[12:16] != b"IHDR" or len(head) < 24:
+        return None
+    return struct.unpack(">II", head[16:24])
+
+
+def _jpeg_dimensions(head: bytes) -> Optional[Tuple[int, int]]:
+    offset = 2
+    length = len(head)
+    while offset + 9 <= length:
+        if head[offset] != 0xFF:
+            return None
+        marker = head[offset + 1]
+        if marker == 0xFF:
+            # Relleno entre marcadores
+            offset += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            # Marcadores sin segmento
+            offset += 2
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            height, width = struct.unpack(">HH", head[offset + 5:offset + 9])
+            return width, height
+        if marker in (0xD9, 0xDA):
+            # Fin de imagen o inicio de los datos comprimidos sin haber visto SOF
+            return None
+        segment_length = struct.unpack(">H", head[offset + 2:offset + 4])[0]
+        offset += 2 + segment_length
+    return None
+
+
+def _webp_dimensions(head: bytes) -> Optional[Tuple[int, int]]:
+    chunk = head[12:16]
+    if chunk == b"VP8 " and len(head) >= 30:
+        # Con perdida: 3 bytes de frame tag + firma 9d 01 2a + 14 bits por lado
+        width, height = struct.unpack("<HH", head[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L" and len(head) >= 25:
+        # Sin perdida: firma 0x2f + 14 bits (ancho - 1) + 14 bits (alto - 1)
+        bits = int.from_bytes(head[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X" and len(head) >= 30:
+        # Extendido: lienzo de 24 bits (menos 1) por lado
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return width, height
+    return None
+
+
+def _tiff_dimensions(head: bytes) -> Optional[Tuple[int, int]]:
+    endian = "<" if head[:2] == b"II" else ">"
+    ifd_offset = struct.unpack(endian + "I", head[4:8])[0]
+    if ifd_offset + 2 > len(head):
+        # El primer IFD puede estar al final del archivo
+        return None
+    entries = struct.unpack(endian + "H", head[ifd_offset:ifd_offset + 2])[0]
+    width = height = None
+    for index in range(entries):
+        start = ifd_offset + 2 + index * 12
+        if start + 12 > len(head):
+            break
+        tag, value_type = struct.unpack(endian + "HH", head[start:start + 4])
+        if tag not in (256, 257):
+            continue
+        # Tipo 3 = SHORT (en los 2 primeros bytes del valor), 4 = LONG
+        if value_type == 3:
+            value = struct.unpack(endian + "H", head[start + 8:start + 10])[0]
+        else:
+            value = struct.unpack(endian + "I", head[start + 8:start + 12])[0]
+        if tag == 256:
+            width = value
+        else:
+            height = value
+    if width is None or height is None:
+        return None
+    return width, height
+
+
+def _heic_dimensions(head: bytes) -> Optional[Tuple[int, int]]:
+    # Caja "ispe" (image spatial extents): version/flags (4) + ancho + alto
+    index = head.find(b"ispe")
+    if index == -1 or index + 16 > len(head):
+        return None
+    return struct.unpack(">II", head[index + 8:index + 16])
+
+
+_IMAGE_PROBES = {
+    "PNG": _png_dimensions,
+    "JPEG": _jpeg_dimensions,
+    "WEBP": _webp_dimensions,
+    "TIFF": _tiff_dimensions,
+    "HEIC": _heic_dimensions,
+}
+
+
+def _probe_pdf(metadata: FileMetadata, head: bytes, tail: bytes):
+    match = PDF_VERSION_RE.match(head)
+    metadata.pdf_version = match.group(1).decode() if match else None
+
+    # Un PDF linealizado declara el numero de paginas en el primer objeto
+    linearized = PDF_LINEARIZED_PAGES_RE.search(head[:2048])
+    if linearized:
+        metadata.page_count = int(linearized.group(1))
+        metadata.details["linearized"] = True
+
+    data = head + tail if tail else head
+    # Una actualizacion incremental puede subir la version en el catalogo
+    catalog_version = PDF_CATALOG_VERSION_RE.search(data)
+    if catalog_version and catalog_version.group(1).decode() > (metadata.pdf_version or ""):
+        metadata.pdf_version = catalog_version.group(1).decode()
+
+    if metadata.page_count is None:
+        metadata.page_count = _pdf_page_count(data)
+
+    has_fonts = b"/Font" in data
+    has_images = PDF_IMAGE_RE.search(data) is not None
+    compressed_objects = b"/ObjStm" in data
+    metadata.details["object_streams"] = compressed_objects
+    if has_fonts:
+        metadata.has_text_layer = True
+    elif has_images and metadata.complete and not compressed_objects:
+        # Solo se afirma que es escaneado si se han visto todos los diccionarios
+        metadata.has_text_layer = False
+    elif has_images:
+        metadata.details["images_without_fonts"] = True
+
+
+def _pdf_page_count(data: bytes) -> Optional[int]:
+    """
+    Numero de paginas siguiendo trailer -> /Root -> /Pages -> /Count
+
+    Si el arbol no esta entre los bytes disponibles (o va en un object
+    stream comprimido) se usa el mayor ``/Count`` de un nodo ``/Pages``,
+    que es el del nodo raiz.
+    """
+    roots = PDF_ROOT_RE.findall(data)
+    if roots:
+        # El ultimo trailer es el vigente tras actualizaciones incrementales
+        catalog = _pdf_object(data, roots[-1])
+        pages_ref = PDF_PAGES_REF_RE.search(catalog) if catalog else None
+        pages = _pdf_object(data, pages_ref.group(1)) if pages_ref else None
+        count = PDF_COUNT_RE.search(pages) if pages else None
+        if count:
+            return int(count.group(1))
+
+    counts = [int(a or b) for a, b in PDF_PAGES_COUNT_RE.findall(data)]
+    return max(counts) if counts else None
+
+
+def _pdf_object(data: bytes, number: bytes) -> Optional[bytes]:
+    """Diccionario del objeto ``number`` (la ultima definicion) o None"""
+    start = data.rfind(b"\n" + number + b" 0 obj")
+    if start == -1:
+        start = data.rfind(b"\r" + number + b" 0 obj")
+    if start == -1:
+        return None
+    end = data.find(b"endobj", start)
+    return data[start:end if end != -1 else start + 4096]
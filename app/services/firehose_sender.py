@@ -0,0 +1,373 @@
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple, Union
+
+from botocore.exceptions import ClientError
+
+from app.constants import Constants
+
+
+# Limites de PutRecordBatch de Firehose
+FIREHOSE_MAX_BATCH_RECORDS = 500
+FIREHOSE_MAX_BATCH_BYTES = 4 * 1024 * 1024
+FIREHOSE_MAX_RECORD_BYTES = 1000 * 1024
+
+
+def rejected_records(records: List[bytes], response: Dict[str, Any]) -> List[bytes]:
+    """
+    Registros de un ``put_record_batch`` que Firehose no ha aceptado
+
+    ``RequestResponses`` lleva una entrada por registro, en orden. Si faltan
+    entradas (respuesta truncada o sin ``RequestResponses``) no se puede
+    saber si esos registros entraron: se dan por fallidos y se reintentan.
+    """
+    responses = response.get("RequestResponses") or []
+    failed = [
+        data
+        for data, entry in zip(records, responses)
+        if entry.get("ErrorCode")
+    ]
+    failed.extend(records[len(responses):])
+    return failed
+
+
+class LocalFirehoseStub:
+    """Sustituto local de la API de Firehose (``put_record_batch``)
+
+    Guarda los registros recibidos por stream y puede simular fallos
+    parciales (``ServiceUnavailableException`` por entrada) y fallos de la
+    llamada completa, para probar el envio sin AWS.
+    """
+
+    def __init__(
+        self,
+        entry_failure_rate: float = 0.0,
+        call_failure_rate: float = 0.0,
+        latency_ms: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.entry_failure_rate = entry_failure_rate
+        self.call_failure_rate = call_failure_rate
+        self.latency_ms = latency_ms
+        self.records: Dict[str, List[bytes]] = {}
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def put_record_batch(self, DeliveryStreamName: str, Records: List[Dict[str, bytes]]) -> Dict[str, Any]:
+        if len(Records) > FIREHOSE_MAX_BATCH_RECORDS:
+            raise ValueError(f"Batch of {len(Records)} records exceeds {FIREHOSE_MAX_BATCH_RECORDS}")
+        if sum(len(record["Data"]) for record in Records) > FIREHOSE_MAX_BATCH_BYTES:
+            raise ValueError("Batch exceeds 4 MiB")
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        with self._lock:
+            self.calls += 1
+            if self._random.random() < self.call_failure_rate:
+                raise ClientError(
+                    {"Error": {"Code": "ServiceUnavailableException", "Message": "Slow down"}},
+                    "PutRecordBatch",
+                )
+            responses = []
+            failed = 0
+            stored = self.records.setdefault(DeliveryStreamName, [])
+            for record in Records:
+                if self._random.random() < self.entry_failure_rate:
+                    failed += 1
+                    responses.append({
+                        "ErrorCode": "ServiceUnavailableException",
+                        "ErrorMessage": "Slow down",
+                    })
+                else:
+                    stored.append(record["Data"])
+                    responses.append({"RecordId": f"{DeliveryStreamName}-{len(stored)}"})
+        return {"FailedPutCount": failed, "Encrypted": False, "RequestResponses": responses}
+
+
+class FirehoseBatchSender:
+    """Envio en segundo plano a Firehose con ``put_record_batch``
+
+    ``submit`` solo encola (no bloquea ni hace I/O). Una tarea del event
+    loop agrupa los registros por stream y envia un lote cuando se llega a
+    ``max_batch_records`` registros, a ``max_batch_bytes`` bytes o pasan
+    ``flush_interval`` segundos desde el primer registro pendiente. La
+    llamada a boto3 (sincrona) se hace en un hilo.
+
+    Si Firehose acepta el lote solo en parte, se reintentan unicamente las
+    entradas fallidas, con backoff exponencial, hasta ``max_attempts``. La
+    cola esta acotada: con ``max_queue_records`` pendientes ``submit``
+    descarta el registro y lo cuenta; ``stats()`` muestra la profundidad de
+    la cola y los descartes para vigilar la contrapresion.
+
+    Con un ``FirehoseSpool`` los registros que agotan los reintentos, y los
+    pendientes al parar, se guardan en disco en vez de perderse.
+    """
+
+    def __init__(
+        self,
+        logger,
+        client,
+        max_batch_records: int = Constants.FIREHOSE_BATCH_MAX_RECORDS,
+        max_batch_bytes: int = Constants.FIREHOSE_BATCH_MAX_BYTES,
+        flush_interval: float = Constants.FIREHOSE_FLUSH_INTERVAL,
+        max_queue_records: int = Constants.FIREHOSE_MAX_QUEUE_RECORDS,
+        max_attempts: int = Constants.FIREHOSE_MAX_ATTEMPTS,
+        base_delay: float = 0.2,
+        max_delay: float = 5.0,
+        spool=None,
+    ):
+        self.logger = logger
+        self.name = "Firehose_Sender"
+        self.client = client
+        self.max_batch_records = min(max_batch_records, FIREHOSE_MAX_BATCH_RECORDS)
+        self.max_batch_bytes = min(max_batch_bytes, FIREHOSE_MAX_BATCH_BYTES)
+        self.flush_interval = flush_interval
+        self.max_queue_records = max_queue_records
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # FirehoseSpool opcional donde acaban los registros que no se entregan
+        self.spool = spool
+        self._pending: Deque[Tuple[str, bytes]] = deque()
+        self._pending_bytes = 0
+        # Protege la cola, _pending_bytes y los contadores frente a submit desde otros hilos
+        self._lock = threading.Lock()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self._stats = {
+            "submitted": 0,
+            "sent": 0,
+            "failed": 0,
+            "retried_entries": 0,
+            "batches": 0,
+            "dropped_queue_full": 0,
+            "dropped_oversize": 0,
+            "spooled": 0,
+            "last_flush_ms": 0.0,
+            "max_queue_depth": 0,
+        }
+
+    def start(self):
+        """Arranca la tarea de envio en el event loop actual"""
+        if self._task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = self._loop.create_task(self._run())
+
+    async def stop(self, timeout: float = 10.0):
+        """
+        Envia lo pendiente (con ``timeout`` como maximo) y para la tarea
+
+        Al vencer ``timeout`` no se reintenta mas: se espera a la llamada a
+        ``put_record_batch`` en curso (acotada por los timeouts de boto3) y lo
+        que Firehose no acepto, junto con la cola, va al spool. Asi un
+        registro no acaba a la vez en Firehose y en el spool.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._task), timeout)
+        except asyncio.TimeoutError:
+            # El lote en curso espera a la respuesta de Firehose antes de guardar
+            # lo no entregado: el spool solo recibe registros que no han entrado
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            unsent = len(self._pending)
+            if self.spool is not None:
+                # Lo pendiente se guarda en disco para reenviarlo tras reiniciar
+                batches, _ = self._take_batches()
+                while batches:
+                    for stream_name, records in batches:
+                        self._spool(stream_name, records)
+                    batches, _ = self._take_batches()
+            self.logger.warning(
+                f"Firehose sender stopped with {unsent} records unsent"
+                + (" (spooled to disk)" if self.spool is not None else ""),
+                logger_name=self.name
+            )
+        self._task = None
+
+    def submit(self, stream_name: str, data: Union[str, bytes]) -> bool:
+        """
+        Encola un registro sin bloquear; se puede llamar desde cualquier hilo
+
+        Returns:
+            False si se ha descartado (cola llena o registro de mas de 1000 KiB)
+        """
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if len(data) > FIREHOSE_MAX_RECORD_BYTES:
+            with self._lock:
+                self._stats["dropped_oversize"] += 1
+            self.logger.warning(
+                f"Firehose record of {len(data)} bytes exceeds {FIREHOSE_MAX_RECORD_BYTES}, dropped",
+                logger_name=self.name
+            )
+            return False
+        with self._lock:
+            if len(self._pending) >= self.max_queue_records:
+                self._stats["dropped_queue_full"] += 1
+                return False
+            self._pending.append((stream_name, data))
+            self._pending_bytes += len(data)
+            self._stats["submitted"] += 1
+            depth = len(self._pending)
+            if depth > self._stats["max_queue_depth"]:
+                self._stats["max_queue_depth"] = depth
+            ready = depth == 1 or self._batch_ready()
+        # Se despierta a la tarea con el primer registro y con un lote lleno
+        if self._wakeup is not None and ready:
+            if threading.get_ident() == self._loop_thread:
+                self._wakeup.set()
+            else:
+                self._loop.call_soon_threadsafe(self._wakeup.set)
+        return True
+
+    async def _run(self):
+        full = False
+        while True:
+            if not self._pending:
+                if self._stopping:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            with self._lock:
+                ready = self._batch_ready()
+            if not (self._stopping or full or ready):
+                # Da tiempo a que se llene el lote, salvo que se llene antes
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            batches, full = self._take_batches()
+            for stream_name, records in batches:
+                try:
+                    await self._send_batch(stream_name, records)
+                except Exception as e:
+                    # Un fallo inesperado no puede parar la tarea: la cola se quedaria sin enviar
+                    with self._lock:
+                        self._stats["failed"] += len(records)
+                    self.logger.error(
+                        f"Unexpected error sending {len(records)} records to {stream_name}, dropped: {e}",
+                        logger_name=self.name
+                    )
+
+    def _batch_ready(self) -> bool:
+        return len(self._pending) >= self.max_batch_records or self._pending_bytes >= self.max_batch_bytes
+
+    def _take_batches(self) -> Tuple[List[Tuple[str, List[bytes]]], bool]:
+        """
+        Saca de la cola un lote por stream dentro de los limites de Firehose
+
+        Returns:
+            Los lotes y si alguno se ha quedado lleno (queda mas por enviar ya)
+        """
+        with self._lock:
+            return self._take_batches_locked()
+
+    def _take_batches_locked(self) -> Tuple[List[Tuple[str, List[bytes]]], bool]:
+        batches: Dict[str, List[bytes]] = {}
+        sizes: Dict[str, int] = {}
+        while self._pending:
+            stream_name, data = self._pending[0]
+            records = batches.setdefault(stream_name, [])
+            size = sizes.get(stream_name, 0) + len(data)
+            if len(records) >= self.max_batch_records or size > self.max_batch_bytes:
+                # Se para en el primer registro que no cabe para mantener el orden
+                return list(batches.items()), True
+            self._pending.popleft()
+            self._pending_bytes -= len(data)
+            records.append(data)
+            sizes[stream_name] = size
+        return list(batches.items()), False
+
+    async def _send_batch(self, stream_name: str, records: List[bytes]):
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            while records:
+                attempt += 1
+                put = asyncio.ensure_future(asyncio.to_thread(self._put, stream_name, records))
+                try:
+                    failed = await asyncio.shield(put)
+                except asyncio.CancelledError:
+                    # stop() con timeout: el hilo sigue con la llamada. Se espera
+                    # a su respuesta para guardar solo lo que Firehose no acepto
+                    # (sin ella, lo ya entregado se reenviaria desde el spool)
+                    try:
+                        failed = await put
+                    except Exception:
+                        failed = records
+                    self._stats["sent"] += len(records) - len(failed)
+                    records = failed
+                    raise
+                except Exception as e:
+                    # Ademas de ClientError/BotoCoreError: serializacion, respuesta inesperada...
+                    self.logger.warning(
+                        f"put_record_batch to {stream_name} failed ({len(records)} records): {e}",
+                        logger_name=self.name
+                    )
+                    failed = records
+                self._stats["batches"] += 1
+                self._stats["sent"] += len(records) - len(failed)
+                records = failed
+                if not failed:
+                    break
+                if attempt >= self.max_attempts:
+                    # Fuera de records antes de esperar: si se cancela, el hilo
+                    # termina de guardarlos y no se guardan dos veces
+                    records = []
+                    if self.spool is not None:
+                        await asyncio.to_thread(self._spool, stream_name, failed)
+                        break
+                    self._stats["failed"] += len(failed)
+                    self.logger.error(
+                        f"Dropping {len(failed)} records for {stream_name} after {attempt} attempts",
+                        logger_name=self.name
+                    )
+                    break
+                # Solo se reintentan las entradas fallidas
+                self._stats["retried_entries"] += len(failed)
+                delay = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+                await asyncio.sleep(random.uniform(0, delay))
+        except asyncio.CancelledError:
+            # Lo que quedaba por entregar (sin respuesta o pendiente de reintento)
+            if self.spool is not None and records:
+                self._spool(stream_name, records)
+            raise
+        self._stats["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    def _put(self, stream_name: str, records: List[bytes]) -> List[bytes]:
+        """Llamada a ``put_record_batch`` (en un hilo); devuelve las entradas rechazadas"""
+        response = self.client.put_record_batch(
+            DeliveryStreamName=stream_name,
+            Records=[{"Data": data} for data in records],
+        )
+        return rejected_records(records, response)
+
+    def _spool(self, stream_name: str, records: List[bytes]):
+        stored = self.spool.append(stream_name, records)
+        with self._lock:
+            self._stats["spooled"] += stored
+            self._stats["failed"] += len(records) - stored
+
+    def stats(self) -> Dict[str, Any]:
+        """Registros enviados, fallidos y descartados y profundidad de la cola"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queue_depth"] = len(self._pending)
+        stats["queue_utilization"] = round(len(self._pending) / self.max_queue_records, 4)
+        return stats
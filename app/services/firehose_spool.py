@@ -0,0 +1,424 @@
+import asyncio
+import os
+import struct
+import threading
+import zlib
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.constants import Constants
+from app.services import json_codec
+from app.services.firehose_sender import (
+    FIREHOSE_MAX_BATCH_BYTES,
+    FIREHOSE_MAX_BATCH_RECORDS,
+    rejected_records,
+)
+
+
+SEGMENT_SUFFIX = ".seg"
+CURSOR_FILE = "cursor.json"
+
+# Cabecera de cada registro: bytes del dato, bytes del stream, crc32(stream + dato)
+RECORD_HEADER = struct.Struct(">IHI")
+
+
+@dataclass(frozen=True)
+class SpoolPosition:
+    """Posicion de lectura: segmento y offset dentro de el"""
+    segment: int
+    offset: int
+
+
+class FirehoseSpool:
+    """Cola en disco, solo de escritura al final, de registros no entregados
+
+    Los registros se escriben en segmentos ``NNNNNNNNNN.seg`` de como mucho
+    ``segment_bytes``; cada uno lleva su stream y un crc32. El fichero
+    ``cursor.json`` guarda hasta donde se ha entregado: se actualiza (de
+    forma atomica, con ``os.replace``) solo despues de que Firehose acepte
+    los registros, y los segmentos ya entregados se borran. Al reiniciar se
+    sigue desde el cursor, asi que no se pierde ni se reenvia nada; la unica
+    ventana de duplicados es un lote enviado justo antes de morir el proceso
+    y sin cursor guardado.
+
+    Si el proceso muere a mitad de una escritura, al arrancar se recorta el
+    ultimo segmento al ultimo registro valido. Un registro con crc erroneo
+    en medio de un segmento invalida el resto del segmento (se cuenta en
+    ``corrupted``).
+
+    Con ``max_bytes`` en disco se rechazan los registros nuevos: se
+    conservan los mas antiguos.
+    """
+
+    def __init__(
+        self,
+        logger,
+        directory: str = Constants.FIREHOSE_SPOOL_DIR,
+        max_bytes: int = Constants.FIREHOSE_SPOOL_MAX_BYTES,
+        segment_bytes: int = Constants.FIREHOSE_SPOOL_SEGMENT_BYTES,
+        fsync: bool = Constants.FIREHOSE_SPOOL_FSYNC,
+    ):
+        self.logger = logger
+        self.name = "Firehose_Spool"
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._stats = {
+            "appended": 0,
+            "delivered": 0,
+            "rejected_full": 0,
+            "corrupted": 0,
+        }
+        os.makedirs(directory, exist_ok=True)
+
+        self._segments: List[int] = sorted(
+            int(filename[:-len(SEGMENT_SUFFIX)])
+            for filename in os.listdir(directory)
+            if filename.endswith(SEGMENT_SUFFIX) and filename[:-len(SEGMENT_SUFFIX)].isdigit()
+        )
+        self._cursor = self._load_cursor()
+        # Segmentos anteriores al cursor ya entregados (p.ej. borrado interrumpido)
+        for segment in [s for s in self._segments if s < self._cursor.segment]:
+            self._delete_segment(segment)
+        if self._segments:
+            self._recover_tail(self._segments[-1])
+        else:
+            self._segments.append(max(self._cursor.segment, 1))
+        self._writer = open(self._segment_path(self._segments[-1]), "ab")
+        self._bytes = sum(os.path.getsize(self._segment_path(s)) for s in self._segments)
+        self.logger.info(
+            f"Firehose spool ready at {directory} ({len(self._segments)} segments, {self._bytes} bytes)",
+            logger_name=self.name
+        )
+
+    def append(self, stream_name: str, records: List[bytes]) -> int:
+        """
+        Guarda en disco registros para ``stream_name``
+
+        Returns:
+            Cuantos se han guardado; el resto se ha rechazado por ``max_bytes``
+        """
+        stream = stream_name.encode("utf-8")
+        stored = 0
+        with self._lock:
+            for data in records:
+                frame = (
+                    RECORD_HEADER.pack(len(data), len(stream), zlib.crc32(data, zlib.crc32(stream)))
+                    + stream
+                    + data
+                )
+                if self._bytes + len(frame) > self.max_bytes:
+                    self._stats["rejected_full"] += len(records) - stored
+                    break
+                if self._writer.tell() and self._writer.tell() + len(frame) > self.segment_bytes:
+                    self._roll()
+                self._writer.write(frame)
+                self._bytes += len(frame)
+                stored += 1
+            self._sync()
+            self._stats["appended"] += stored
+        if stored < len(records):
+            self.logger.error(
+                f"Firehose spool full ({self.max_bytes} bytes): {len(records) - stored} records lost",
+                logger_name=self.name
+            )
+        return stored
+
+    def read(
+        self, max_records: int, max_bytes: int = FIREHOSE_MAX_BATCH_BYTES
+    ) -> Tuple[List[Tuple[str, bytes]], SpoolPosition]:
+        """
+        Lee registros pendientes desde el cursor sin avanzarlo
+
+        Returns:
+            Los registros ``(stream, dato)`` y la posicion que hay que pasar a
+            ``commit`` una vez entregados
+        """
+        records: List[Tuple[str, bytes]] = []
+        total = 0
+        with self._lock:
+            self._writer.flush()
+            position = self._cursor
+            for segment in self._segments:
+                if segment < position.segment:
+                    continue
+                offset = position.offset if segment == position.segment else 0
+                with open(self._segment_path(segment), "rb") as f:
+                    f.seek(offset)
+                    while len(records) < max_records:
+                        record = self._read_record(f, segment)
+                        if record is None:
+                            # Fin del segmento (o resto corrupto, que se salta)
+                            offset = f.tell()
+                            break
+                        if records and total + len(record[1]) > max_bytes:
+                            return records, SpoolPosition(segment, offset)
+                        records.append(record)
+                        total += len(record[1])
+                        offset = f.tell()
+                position = SpoolPosition(segment, offset)
+                if len(records) >= max_records:
+                    break
+        return records, position
+
+    def commit(self, position: SpoolPosition, delivered: int):
+        """Avanza el cursor hasta ``position`` y borra los segmentos ya entregados"""
+        with self._lock:
+            if (position.segment, position.offset) <= (self._cursor.segment, self._cursor.offset):
+                return
+            self._stats["delivered"] += delivered
+            if position.segment == self._segments[-1] and position.offset >= self._writer.tell():
+                # Todo entregado: se empieza un segmento nuevo para liberar el disco
+                self._roll()
+                position = SpoolPosition(self._segments[-1], 0)
+            self._cursor = position
+            self._save_cursor()
+            for segment in [s for s in self._segments if s < position.segment]:
+                self._bytes -= self._delete_segment(segment)
+
+    def pending_bytes(self) -> int:
+        """Bytes en disco aun no entregados (aproximado: incluye cabeceras)"""
+        with self._lock:
+            return self._bytes - self._cursor.offset
+
+    def close(self):
+        with self._lock:
+            self._sync()
+            self._writer.close()
+
+    def stats(self) -> Dict[str, Any]:
+        """Registros guardados, entregados y rechazados y ocupacion en disco"""
+        stats = dict(self._stats)
+        stats["segments"] = len(self._segments)
+        stats["bytes"] = self._bytes
+        stats["max_bytes"] = self.max_bytes
+        return stats
+
+    def _read_record(self, f, segment: int) -> Optional[Tuple[str, bytes]]:
+        header = f.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return None
+        data_length, stream_length, checksum = RECORD_HEADER.unpack(header)
+        body = f.read(stream_length + data_length)
+        if len(body) < stream_length + data_length:
+            return None
+        stream, data = body[:stream_length], body[stream_length:]
+        if zlib.crc32(data, zlib.crc32(stream)) != checksum:
+            self._stats["corrupted"] += 1
+            self.logger.error(
+                f"Corrupted record in spool segment {segment} at offset {f.tell() - len(body) - len(header)}; "
+                "skipping the rest of the segment",
+                logger_name=self.name
+            )
+            f.seek(0, os.SEEK_END)
+            return None
+        return stream.decode("utf-8"), data
+
+    def _recover_tail(self, segment: int):
+        """Recorta el ultimo segmento al ultimo registro completo y valido"""
+        path = self._segment_path(segment)
+        valid = 0
+        with open(path, "rb") as f:
+            while self._read_record(f, segment) is not None:
+                valid = f.tell()
+            size = f.seek(0, os.SEEK_END)
+        if valid < size:
+            self.logger.warning(
+                f"Truncating spool segment {segment} from {size} to {valid} bytes (incomplete write)",
+                logger_name=self.name
+            )
+            with open(path, "r+b") as f:
+                f.truncate(valid)
+
+    def _roll(self):
+        self._sync()
+        self._writer.close()
+        self._segments.append(self._segments[-1] + 1)
+        self._writer = open(self._segment_path(self._segments[-1]), "ab")
+
+    def _sync(self):
+        self._writer.flush()
+        if self.fsync:
+            os.fsync(self._writer.fileno())
+
+    def _delete_segment(self, segment: int) -> int:
+        """Borra un segmento y devuelve los bytes liberados"""
+        path = self._segment_path(segment)
+        size = 0
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+            os.remove(path)
+        self._segments.remove(segment)
+        return size
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.directory, f"{segment:010d}{SEGMENT_SUFFIX}")
+
+    def _load_cursor(self) -> SpoolPosition:
+        path = os.path.join(self.directory, CURSOR_FILE)
+        try:
+            with open(path, "rb") as f:
+                cursor = json_codec.loads(f.read())
+            return SpoolPosition(int(cursor["segment"]), int(cursor["offset"]))
+        except FileNotFoundError:
+            pass
+        except (json_codec.JSONDecodeError, KeyError, TypeError, ValueError) as e:
+            self.logger.error(
+                f"Invalid spool cursor, replaying from the oldest segment: {e}",
+                logger_name=self.name
+            )
+        first = self._segments[0] if self._segments else 1
+        return SpoolPosition(first, 0)
+
+    def _save_cursor(self):
+        path = os.path.join(self.directory, CURSOR_FILE)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(json_codec.dumpb({"segment": self._cursor.segment, "offset": self._cursor.offset}))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+
+class FirehoseSpoolReplayer:
+    """Reenvia a Firehose lo guardado en un ``FirehoseSpool``
+
+    Lee lotes desde el cursor y los envia con ``put_record_batch`` a como
+    mucho ``max_records_per_second`` registros por segundo, para no volver
+    a saturar el stream en cuanto se recupera. Si ningun registro del lote
+    entra (el stream sigue caido) no avanza el cursor y espera con backoff
+    exponencial. Las entradas rechazadas sueltas se vuelven a escribir al
+    final del spool antes de avanzar el cursor, de forma que ni se pierden
+    ni bloquean al resto. Un error inesperado (disco, cliente) se registra y
+    se trata como un lote fallido: el reenvio sigue con backoff.
+    """
+
+    def __init__(
+        self,
+        logger,
+        spool: FirehoseSpool,
+        client,
+        max_records_per_second: float = Constants.FIREHOSE_REPLAY_MAX_RECORDS_PER_SECOND,
+        idle_interval: float = 5.0,
+        max_backoff: float = 60.0,
+    ):
+        self.logger = logger
+        self.name = "Firehose_Spool_Replayer"
+        self.spool = spool
+        self.client = client
+        self.max_records_per_second = max_records_per_second
+        self.idle_interval = idle_interval
+        self.max_backoff = max_backoff
+        self.batch_records = max(1, min(FIREHOSE_MAX_BATCH_RECORDS, int(max_records_per_second)))
+        self._task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+        self._stats = {
+            "replayed": 0,
+            "requeued": 0,
+            "failed_batches": 0,
+        }
+
+    def start(self):
+        """Arranca el reenvio en el event loop actual"""
+        if self._task is None:
+            self._stopping = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Para al terminar el lote en curso (sin cancelarlo: se guarda su cursor)"""
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self._task
+        self._task = None
+
+    async def _sleep(self, seconds: float) -> bool:
+        """Espera ``seconds``; True si mientras tanto se ha pedido parar"""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), seconds)
+        except asyncio.TimeoutError:
+            pass
+        return self._stopping.is_set()
+
+    async def _run(self):
+        backoff = 1.0
+        while not self._stopping.is_set():
+            try:
+                delay = await self._replay_batch()
+            except Exception as e:
+                self.logger.error(
+                    f"Unexpected error replaying spooled records: {e}",
+                    logger_name=self.name
+                )
+                delay = None
+            if delay is None:
+                self._stats["failed_batches"] += 1
+                await self._sleep(backoff)
+                backoff = min(self.max_backoff, backoff * 2)
+                continue
+            backoff = 1.0
+            await self._sleep(delay)
+
+    async def _replay_batch(self) -> Optional[float]:
+        """
+        Reenvia un lote desde el cursor
+
+        Returns:
+            Segundos a esperar antes del siguiente lote, o None si no se ha
+            entregado nada y hay que reintentar con backoff
+        """
+        records, position = await asyncio.to_thread(self.spool.read, self.batch_records)
+        if not records:
+            # Si solo quedaban bytes corruptos, ``position`` ya esta detras de
+            # ellos: se avanza el cursor para no volver a leerlos en cada ciclo
+            await asyncio.to_thread(self.spool.commit, position, 0)
+            return self.idle_interval
+        delivered, failed = await self._send(records)
+        if not delivered:
+            return None
+        for stream_name, data in failed.items():
+            await asyncio.to_thread(self.spool.append, stream_name, data)
+            self._stats["requeued"] += len(data)
+        await asyncio.to_thread(self.spool.commit, position, delivered)
+        self._stats["replayed"] += delivered
+        self.logger.info(
+            f"Replayed {delivered} spooled records to Firehose",
+            logger_name=self.name
+        )
+        return len(records) / self.max_records_per_second
+
+    async def _send(self, records: List[Tuple[str, bytes]]) -> Tuple[int, Dict[str, List[bytes]]]:
+        """Envia el lote agrupado por stream; devuelve entregados y rechazados por stream"""
+        by_stream: Dict[str, List[bytes]] = {}
+        for stream_name, data in records:
+            by_stream.setdefault(stream_name, []).append(data)
+        delivered = 0
+        failed: Dict[str, List[bytes]] = {}
+        for stream_name, batch in by_stream.items():
+            try:
+                response = await asyncio.to_thread(
+                    self.client.put_record_batch,
+                    DeliveryStreamName=stream_name,
+                    Records=[{"Data": data} for data in batch],
+                )
+            except Exception as e:
+                # Cualquier fallo del cliente deja el lote en el spool para el siguiente intento
+                self.logger.warning(
+                    f"Replay to {stream_name} failed ({len(batch)} records): {e}",
+                    logger_name=self.name
+                )
+                failed[stream_name] = batch
+                continue
+            rejected = rejected_records(batch, response)
+            delivered += len(batch) - len(rejected)
+            if rejected:
+                failed[stream_name] = rejected
+        return delivered, failed
+
+    def stats(self) -> Dict[str, Any]:
+        stats = dict(self._stats)
+        stats["spool"] = self.spool.stats()
+        return stats
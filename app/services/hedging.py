@@ -0,0 +1,142 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+from app.constants import Constants
+
+
+class HedgePolicy:
+    """Peticiones "hedged" para recortar la cola de latencia del modelo
+
+    Si la primera llamada no ha terminado cuando se supera el percentil
+    ``percentile`` de la latencia reciente (por modelo), se lanza una segunda
+    llamada identica. Gana la primera que termina bien y la otra se cancela.
+
+    El gasto extra esta acotado por un presupuesto: cada llamada principal
+    suma ``budget_ratio`` creditos (hasta ``budget_burst``) y cada llamada de
+    cobertura consume uno, de modo que a largo plazo no se lanzan mas de
+    ``budget_ratio`` llamadas extra por llamada. Hasta tener ``min_samples``
+    latencias de un modelo no se cubre ninguna llamada.
+    """
+
+    def __init__(
+        self,
+        logger,
+        percentile: float = Constants.HEDGE_PERCENTILE,
+        min_delay_ms: float = Constants.HEDGE_MIN_DELAY_MS,
+        budget_ratio: float = Constants.HEDGE_BUDGET_RATIO,
+        budget_burst: float = Constants.HEDGE_BUDGET_BURST,
+        min_samples: int = Constants.HEDGE_MIN_SAMPLES,
+        window: int = Constants.HEDGE_WINDOW,
+    ):
+        self.logger = logger
+        self.name = "Hedge_Policy"
+        self.percentile = percentile
+        self.min_delay = min_delay_ms / 1000
+        self.budget_ratio = budget_ratio
+        self.budget_burst = budget_burst
+        self.min_samples = min_samples
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._budget = budget_burst
+        self._stats = {
+            "calls": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "primary_wins": 0,
+            "budget_exhausted": 0,
+        }
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """
+        Espera antes de lanzar la llamada de cobertura
+
+        Returns:
+            Segundos, o None si aun no hay suficientes latencias observadas
+        """
+        latencies = self._latencies.get(key)
+        if latencies is None or len(latencies) < self.min_samples:
+            return None
+        ordered = sorted(latencies)
+        index = min(len(ordered) - 1, math.ceil(self.percentile / 100 * len(ordered)) - 1)
+        return max(self.min_delay, ordered[max(index, 0)])
+
+    def record_latency(self, key: str, latency: float):
+        """Anade la latencia de una llamada completada a la ventana del modelo"""
+        latencies = self._latencies.get(key)
+        if latencies is None:
+            latencies = self._latencies[key] = deque(maxlen=self.window)
+        latencies.append(latency)
+
+    async def run(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Ejecuta ``func`` y, si tarda demasiado, una segunda copia en paralelo
+
+        Args:
+            key: Ventana de latencias a usar (normalmente el modelo)
+            func: Funcion sin argumentos que devuelve la corrutina de la llamada
+
+        Returns:
+            Resultado de la primera llamada que termine correctamente
+
+        Raises:
+            La excepcion de la llamada principal si fallan todas
+        """
+        self._stats["calls"] += 1
+        self._budget = min(self.budget_burst, self._budget + self.budget_ratio)
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        primary = loop.create_task(func())
+        tasks = [primary]
+        try:
+            delay = self.hedge_delay(key)
+            if delay is not None:
+                done, _ = await asyncio.wait(tasks, timeout=delay)
+                if not done:
+                    if self._budget >= 1:
+                        self._budget -= 1
+                        self._stats["hedged"] += 1
+                        self.logger.info(
+                            f"No response from {key} after {delay * 1000:.0f} ms, sending hedged request",
+                            logger_name=self.name
+                        )
+                        tasks.append(loop.create_task(func()))
+                    else:
+                        self._stats["budget_exhausted"] += 1
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winner = next((task for task in done if task.exception() is None), None)
+                if winner is None:
+                    continue
+                self.record_latency(key, time.monotonic() - started)
+                if len(tasks) > 1:
+                    self._stats["hedge_wins" if winner is tasks[1] else "primary_wins"] += 1
+                return winner.result()
+            # Todas han fallado: se propaga el error de la llamada principal
+            return primary.result()
+        finally:
+            # La perdedora (o todas, si nos cancelan) no debe seguir consumiendo cuota
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            for task in tasks:
+                if task.done() and not task.cancelled():
+                    task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """Llamadas cubiertas, quien gana y retardo actual por modelo"""
+        stats = dict(self._stats)
+        hedged = stats["hedged"]
+        stats["hedge_rate"] = round(hedged / stats["calls"], 4) if stats["calls"] else 0.0
+        stats["hedge_win_rate"] = round(stats["hedge_wins"] / hedged, 4) if hedged else 0.0
+        stats["budget"] = round(self._budget, 2)
+        stats["hedge_delay_ms"] = {
+            key: round(delay * 1000, 1)
+            for key in self._latencies
+            if (delay := self.hedge_delay(key)) is not None
+        }
+        return stats
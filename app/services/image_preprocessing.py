@@ -0,0 +1,170 @@
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict
+
+from PIL import Image, ImageOps
+
+from app.constants import Constants
+
+
+# Formatos que se pueden reducir antes de enviarlos a Gemini
+PREPROCESSABLE_MIME_TYPES = ("image/jpeg", "image/png", "image/webp")
+
+
+@dataclass
+class PreprocessResult:
+    """Resultado del preprocesado de una imagen"""
+    data: bytes
+    mime_type: str
+    original_bytes: int
+    processed_bytes: int
+    elapsed_ms: float
+    applied: bool
+
+    @property
+    def bytes_saved(self) -> int:
+        return self.original_bytes - self.processed_bytes
+
+
+class ImagePreprocessor:
+    """Reduce las imagenes antes de enviarlas a Gemini
+
+    Pasos: rotacion segun EXIF, reduccion al lado largo maximo, escala de
+    grises opcional y recodificacion a JPEG con la calidad configurada. Si el
+    resultado no es mas pequeno que el original se envia el original.
+
+    El trabajo de Pillow se ejecuta en un pool de hilos para no bloquear el
+    event loop (la decodificacion y el redimensionado liberan el GIL).
+    """
+
+    def __init__(
+        self,
+        logger,
+        max_long_edge: int = Constants.PREPROCESS_MAX_LONG_EDGE,
+        grayscale: bool = Constants.PREPROCESS_GRAYSCALE,
+        jpeg_quality: int = Constants.PREPROCESS_JPEG_QUALITY,
+        workers: int = Constants.PREPROCESS_WORKERS,
+    ):
+        self.logger = logger
+        self.name = "Image_Preprocessor"
+        self.max_long_edge = max_long_edge
+        self.grayscale = grayscale
+        self.jpeg_quality = jpeg_quality
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="image-preprocess"
+        )
+        self._stats = {
+            "processed": 0,
+            "skipped": 0,
+            "failed": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "total_ms": 0.0,
+        }
+
+    @property
+    def signature(self) -> str:
+        """Identifica la configuracion; forma parte de la clave de cache"""
+        return f"pre:{self.max_long_edge}:{int(self.grayscale)}:{self.jpeg_quality}"
+
+    def supports(self, mime_type: str) -> bool:
+        """True si el tipo de fichero se preprocesa"""
+        return mime_type in PREPROCESSABLE_MIME_TYPES
+
+    async def process(self, file_bytes: bytes, mime_type: str) -> PreprocessResult:
+        """
+        Preprocesa una imagen en el pool de hilos
+
+        Args:
+            file_bytes: Bytes originales de la imagen
+            mime_type: MIME type original
+
+        Returns:
+            PreprocessResult con los bytes a enviar y las metricas del paso
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            result = await loop.run_in_executor(
+                self._executor, self._process_sync, file_bytes, mime_type
+            )
+        except Exception as e:
+            self._stats["failed"] += 1
+            self.logger.warning(
+                f"Image preprocessing failed, sending original: {e}",
+                logger_name=self.name
+            )
+            return PreprocessResult(
+                data=file_bytes,
+                mime_type=mime_type,
+                original_bytes=len(file_bytes),
+                processed_bytes=len(file_bytes),
+                elapsed_ms=0.0,
+                applied=False,
+            )
+
+        self._stats["processed" if result.applied else "skipped"] += 1
+        self._stats["bytes_in"] += result.original_bytes
+        self._stats["bytes_out"] += result.processed_bytes
+        self._stats["total_ms"] += result.elapsed_ms
+        self.logger.info(
+            f"Image preprocessed: {result.original_bytes} -> {result.processed_bytes} bytes"
+            f" (saved {result.bytes_saved}) in {result.elapsed_ms:.1f} ms",
+            logger_name=self.name
+        )
+        return result
+
+    def _process_sync(self, file_bytes: bytes, mime_type: str) -> PreprocessResult:
+        started = time.perf_counter()
+        with Image.open(io.BytesIO(file_bytes)) as image:
+            if max(image.size) > self.max_long_edge:
+                # draft() permite a libjpeg decodificar ya reducido (mucho mas rapido);
+                # se pide un cuadrado para que no dependa de la rotacion EXIF
+                image.draft(image.mode, (self.max_long_edge, self.max_long_edge))
+            image = ImageOps.exif_transpose(image)
+            if max(image.size) > self.max_long_edge:
+                image.thumbnail(
+                    (self.max_long_edge, self.max_long_edge), Image.Resampling.LANCZOS
+                )
+            if self.grayscale:
+                image = image.convert("L")
+            elif image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=self.jpeg_quality, optimize=True)
+            processed = output.getvalue()
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if len(processed) >= len(file_bytes):
+            return PreprocessResult(
+                data=file_bytes,
+                mime_type=mime_type,
+                original_bytes=len(file_bytes),
+                processed_bytes=len(file_bytes),
+                elapsed_ms=elapsed_ms,
+                applied=False,
+            )
+        return PreprocessResult(
+            data=processed,
+            mime_type="image/jpeg",
+            original_bytes=len(file_bytes),
+            processed_bytes=len(processed),
+            elapsed_ms=elapsed_ms,
+            applied=True,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores agregados de bytes ahorrados y tiempo empleado"""
+        stats = dict(self._stats)
+        runs = stats["processed"] + stats["skipped"]
+        stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+        stats["avg_ms"] = round(stats["total_ms"] / runs, 2) if runs else 0.0
+        stats["total_ms"] = round(stats["total_ms"], 2)
+        return stats
+
+    def close(self):
+        """Libera el pool de hilos"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,463 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Optional, Set
+
+from app.constants import Constants, ImagePrompts
+from app.services import json_codec
+from app.services.logging_service import request_id_var
+from app.services.rate_limiter import ModelUnavailableError
+
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+FINISHED_STATUSES = (JOB_SUCCEEDED, JOB_FAILED)
+
+
+class JobStore:
+    """Cola persistente de trabajos de extraccion sobre SQLite
+
+    La base de datos puede compartirse entre varios procesos (workers de
+    uvicorn). Un trabajo reclamado queda ``running`` con un lease; si el
+    proceso muere antes de terminarlo, el lease caduca y otro worker lo
+    vuelve a reclamar, de modo que los trabajos sobreviven a un reinicio.
+    """
+
+    def __init__(
+        self,
+        logger,
+        db_path: str = Constants.JOBS_DB_PATH,
+        lease_seconds: float = Constants.JOBS_LEASE_SECONDS,
+        max_attempts: int = Constants.JOBS_MAX_ATTEMPTS,
+        retention_seconds: float = Constants.JOBS_RETENTION_SECONDS,
+    ):
+        self.logger = logger
+        self.name = "Job_Store"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(
+            db_path, timeout=10.0, check_same_thread=False, isolation_level=None
+        )
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " request TEXT,"
+            " result TEXT,"
+            " error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " lease_expires_at REAL,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)"
+        )
+        self.logger.info(
+            f"Job store ready at {db_path}",
+            logger_name=self.name
+        )
+
+    def submit(self, request: Dict[str, Any]) -> str:
+        """
+        Encola un trabajo nuevo
+
+        Args:
+            request: Parametros de la extraccion (file_base64, mime_type, prompt, use_cache)
+
+        Returns:
+            Identificador del trabajo
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, status, request, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (job_id, JOB_QUEUED, json_codec.dumps(request), now, now),
+            )
+        return job_id
+
+    def claim_next(self) -> Optional[Dict[str, Any]]:
+        """
+        Reclama de forma atomica el siguiente trabajo pendiente
+
+        Tambien recupera trabajos ``running`` cuyo lease ha caducado (proceso
+        caido o reiniciado). Los trabajos devueltos con ``retry_later`` no se
+        reclaman hasta que pasa su espera.
+
+        Returns:
+            Dict con ``id``, ``request`` y ``attempts`` o None si no hay trabajo
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                while True:
+                    row = self._db.execute(
+                        "SELECT id, request, attempts FROM jobs"
+                        " WHERE (status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?))"
+                        " OR (status = ? AND lease_expires_at < ?)"
+                        " ORDER BY created_at LIMIT 1",
+                        (JOB_QUEUED, now, JOB_RUNNING, now),
+                    ).fetchone()
+                    if row is None:
+                        self._db.execute("COMMIT")
+                        return None
+                    attempts = row["attempts"] + 1
+                    if attempts <= self.max_attempts:
+                        break
+                    # Trabajo que ha tumbado el proceso demasiadas veces
+                    self._db.execute(
+                        "UPDATE jobs SET status = ?, error = ?, request = NULL,"
+                        " lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                        (JOB_FAILED, "Maximum attempts exceeded", now, row["id"]),
+                    )
+                self._db.execute(
+                    "UPDATE jobs SET status = ?, attempts = ?, lease_expires_at = ?,"
+                    " updated_at = ? WHERE id = ?",
+                    (JOB_RUNNING, attempts, now + self.lease_seconds, now, row["id"]),
+                )
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+        return {
+            "id": row["id"],
+            "request": json_codec.loads(row["request"]),
+            "attempts": attempts,
+        }
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        """Marca un trabajo como terminado y guarda su resultado"""
+        self._finish(job_id, JOB_SUCCEEDED, result=json_codec.dumps(result))
+
+    def fail(self, job_id: str, error: str):
+        """Marca un trabajo como fallido"""
+        self._finish(job_id, JOB_FAILED, error=error)
+
+    def release(self, job_id: str):
+        """Devuelve a la cola un trabajo reclamado que no se ha llegado a terminar"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, attempts = MAX(attempts - 1, 0),"
+                " lease_expires_at = NULL, updated_at = ? WHERE id = ? AND status = ?",
+                (JOB_QUEUED, time.time(), job_id, JOB_RUNNING),
+            )
+
+    def retry_later(self, job_id: str, delay: float):
+        """
+        Devuelve a la cola un trabajo que no se pudo hacer por un fallo transitorio
+
+        A diferencia de ``release``, el intento cuenta (al llegar a
+        ``max_attempts`` el trabajo falla) y no se vuelve a reclamar hasta
+        dentro de ``delay`` segundos.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = ?, lease_expires_at = ?, updated_at = ?"
+                " WHERE id = ? AND status = ?",
+                (JOB_QUEUED, now + delay, now, job_id, JOB_RUNNING),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el estado de un trabajo
+
+        Args:
+            job_id: Identificador devuelto por ``submit``
+
+        Returns:
+            Dict con el estado (y resultado o error si ha terminado) y el
+            prompt personalizado, si lo hay, o None
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT id, status, result, error, attempts, created_at, updated_at,"
+                " json_extract(request, '$.prompt') AS prompt"
+                " FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "job_id": row["id"],
+            "status": row["status"],
+            "result": json_codec.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "prompt": row["prompt"],
+            "attempts": row["attempts"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def stats(self) -> Dict[str, int]:
+        """Numero de trabajos por estado"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT status, COUNT(*) AS total FROM jobs GROUP BY status"
+            ).fetchall()
+        return {row["status"]: row["total"] for row in rows}
+
+    def purge_finished(self) -> int:
+        """Borra los trabajos terminados mas antiguos que la retencion"""
+        with self._lock:
+            cursor = self._db.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (*FINISHED_STATUSES, time.time() - self.retention_seconds),
+            )
+        return cursor.rowcount
+
+    def close(self):
+        """Cierra la conexion con la base de datos"""
+        with self._lock:
+            self._db.close()
+
+    def _finish(self, job_id: str, status: str, result: str = None, error: str = None):
+        with self._lock:
+            # El fichero ya no hace falta: se descarta para no inflar la base de
+            # datos. Se conserva el prompt, que decide como se tipa el resultado
+            self._db.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?,"
+                " request = json_object('prompt', json_extract(request, '$.prompt')),"
+                " lease_expires_at = NULL, updated_at = ? WHERE id = ?",
+                (status, result, error, time.time(), job_id),
+            )
+
+
+class JobWorkerPool:
+    """Pool de workers asincronos que consume la cola de ``JobStore``
+
+    Cada worker reclama un trabajo, llama a ``GeminiService.process_image`` y
+    guarda el resultado. Los workers se despiertan al encolar un trabajo en
+    este proceso y, en cualquier caso, cada ``poll_interval`` segundos para
+    recoger trabajos encolados por otros procesos o pendientes de un reinicio.
+    """
+
+    # Cada cuanto se purgan los trabajos terminados antiguos
+    PURGE_INTERVAL_SECONDS = 600
+
+    def __init__(
+        self,
+        logger,
+        store: JobStore,
+        gemini_service,
+        workers: int = Constants.JOBS_WORKERS,
+        poll_interval: float = Constants.JOBS_POLL_INTERVAL,
+        retry_delay: float = Constants.JOBS_RETRY_DELAY_SECONDS,
+    ):
+        self.logger = logger
+        self.name = "Job_Worker_Pool"
+        self.store = store
+        self.gemini_service = gemini_service
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.retry_delay = retry_delay
+        self._tasks = []
+        self._claimed: Set[str] = set()
+        self._watchers: Dict[str, Set[asyncio.Event]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._last_purge = 0.0
+
+    def start(self):
+        """Arranca los workers en el event loop actual"""
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._worker(worker_id))
+            for worker_id in range(self.workers)
+        ]
+        self.logger.info(
+            f"Started {self.workers} job workers",
+            logger_name=self.name
+        )
+
+    async def stop(self):
+        """Detiene los workers y devuelve a la cola los trabajos a medias"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job_id in list(self._claimed):
+            self.store.release(job_id)
+        self._claimed.clear()
+
+    async def submit(self, request: Dict[str, Any]) -> str:
+        """
+        Encola un trabajo y despierta a un worker
+
+        Args:
+            request: Parametros de la extraccion (file_base64, mime_type, prompt, use_cache)
+
+        Returns:
+            Identificador del trabajo
+        """
+        job_id = await asyncio.to_thread(self.store.submit, request)
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Estado actual de un trabajo"""
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def wait_for_update(self, job_id: str, timeout: float):
+        """
+        Espera a que el trabajo cambie de estado en este proceso o a que pase ``timeout``
+
+        Los cambios hechos por otros procesos se detectan al volver a consultar
+        el store tras el timeout.
+        """
+        event = asyncio.Event()
+        self._watchers.setdefault(job_id, set()).add(event)
+        try:
+            await asyncio.wait_for(event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            watchers = self._watchers.get(job_id)
+            if watchers is not None:
+                watchers.discard(event)
+                if not watchers:
+                    del self._watchers[job_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado de la cola y del pool"""
+        return {
+            "workers": len(self._tasks),
+            "running_here": len(self._claimed),
+            "jobs": self.store.stats(),
+        }
+
+    def _notify(self, job_id: str):
+        for event in self._watchers.get(job_id, ()):
+            event.set()
+
+    async def _worker(self, worker_id: int):
+        while True:
+            try:
+                job = await asyncio.to_thread(self.store.claim_next)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(
+                    f"Worker {worker_id} failed to claim job: {e}",
+                    logger_name=self.name
+                )
+                job = None
+
+            if job is None:
+                await self._maybe_purge()
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            await self._run_job(worker_id, job)
+
+    async def _run_job(self, worker_id: int, job: Dict[str, Any]):
+        job_id = job["id"]
+        request = job["request"]
+        # Los logs del trabajo llevan su job_id como request ID
+        request_id_var.set(job_id)
+        self._claimed.add(job_id)
+        self._notify(job_id)
+        self.logger.info(
+            f"Worker {worker_id} processing job {job_id} (attempt {job['attempts']})",
+            logger_name=self.name
+        )
+        try:
+            result = await self.gemini_service.process_image(
+                image_base64=request["file_base64"],
+                prompt=request.get("prompt") or ImagePrompts.VOLANTE_MAPFRE_PROMPT,
+                mime_type=request.get("mime_type", "image/jpeg"),
+                use_cache=request.get("use_cache", True)
+            )
+        except asyncio.CancelledError:
+            # Apagado: el trabajo vuelve a la cola en stop()
+            raise
+        except ModelUnavailableError as e:
+            if job["attempts"] < self.store.max_attempts:
+                # Gemini saturado o caido: se reintenta mas tarde con backoff
+                delay = self.retry_delay * 2 ** (job["attempts"] - 1)
+                self.logger.warning(
+                    f"Job {job_id} postponed {delay:g}s: {e}",
+                    logger_name=self.name
+                )
+                await self._update_store(job_id, self.store.retry_later, job_id, delay)
+            else:
+                self.logger.error(
+                    f"Job {job_id} failed: {e}",
+                    logger_name=self.name
+                )
+                await self._update_store(job_id, self.store.fail, job_id, str(e))
+        except Exception as e:
+            self.logger.error(
+                f"Job {job_id} failed: {e}",
+                logger_name=self.name
+            )
+            await self._update_store(job_id, self.store.fail, job_id, str(e))
+        else:
+            if await self._update_store(job_id, self.store.complete, job_id, result):
+                self.logger.info(
+                    f"Job {job_id} completed",
+                    logger_name=self.name
+                )
+        self._claimed.discard(job_id)
+        self._notify(job_id)
+
+    async def _update_store(self, job_id: str, update, *args) -> bool:
+        """
+        Guarda el desenlace de un trabajo sin tumbar al worker si falla SQLite
+
+        Si no se puede guardar, el trabajo sigue ``running`` y otro worker lo
+        vuelve a reclamar cuando caduque su lease.
+
+        Returns:
+            True si se ha guardado
+        """
+        try:
+            await asyncio.to_thread(update, *args)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.logger.error(
+                f"Failed to update job {job_id} in the store: {e}",
+                logger_name=self.name
+            )
+            return False
+        return True
+
+    async def _maybe_purge(self):
+        now = time.time()
+        if now - self._last_purge < self.PURGE_INTERVAL_SECONDS:
+            return
+        self._last_purge = now
+        try:
+            purged = await asyncio.to_thread(self.store.purge_finished)
+            if purged:
+                self.logger.info(
+                    f"Purged {purged} finished jobs",
+                    logger_name=self.name
+                )
+        except Exception as e:
+            self.logger.warning(
+                f"Failed to purge finished jobs: {e}",
+                logger_name=self.name
+            )
@@ -0,0 +1,66 @@
+import json
+from typing import Any, Union
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - depende del entorno
+    orjson = None
+
+
+# orjson es opcional: sin el se usa la libreria estandar con la misma salida
+HAS_ORJSON = orjson is not None
+
+# Las dos librerias lanzan una subclase de este error
+JSONDecodeError = json.JSONDecodeError
+
+if HAS_ORJSON:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def dumpb(obj: Any) -> bytes:
+    """
+    Serializa ``obj`` a JSON compacto en UTF-8
+
+    Con orjson es varias veces mas rapido que ``json.dumps`` y no pasa por
+    ``str``. Los caracteres no ASCII (tildes, ñ) se escriben tal cual.
+    """
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def dumps(obj: Any) -> str:
+    """Como ``dumpb`` pero devuelve ``str`` (SSE, SQLite, logs)"""
+    if HAS_ORJSON:
+        return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode("utf-8")
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(data: Union[str, bytes, bytearray, memoryview]) -> Any:
+    """
+    Parsea JSON desde ``str`` o ``bytes``
+
+    orjson es mas estricto que la libreria estandar (NaN, enteros de mas de
+    64 bits): si rechaza el texto se reintenta con ``json.loads`` antes de
+    dar el error, asi que lo que se aceptaba antes se sigue aceptando.
+
+    Raises:
+        JSONDecodeError: Si el texto no es JSON valido
+    """
+    if HAS_ORJSON:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode("utf-8")
+    return json.loads(data)
+
+
+class FastJSONResponse(JSONResponse):
+    """``JSONResponse`` serializada con ``dumpb`` (clase de respuesta por defecto)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumpb(content)
@@ -0,0 +1,106 @@
+import re
+from typing import Any, List, Tuple
+
+from app.services import json_codec
+
+
+# Bloque ```json ... ``` (el cierre puede faltar si la respuesta se corto)
+_FENCE_RE = re.compile(r"^```[a-zA-Z]*\s*\n?(.*?)(?:\n?```\s*)?$", re.DOTALL)
+
+# Numero maximo de puntos de corte que se prueban para una respuesta truncada
+MAX_CUT_ATTEMPTS = 4
+
+
+def strip_fences(text: str) -> str:
+    """Quita el bloque de codigo markdown que a veces rodea al JSON"""
+    text = text.strip()
+    match = _FENCE_RE.match(text)
+    if match:
+        return match.group(1).strip()
+    return text
+
+
+def repair_json(text: str) -> Any:
+    """
+    Repara una respuesta JSON casi valida del modelo
+
+    Cubre los fallos habituales de un LLM: bloque ```json, texto antes o
+    despues del JSON, comas finales, y respuestas truncadas (cadena sin
+    cerrar, miembro a medias o llaves/corchetes sin cerrar). Si el ultimo
+    miembro esta incompleto se descarta. Es una pasada lineal sobre el texto
+    mas unos pocos ``json_codec.loads``; mucho mas barato que repetir la llamada.
+
+    Args:
+        text: Texto devuelto por el modelo
+
+    Returns:
+        El valor JSON reparado
+
+    Raises:
+        ValueError: Si no se puede reparar
+    """
+    text = strip_fences(text)
+    starts = [index for index in (text.find("{"), text.find("[")) if index != -1]
+    if not starts:
+        raise ValueError("No JSON object found in model response")
+    text = text[min(starts):]
+
+    out: List[str] = []
+    stack: List[str] = []
+    cut_points: List[Tuple[int, Tuple[str, ...]]] = []
+    in_string = False
+    escaped = False
+    for char in text:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+            out.append(char)
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+            out.append(char)
+        elif char in "}]":
+            if not stack:
+                break
+            _drop_trailing_comma(out)
+            out.append(stack.pop())
+            if not stack:
+                # Objeto de primer nivel completo: se ignora lo que venga detras
+                break
+        elif char == ",":
+            cut_points.append((len(out), tuple(stack)))
+            out.append(char)
+        else:
+            out.append(char)
+
+    candidates = []
+    if not in_string:
+        # 1) Cerrar lo que haya abierto tal cual. Si se corto dentro de una
+        # cadena el valor esta incompleto y no se rellena: se descarta abajo
+        tail = list(out)
+        _drop_trailing_comma(tail)
+        candidates.append("".join(tail) + "".join(reversed(stack)))
+    # 2) Descartar el ultimo miembro (incompleto) cortando en una coma anterior
+    for position, open_stack in reversed(cut_points[-MAX_CUT_ATTEMPTS:]):
+        candidates.append("".join(out[:position]) + "".join(reversed(open_stack)))
+
+    for candidate in candidates:
+        try:
+            return json_codec.loads(candidate)
+        except json_codec.JSONDecodeError:
+            continue
+    raise ValueError("Model response is not repairable JSON")
+
+
+def _drop_trailing_comma(chars: List[str]):
+    while chars and chars[-1].isspace():
+        chars.pop()
+    if chars and chars[-1] == ",":
+        chars.pop()
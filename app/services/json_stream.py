@@ -0,0 +1,101 @@
+from typing import Any, List, Tuple
+
+from app.services import json_codec
+
+
+class IncrementalJsonObjectParser:
+    """Parser incremental de un objeto JSON que llega por trozos
+
+    Va recibiendo el texto del modelo con ``feed`` y devuelve cada miembro de
+    primer nivel (clave, valor) en cuanto esta completo, es decir, cuando se
+    cierra con una coma o con la llave final del objeto. Los valores anidados
+    (objetos o listas) se devuelven enteros cuando se cierran.
+
+    Ignora cualquier texto previo a la primera ``{`` (p.ej. un bloque
+    ```json), y lleva el estado de cadenas y escapes para no confundirse con
+    comas o llaves dentro de los valores. El coste es lineal en el tamano del
+    texto: cada caracter se examina una sola vez.
+    """
+
+    def __init__(self):
+        self._text = ""
+        self._position = 0
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._member_start = None
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """
+        Anade texto y devuelve los miembros que se han completado con el
+
+        Args:
+            chunk: Siguiente fragmento de texto del modelo
+
+        Returns:
+            Lista de tuplas (clave, valor) completadas en este fragmento
+        """
+        if self.done or not chunk:
+            return []
+        self._text += chunk
+        completed = []
+        text = self._text
+        index = self._position
+        while index < len(text):
+            char = text[index]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = self._depth > 0
+            elif char in "{[":
+                self._depth += 1
+                if self._depth == 1:
+                    if char != "{":
+                        # Solo se soporta un objeto en el primer nivel
+                        self.done = True
+                        break
+                    self._member_start = index + 1
+            elif char in "}]":
+                if self._depth == 1:
+                    member = self._parse_member(text[self._member_start:index])
+                    if member is not None:
+                        completed.append(member)
+                    self.done = True
+                    self._depth = 0
+                    index += 1
+                    break
+                if self._depth > 0:
+                    self._depth -= 1
+            elif char == "," and self._depth == 1:
+                member = self._parse_member(text[self._member_start:index])
+                if member is not None:
+                    completed.append(member)
+                self._member_start = index + 1
+            index += 1
+
+        # Se descarta lo ya consumido para que el texto no crezca sin limite
+        if self._member_start is not None and self._member_start > 0 and not self.done:
+            self._text = text[self._member_start:]
+            index -= self._member_start
+            self._member_start = 0
+        self._position = index
+        return completed
+
+    @staticmethod
+    def _parse_member(member_text: str):
+        member_text = member_text.strip()
+        if not member_text:
+            return None
+        try:
+            parsed = json_codec.loads("{" + member_text + "}")
+        except json_codec.JSONDecodeError:
+            return None
+        if len(parsed) != 1:
+            return None
+        return next(iter(parsed.items()))
@@ -1,15 +1,148 @@
+import atexit
 import functools
-import json
 import logging
+import logging.handlers
 import os
+import queue
+import random
 import sys
+import threading
 import time
 import traceback
-from datetime import datetime
-from typing import Dict
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
 
 import boto3
-from botocore.exceptions import ClientError
+from botocore.exceptions import BotoCoreError, ClientError
+
+from app.constants import Constants
+from app.services import json_codec
+from app.services.record_projection import KINESIS_RECORD_PROJECTOR
+
+
+# Politicas con la cola de logs llena
+LOG_OVERFLOW_POLICIES = ("drop_debug_first", "block")
+
+TEXT_LOG_FORMAT = "%(asctime)s - %(request_id)s - %(logger_name)s  - %(levelname)s - %(message)s"
+
+# Identificador de la peticion en curso; lo fija RequestIdMiddleware (o el
+# worker de trabajos) y ParrotLogger lo anade a cada log si no se pasa req_id
+request_id_var: ContextVar[str] = ContextVar("request_id", default="N/A")
+
+
+class LogSampler:
+    """Muestreo de logs por nivel y por ``logger_name``
+
+    ``rates`` es una cadena ``clave=tasa`` separada por comas, donde la
+    clave es un nivel (``INFO``), un ``logger_name`` (``Gemini_Service``) o
+    ambos (``Gemini_Service:INFO``); gana la mas especifica y lo que no
+    aparece se registra siempre. La decision depende del request ID, asi que
+    de una peticion muestreada se conservan todos los logs con la misma tasa.
+    """
+
+    def __init__(self, rates: str = ""):
+        self.rates: Dict[str, float] = {}
+        for item in filter(None, (part.strip() for part in rates.split(","))):
+            key, _, rate = item.partition("=")
+            self.rates[key.strip()] = float(rate)
+
+    def rate(self, level: int, logger_name: str) -> float:
+        level_name = logging.getLevelName(level)
+        for key in (f"{logger_name}:{level_name}", logger_name, level_name):
+            if key in self.rates:
+                return self.rates[key]
+        return 1.0
+
+    def keep(self, level: int, logger_name: str, request_id: str) -> bool:
+        """True si el log se registra"""
+        if not self.rates:
+            return True
+        rate = self.rate(level, logger_name)
+        if rate >= 1.0:
+            return True
+        if rate <= 0.0:
+            return False
+        if request_id == "N/A":
+            return random.random() < rate
+        return zlib.crc32(request_id.encode("utf-8")) / 0xFFFFFFFF < rate
+
+
+log_sampler = LogSampler(Constants.LOG_SAMPLE_RATES)
+
+
+class RequestContextFilter(logging.Filter):
+    """Completa ``request_id`` y ``logger_name`` de records que no vienen de ParrotLogger"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not hasattr(record, "request_id"):
+            record.request_id = request_id_var.get()
+        if not hasattr(record, "logger_name"):
+            record.logger_name = record.name
+        return True
+
+
+class JsonLogFormatter(logging.Formatter):
+    """Un objeto JSON por linea (LOG_FORMAT=json) para indexar los logs por campo"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "logger_name": record.logger_name,
+            "request_id": record.request_id,
+            # El mensaje se formatea aqui, en el hilo del listener
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json_codec.dumps(entry)
+
+
+class LogQueueHandler(logging.handlers.QueueHandler):
+    """``QueueHandler`` acotado con politica de desbordamiento
+
+    El formateo y la escritura los hace el ``QueueListener`` en su hilo; aqui
+    solo se encola el record. Con la cola llena:
+
+        - ``drop_debug_first``: los DEBUG se descartan en cuanto la cola pasa
+          de la mitad, los INFO cuando esta llena y los WARNING/ERROR esperan
+          hueco (nunca se pierden)
+        - ``block``: todos esperan hueco
+    """
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = "drop_debug_first"):
+        super().__init__(log_queue)
+        if overflow not in LOG_OVERFLOW_POLICIES:
+            raise ValueError(
+                f"Unknown log overflow policy '{overflow}', expected one of {LOG_OVERFLOW_POLICIES}"
+            )
+        self.overflow = overflow
+        self._debug_limit = max(1, log_queue.maxsize // 2)
+        self.dropped = {"debug": 0, "info": 0}
+        # Tras ParrotLogger.shutdown() ya no hay listener: se escribe directamente
+        self.direct: Optional[logging.Handler] = None
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # QueueHandler.prepare formatea en el hilo que llama; el listener ya lo hace
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        if self.direct is not None:
+            self.direct.handle(record)
+            return
+        if self.overflow == "block" or record.levelno >= logging.WARNING:
+            self.queue.put(record)
+            return
+        if record.levelno < logging.INFO and self.queue.qsize() >= self._debug_limit:
+            self.dropped["debug"] += 1
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped["debug" if record.levelno < logging.INFO else "info"] += 1
 
 
 class ParrotLogger:
@@ -17,6 +150,13 @@ class ParrotLogger:
     This class provides a simplified interface for logging messages with different
     severity levels (info, error, warning, debug) to the console. It automatically
     configures a console handler with a standard formatting pattern.
+
+    The logger is configured only once per name: later ``ParrotLogger(name)``
+    calls return the same instance without touching handlers or level. With
+    ``LOG_QUEUE_ENABLED`` the console handler is shared behind a bounded queue
+    and a ``QueueListener`` thread formats and writes the records, so a slow
+    stdout does not block the event loop. ``ParrotLogger.shutdown()`` flushes
+    the queue (also registered with ``atexit``).
     Args:
         name (str): The name of the logger instance.
         log_level (int, optional): The minimum logging level. Defaults to logging.INFO.
@@ -31,24 +171,20 @@ class ParrotLogger:
 
     # Remove duplicated logs
     _instances = {}
-
-    def __new__(cls, name):
-        if name not in cls._instances:
-            instance = super(ParrotLogger, cls).__new__(cls)
-            instance.logger = logging.getLogger(name)
-            handler_exists = any(
-                isinstance(handler, logging.StreamHandler)
-                for handler in instance.logger.handlers
-            )
-            if not handler_exists:
-                handler = logging.StreamHandler()
-                formatter = logging.Formatter(
-                    "%(asctime)s - %(request_id)s - %(logger_name)s  - %(levelname)s - %(message)s"
-                )
-                handler.setFormatter(formatter)
-                instance.logger.addHandler(handler)
-            cls._instances[name] = instance
-        return cls._instances[name]
+    _lock = threading.Lock()
+    # Handler de cola y listener compartidos por todos los loggers (modo cola)
+    _queue_handler = None
+    _listener = None
+
+    def __new__(cls, name, *args, **kwargs):
+        with cls._lock:
+            if name not in cls._instances:
+                instance = super(ParrotLogger, cls).__new__(cls)
+                instance.logger = logging.getLogger(name)
+                instance._initialized = False
+                cls._attach_handler(instance.logger)
+                cls._instances[name] = instance
+            return cls._instances[name]
 
     def __init__(
         self,
@@ -57,39 +193,99 @@ class ParrotLogger:
         profile_name: str = None,
         request_id: str = None,
     ):
-        self.logger = logging.getLogger(name)
+        # Python llama a __init__ en cada ParrotLogger(name): solo la primera configura
+        if self._initialized:
+            return
         self.logger.setLevel(log_level)
-
-        handler_exists = any(
-            isinstance(handler, logging.StreamHandler)
-            for handler in self.logger.handlers
-        )
-        if not handler_exists:
-            handler = logging.StreamHandler()
-            formatter = logging.Formatter(
-                "%(asctime)s - %(request_id)s - %(logger_name)s  - %(levelname)s - %(message)s"
+        self._initialized = True
+
+    @staticmethod
+    def _console_handler() -> logging.Handler:
+        handler = logging.StreamHandler()
+        if Constants.LOG_FORMAT == "json":
+            formatter = JsonLogFormatter()
+        else:
+            formatter = logging.Formatter(TEXT_LOG_FORMAT)
+        handler.setFormatter(formatter)
+        handler.addFilter(RequestContextFilter())
+        return handler
+
+    @classmethod
+    def _attach_handler(cls, logger: logging.Logger):
+        if any(
+            isinstance(handler, (logging.StreamHandler, logging.handlers.QueueHandler))
+            for handler in logger.handlers
+        ):
+            return
+        if not Constants.LOG_QUEUE_ENABLED:
+            logger.addHandler(cls._console_handler())
+            return
+        if cls._queue_handler is None:
+            log_queue = queue.Queue(maxsize=Constants.LOG_QUEUE_MAX_SIZE)
+            cls._queue_handler = LogQueueHandler(log_queue, Constants.LOG_QUEUE_OVERFLOW)
+            cls._listener = logging.handlers.QueueListener(
+                log_queue, cls._console_handler(), respect_handler_level=True
             )
-            handler.setFormatter(formatter)
-            self.logger.addHandler(handler)
+            cls._listener.start()
+            atexit.register(cls.shutdown)
+        logger.addHandler(cls._queue_handler)
+
+    @classmethod
+    def shutdown(cls):
+        """Escribe los logs pendientes de la cola y para el hilo del listener"""
+        with cls._lock:
+            listener, cls._listener = cls._listener, None
+        if listener is None:
+            return
+        # Lo que se registre a partir de ahora se escribe directamente...
+        cls._queue_handler.direct = listener.handlers[0]
+        # ...y stop() encola un centinela y espera a que se escriba lo pendiente
+        listener.stop()
+        for handler in listener.handlers:
+            handler.flush()
+
+    @classmethod
+    def queue_stats(cls) -> Dict[str, Any]:
+        """Tamano de la cola de logs y records descartados por desbordamiento"""
+        if cls._queue_handler is None:
+            return {"enabled": False}
+        log_queue = cls._queue_handler.queue
+        return {
+            "enabled": True,
+            "overflow": cls._queue_handler.overflow,
+            "size": log_queue.qsize(),
+            "max_size": log_queue.maxsize,
+            "dropped": dict(cls._queue_handler.dropped),
+        }
 
-    def info(self, message, logger_name="N/A", req_id="N/A"):
-        self.logger.info(
-            message, extra={"request_id": req_id, "logger_name": logger_name}
-        )
+    def info(self, message, *args, logger_name="N/A", req_id=None):
+        self._log(logging.INFO, message, args, logger_name, req_id)
 
-    def error(self, message, logger_name="N/A", req_id="N/A"):
-        self.logger.error(
-            message, extra={"request_id": req_id, "logger_name": logger_name}
-        )
+    def error(self, message, *args, logger_name="N/A", req_id=None):
+        self._log(logging.ERROR, message, args, logger_name, req_id)
 
-    def warning(self, message, logger_name="N/A", req_id="N/A"):
-        self.logger.warning(
-            message, extra={"request_id": req_id, "logger_name": logger_name}
-        )
+    def warning(self, message, *args, logger_name="N/A", req_id=None):
+        self._log(logging.WARNING, message, args, logger_name, req_id)
+
+    def debug(self, message, *args, logger_name="N/A", req_id=None):
+        self._log(logging.DEBUG, message, args, logger_name, req_id)
 
-    def debug(self, message, logger_name="N/A", req_id="N/A"):
-        self.logger.debug(
-            message, extra={"request_id": req_id, "logger_name": logger_name}
+    def _log(self, level, message, args, logger_name, req_id):
+        """
+        Registra ``message % args`` con el request ID de la peticion en curso
+
+        Los logs por debajo del nivel o descartados por el muestreo salen
+        antes de crear el record. Con ``args`` (estilo ``%s``) el mensaje solo
+        se formatea si llega a escribirse.
+        """
+        if not self.logger.isEnabledFor(level):
+            return
+        if req_id is None:
+            req_id = request_id_var.get()
+        if not log_sampler.keep(level, logger_name, req_id):
+            return
+        self.logger.log(
+            level, message, *args, extra={"request_id": req_id, "logger_name": logger_name}
         )
 
     time.time()
@@ -169,7 +365,19 @@ class ParrotError:
 
 
 class KinesisProccess:
-    def __init__(self, logger, profile_name: str = None):
+    def __init__(self, logger, profile_name: str = None, sender=None, spool=None):
+        """
+        Args:
+            logger: ParrotLogger
+            profile_name: Perfil de AWS (None: credenciales por defecto)
+            sender: FirehoseBatchSender opcional; si se pasa, los registros se
+                encolan y se envian por lotes en segundo plano en vez de con
+                un ``put_record`` sincrono por registro. Arrancarlo y pararlo
+                (``start``/``stop``) es cosa de quien lo crea
+            spool: FirehoseSpool opcional; si ``put_record`` falla el registro
+                se guarda en disco (y lo reenvia un FirehoseSpoolReplayer)
+                en vez de propagar el error
+        """
         self.logger = logger
         self.profile_name = profile_name
         self.session = (
@@ -177,9 +385,12 @@ class KinesisProccess:
             if self.profile_name
             else boto3.Session()
         )
-        self.req_id = "N/A"
+        # None: se usa el request ID de la peticion en curso
+        self.req_id = None
         self.name = "Kinesis Firehose"
         self.client_firehose = self.session.client("firehose", region_name="eu-west-1")
+        self.sender = sender
+        self.spool = spool
 
     def send_dict_to_kfh(self, json_logs, buffer):
         """
@@ -187,6 +398,14 @@ class KinesisProccess:
         Args:
             json_logs
         """
+        if self.sender is not None:
+            if not self.sender.submit(buffer, json_logs) and not self._spool(json_logs, buffer):
+                self.logger.warning(
+                    f"Record for stream {buffer} dropped by the batch sender",
+                    req_id=self.req_id,
+                    logger_name=self.name,
+                )
+            return
         try:
             self.client_firehose.put_record(
                 DeliveryStreamName=buffer, Record={"Data": json_logs}
@@ -196,7 +415,14 @@ class KinesisProccess:
                 req_id=self.req_id,
                 logger_name=self.name,
             )
-        except ClientError:
+        except (ClientError, BotoCoreError):
+            if self._spool(json_logs, buffer):
+                self.logger.warning(
+                    f"Couldn't put record in stream {buffer}, spooled to disk",
+                    req_id=self.req_id,
+                    logger_name=self.name,
+                )
+                return
             self.logger.error(
                 f"Couldn't put record in stream {buffer}",
                 req_id=self.req_id,
@@ -204,6 +430,14 @@ class KinesisProccess:
             )
             raise
 
+    def _spool(self, json_logs, buffer) -> bool:
+        """Guarda el registro en el spool en disco; False si no hay spool o esta lleno"""
+        if self.spool is None:
+            return False
+        if isinstance(json_logs, str):
+            json_logs = json_logs.encode("utf-8")
+        return self.spool.append(buffer, [json_logs]) == 1
+
     def save_model_info_to_firehose(self, output_json, buffer):
         """
         Saves the body request and response in S3 bucket.
@@ -217,134 +451,25 @@ class KinesisProccess:
         today = datetime.now()
         event_time = today.strftime("%Y/%m/%d %H:%M:%S.%f")
         output_json["datetime"] = event_time
-        json_logs = json.dumps(output_json)
+        json_logs = json_codec.dumps(output_json)
         self.logger.info(json_logs, req_id=self.req_id, logger_name=self.name)
         self.send_dict_to_kfh(json_logs, buffer)
 
     def process_kinesis_json(self, output_json, information_api, control_group):
-        base_schema = {
-            "callId": "",
-            "open_claim": 0,
-            "is_redirect": 0,
-            "reason_redirect": "",
-            "second_time": 0,
-            "interruptions_barge_in": 0,
-            "control_group": 0,
-            "claim_information": {
-                "policyId": "",
-                "claimTypeCode": "",
-                "effectiveDate": "",
-                "claimOcurrenceAddress": {
-                    "zipCode": "",
-                    "townDesc": "",
-                    "provinceCode": "",
-                },
-                "claimCaller": {"relationshipCode": ""},
-                "correspondence": {
-                    "address": {"zipCode": "", "townDesc": "", "provinceCode": ""},
-                },
-                "report": "",
-                "claimDamagesSpecific": {
-                    "damage": {"damageCode": "", "damageDesc": ""},
-                    "brandCode": "",
-                    "modelName": "",
-                    "years": "",
-                    "warranty": "",
-                },
-            },
-            "datetime": "",
-        }
+        """
+        Construye el registro de Firehose de una llamada
 
-        # Update base schema with output_json values
+        La forma del registro (valores por defecto y campos que se eliminan
+        de ``claim_information``) esta en ``KINESIS_RECORD_SCHEMA``.
+        """
         try:
             output_json["control_group"] = control_group
-            base_schema.update(output_json)
-            output_json = base_schema
-
-            output_json["callId"] = output_json.get("callId", "")
-            output_json["open_claim"] = (
-                information_api.patrimoniales_service.claim_opened
-            )
-            output_json["is_redirect"] = information_api.flag_redirect_agent.get(
-                "flag", 0
-            )
-            output_json["reason_redirect"] = information_api.flag_redirect_agent.get(
-                "reason", None
-            )
-
-            # output_json["claim_information"] = (
-            #     information_api.patrimoniales_service.process_output_json(
-            #         information_api.validated_args,
-            #         information_api.patrimoniales_service.informacion_api,
-            #     )
-            #     if not information_api.patrimoniales_service.claim_information
-            #     else information_api.patrimoniales_service.claim_information
-            # )
-            # TYPE CHECK 3: Check if claim_information exists
-            if not hasattr(information_api.patrimoniales_service, "claim_information"):
-                self.logger.error(
-                    "patrimoniales_service has no claim_information attribute",
-                    req_id=self.req_id,
-                    logger_name=self.name,
-                )
-                output_json["claim_information"] = {}
-            # TYPE CHECK 4: Check if validated_args and informacion_api exist
-            elif not information_api.patrimoniales_service.claim_information:
-                if not hasattr(information_api, "validated_args"):
-                    self.logger.error(
-                        "information_api has no validated_args attribute",
-                        req_id=self.req_id,
-                        logger_name=self.name,
-                    )
-                    output_json["claim_information"] = {}
-                elif not hasattr(
-                    information_api.patrimoniales_service, "informacion_api"
-                ):
-                    self.logger.error(
-                        "patrimoniales_service has no informacion_api attribute",
-                        req_id=self.req_id,
-                        logger_name=self.name,
-                    )
-                    output_json["claim_information"] = {}
-                else:
-                    # Everything is valid, proceed with original logic
-                    output_json["claim_information"] = (
-                        information_api.patrimoniales_service.process_output_json(
-                            information_api.validated_args,
-                            information_api.patrimoniales_service.informacion_api,
-                        )
-                    )
-            else:
-                output_json["claim_information"] = (
-                    information_api.patrimoniales_service.claim_information
-                )
-
-            # Eliminar el campo adressName dentro de claimOcurrenceAddress
-            if "claimOcurrenceAddress" in output_json["claim_information"]:
-                output_json["claim_information"]["claimOcurrenceAddress"].pop(
-                    "addressName", None
-                )
-
-            # Eliminar el campo contactName dentro de claimCaller
-            if "claimCaller" in output_json["claim_information"]:
-                output_json["claim_information"]["claimCaller"].pop("contactName", None)
-                output_json["claim_information"]["claimCaller"].pop(
-                    "contactMethod", None
-                )
-
-            # Asegurarse de que correspondence tenga solo zipCode, townDesc y provinceCode
-            if "correspondence" in output_json["claim_information"]:
-                correspondence = output_json["claim_information"]["correspondence"]
-                correspondence["address"] = {
-                    "zipCode": correspondence.get("address", {}).get("zipCode", ""),
-                    "townDesc": correspondence.get("address", {}).get("townDesc", ""),
-                    "provinceCode": correspondence.get("address", {}).get(
-                        "provinceCode", ""
-                    ),
-                }
-                correspondence.pop("name", None)
-                correspondence.pop("contactMethod", None)
-                output_json["claim_information"]["correspondence"] = correspondence
+            record = dict(output_json)
+            record["open_claim"] = information_api.patrimoniales_service.claim_opened
+            record["is_redirect"] = information_api.flag_redirect_agent.get("flag", 0)
+            record["reason_redirect"] = information_api.flag_redirect_agent.get("reason", None)
+            record["claim_information"] = self._claim_information(information_api)
+            output_json = KINESIS_RECORD_PROJECTOR(record)
 
             self.logger.info(
                 "Saved output and input json.",
@@ -363,3 +488,33 @@ class KinesisProccess:
                 logger_name=self.name,
             )
             raise
+
+    def _claim_information(self, information_api):
+        """claim_information del servicio de patrimoniales ({} si no esta disponible)"""
+        service = information_api.patrimoniales_service
+        # TYPE CHECK 3: Check if claim_information exists
+        if not hasattr(service, "claim_information"):
+            self.logger.error(
+                "patrimoniales_service has no claim_information attribute",
+                req_id=self.req_id,
+                logger_name=self.name,
+            )
+            return {}
+        if service.claim_information:
+            return service.claim_information
+        # TYPE CHECK 4: Check if validated_args and informacion_api exist
+        if not hasattr(information_api, "validated_args"):
+            self.logger.error(
+                "information_api has no validated_args attribute",
+                req_id=self.req_id,
+                logger_name=self.name,
+            )
+            return {}
+        if not hasattr(service, "informacion_api"):
+            self.logger.error(
+                "patrimoniales_service has no informacion_api attribute",
+                req_id=self.req_id,
+                logger_name=self.name,
+            )
+            return {}
+        return service.process_output_json(information_api.validated_args, service.informacion_api)
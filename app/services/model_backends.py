@@ -0,0 +1,295 @@
+import asyncio
+import json
+import math
+import random
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from google import genai
+from google.genai import errors as genai_errors
+from google.genai.types import CreateCachedContentConfig, GenerateContentConfig, HttpOptions
+
+from app.constants import Constants
+
+
+@dataclass
+class ModelResponse:
+    """Respuesta de un backend de extraccion"""
+    text: Optional[str]
+    # Log-probabilidad media de los tokens generados, si el modelo la devuelve
+    avg_logprobs: Optional[float] = None
+
+
+class ModelBackend(ABC):
+    """Interfaz de los backends de modelo usados por el servicio de extraccion
+
+    Los ``contents`` y ``config`` usan los tipos de ``google.genai.types`` como
+    formato comun de peticion; los backends deben lanzar los errores de
+    ``google.genai.errors`` (``ClientError``/``ServerError`` con su codigo HTTP)
+    para que el limitador y los reintentos los clasifiquen igual.
+    """
+
+    name: str = "backend"
+
+    @abstractmethod
+    async def generate(
+        self,
+        model: str,
+        contents: List[Any],
+        config: GenerateContentConfig
+    ) -> ModelResponse:
+        """Genera una respuesta completa"""
+
+    async def generate_stream(
+        self,
+        model: str,
+        contents: List[Any],
+        config: GenerateContentConfig
+    ) -> AsyncIterator[str]:
+        """
+        Genera la respuesta por trozos de texto
+
+        La implementacion por defecto devuelve la respuesta completa en un
+        unico trozo, para backends sin generacion en streaming.
+        """
+        response = await self.generate(model, contents, config)
+        if response.text:
+            yield response.text
+
+    async def create_cached_content(
+        self,
+        model: str,
+        system_instruction: str,
+        ttl_seconds: int,
+        display_name: str
+    ) -> str:
+        """
+        Registra un prefijo de prompt como contenido cacheado
+
+        Returns:
+            Identificador de la cache a pasar en ``GenerateContentConfig.cached_content``
+
+        Raises:
+            NotImplementedError: Si el backend no soporta cache de contexto
+        """
+        raise NotImplementedError(f"{self.name} backend does not support context caching")
+
+    async def close(self):
+        """Libera las conexiones del backend al parar el proceso"""
+
+
+def create_gemini_client() -> genai.Client:
+    """
+    Create the process-wide Gemini client
+
+    The async transport keeps a pool of keep-alive connections so that
+    concurrent requests reuse the same TLS sessions instead of opening a
+    new connection per call.
+
+    Returns:
+        genai.Client configured with the shared HTTP connection pool
+    """
+    limits = httpx.Limits(
+        max_connections=Constants.GEMINI_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=Constants.GEMINI_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=Constants.GEMINI_HTTP_KEEPALIVE_EXPIRY,
+    )
+    return genai.Client(
+        api_key=Constants.GEMINI_API_KEY,
+        http_options=HttpOptions(
+            timeout=Constants.GEMINI_HTTP_TIMEOUT_MS,
+            client_args={"limits": limits},
+            async_client_args={"limits": limits},
+        ),
+    )
+
+
+class GeminiBackend(ModelBackend):
+    """Backend real sobre ``google.genai`` (llamadas asincronas con ``client.aio``)"""
+
+    name = "gemini"
+
+    def __init__(self, gemini_client: genai.Client = None):
+        self.gemini_client = gemini_client or create_gemini_client()
+
+    async def generate(self, model, contents, config) -> ModelResponse:
+        response = await self.gemini_client.aio.models.generate_content(
+            model=model,
+            contents=contents,
+            config=config
+        )
+        if not response:
+            return ModelResponse(text=None)
+        candidates = response.candidates or []
+        return ModelResponse(
+            text=response.text,
+            avg_logprobs=candidates[0].avg_logprobs if candidates else None
+        )
+
+    async def generate_stream(self, model, contents, config) -> AsyncIterator[str]:
+        stream = await self.gemini_client.aio.models.generate_content_stream(
+            model=model,
+            contents=contents,
+            config=config
+        )
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+    async def create_cached_content(self, model, system_instruction, ttl_seconds, display_name) -> str:
+        cached = await self.gemini_client.aio.caches.create(
+            model=model,
+            config=CreateCachedContentConfig(
+                display_name=display_name,
+                system_instruction=system_instruction,
+                ttl=f"{ttl_seconds}s",
+            ),
+        )
+        return cached.name
+
+    async def close(self):
+        # Esta version de google-genai no expone close(): se cierran los pools
+        # de httpx del cliente directamente
+        api_client = getattr(self.gemini_client, "_api_client", None)
+        async_client = getattr(api_client, "_async_httpx_client", None)
+        if async_client is not None:
+            await async_client.aclose()
+        sync_client = getattr(api_client, "_httpx_client", None)
+        if sync_client is not None:
+            sync_client.close()
+
+
+# Volante de ejemplo devuelto por el backend falso
+FAKE_VOLANTE_RESPONSE: Dict[str, Any] = {
+    "filiacion_asegurado": "Juan García López",
+    "codigo_servicio_concertado": "12345",
+    "numero_documento": "12345678",
+    "Profesional_prescriptor": "Dra. María Martínez",
+    "Numero_de_colegiado": "280012345",
+    "Especialidad": "Medicina General",
+    "prescripcion": "Radiografía de tórax",
+    "fecha_primeros_sintomas": "15/10/2024",
+    "motivos_sintomas": "Dolor torácico",
+    "prestacion_sanitaria": "Diagnóstico por imagen",
+    "numero_autorizacion": None,
+    "codigo_servicio_realizador": "67890",
+    "firma_profesional_realizador": True,
+    "firma_asegurado": True,
+    "firma_sello_prescriptor": True,
+    "fecha_realizacion": "20/10/2024",
+    "origen_patologia": "Enfermedad",
+}
+
+
+class FakeBackend(ModelBackend):
+    """Backend local y determinista para pruebas de carga, benchmarks y CI
+
+    Devuelve un JSON fijo (el volante de ejemplo o el contenido de
+    ``response_path``) tras una latencia simulada y, con la probabilidad
+    configurada, falla con 429 o 503 como lo haria Gemini. Con la misma
+    semilla la secuencia de latencias y errores es siempre la misma.
+
+    Distribuciones de latencia (``latency_distribution``):
+        - ``fixed``: siempre ``latency_ms``
+        - ``uniform``: entre 0.5x y 1.5x ``latency_ms``
+        - ``lognormal``: mediana ``latency_ms`` y dispersion ``latency_sigma``
+          (cola larga, parecida a la de un LLM real)
+    """
+
+    name = "fake"
+
+    # Numero de trozos en los que se divide la respuesta en streaming
+    STREAM_CHUNKS = 12
+
+    def __init__(
+        self,
+        latency_ms: float = Constants.FAKE_BACKEND_LATENCY_MS,
+        latency_distribution: str = Constants.FAKE_BACKEND_LATENCY_DISTRIBUTION,
+        latency_sigma: float = Constants.FAKE_BACKEND_LATENCY_SIGMA,
+        error_rate: float = Constants.FAKE_BACKEND_ERROR_RATE,
+        rate_limit_rate: float = Constants.FAKE_BACKEND_RATE_LIMIT_RATE,
+        seed: int = Constants.FAKE_BACKEND_SEED,
+        response_path: str = Constants.FAKE_BACKEND_RESPONSE_PATH,
+    ):
+        self.latency_ms = latency_ms
+        self.latency_distribution = latency_distribution
+        self.latency_sigma = latency_sigma
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self._random = random.Random(seed)
+        self._cached_contents = 0
+        if response_path:
+            with open(response_path, encoding="utf-8") as response_file:
+                self.response = json.load(response_file)
+        else:
+            self.response = FAKE_VOLANTE_RESPONSE
+        self._response_text = json.dumps(self.response, ensure_ascii=False)
+
+    def sample_latency(self) -> float:
+        """Latencia simulada en segundos"""
+        if self.latency_distribution == "uniform":
+            latency_ms = self._random.uniform(0.5 * self.latency_ms, 1.5 * self.latency_ms)
+        elif self.latency_distribution == "lognormal":
+            latency_ms = self._random.lognormvariate(
+                math.log(max(self.latency_ms, 1e-3)), self.latency_sigma
+            )
+        else:
+            latency_ms = self.latency_ms
+        return latency_ms / 1000
+
+    def _maybe_fail(self):
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            raise genai_errors.ClientError(
+                429, {"error": {"message": "Fake quota exceeded", "status": "RESOURCE_EXHAUSTED"}}
+            )
+        if roll < self.rate_limit_rate + self.error_rate:
+            raise genai_errors.ServerError(
+                503, {"error": {"message": "Fake backend overloaded", "status": "UNAVAILABLE"}}
+            )
+
+    async def generate(self, model, contents, config) -> ModelResponse:
+        await asyncio.sleep(self.sample_latency())
+        self._maybe_fail()
+        return ModelResponse(text=self._response_text)
+
+    async def generate_stream(self, model, contents, config) -> AsyncIterator[str]:
+        # El primer trozo tarda ~30% de la latencia y el resto llega repartido
+        latency = self.sample_latency()
+        await asyncio.sleep(0.3 * latency)
+        self._maybe_fail()
+        chunk_size = max(1, len(self._response_text) // self.STREAM_CHUNKS)
+        chunks = [
+            self._response_text[start:start + chunk_size]
+            for start in range(0, len(self._response_text), chunk_size)
+        ]
+        for chunk in chunks:
+            yield chunk
+            await asyncio.sleep(0.7 * latency / len(chunks))
+
+    async def create_cached_content(self, model, system_instruction, ttl_seconds, display_name) -> str:
+        self._cached_contents += 1
+        return f"cachedContents/fake-{self._cached_contents}"
+
+
+def create_model_backend(logger) -> ModelBackend:
+    """
+    Crea el backend configurado en ``Constants.MODEL_BACKEND``
+
+    Args:
+        logger: Logger de la aplicacion
+
+    Returns:
+        GeminiBackend (por defecto) o FakeBackend
+    """
+    if Constants.MODEL_BACKEND == "fake":
+        logger.warning(
+            "Using FAKE model backend: responses are canned, no calls to Gemini",
+            logger_name="Model_Backend"
+        )
+        return FakeBackend()
+    if Constants.MODEL_BACKEND != "gemini":
+        raise ValueError(f"Unknown MODEL_BACKEND: {Constants.MODEL_BACKEND}")
+    return GeminiBackend()
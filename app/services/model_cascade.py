@@ -0,0 +1,148 @@
+from typing import Any, Dict, List, Optional
+
+from app.constants import Constants
+
+
+# Motivos por los que un nivel de la cascada no acepta el resultado
+REJECTION_REASONS = ("error", "unparseable", "schema", "null_fields", "low_confidence")
+
+
+class ModelCascade:
+    """Cascada de modelos: el mas barato primero y escalado solo si hace falta
+
+    Cada extraccion empieza en el primer modelo de ``models``. El resultado se
+    acepta salvo que:
+        - la llamada falle o la respuesta no sea JSON (``error``/``unparseable``)
+        - no cumpla el esquema del prompt (``schema``)
+        - tenga mas de ``max_null_fields`` campos obligatorios a null
+          (``null_fields``, solo con el prompt por defecto)
+        - la confianza media del modelo (``avg_logprobs``) quede por debajo de
+          ``min_avg_logprobs`` (``low_confidence``)
+    En ese caso se repite con el siguiente modelo. El resultado del ultimo
+    nivel se devuelve siempre, aunque tambien cuente como rechazado en sus
+    metricas. Las metricas por nivel permiten ajustar los umbrales.
+    """
+
+    def __init__(
+        self,
+        logger,
+        models: List[str] = None,
+        required_fields: List[str] = None,
+        max_null_fields: int = Constants.CASCADE_MAX_NULL_FIELDS,
+        min_avg_logprobs: Optional[float] = Constants.CASCADE_MIN_AVG_LOGPROBS,
+    ):
+        self.logger = logger
+        self.name = "Model_Cascade"
+        self.models = models or Constants.GEMINI_MODEL_CASCADE
+        if not self.models:
+            raise ValueError("Model cascade needs at least one model")
+        self.required_fields = (
+            required_fields if required_fields is not None else Constants.CASCADE_REQUIRED_FIELDS
+        )
+        self.max_null_fields = max_null_fields
+        self.min_avg_logprobs = min_avg_logprobs
+        self._tiers = {
+            model: {
+                "calls": 0,
+                "accepted": 0,
+                "rejected": {reason: 0 for reason in REJECTION_REASONS},
+                "total_ms": 0.0,
+                "logprobs_sum": 0.0,
+                "logprobs_count": 0,
+            }
+            for model in self.models
+        }
+
+    @property
+    def signature(self) -> str:
+        """Identifica la cascada; forma parte de la clave de cache"""
+        return "cascade:" + ">".join(self.models)
+
+    def assess(
+        self,
+        result: Any,
+        schema_valid: bool,
+        typed: bool,
+        avg_logprobs: Optional[float] = None,
+    ) -> Optional[str]:
+        """
+        Decide si un resultado es suficientemente bueno
+
+        Args:
+            result: Resultado parseado de la respuesta del modelo
+            schema_valid: Si el resultado cumple el esquema del prompt
+            typed: True si se comprueban los campos obligatorios a null (prompt por
+                defecto sobre el documento entero, no en trozos de paginas de un PDF)
+            avg_logprobs: Log-probabilidad media de la respuesta, si el modelo la da
+
+        Returns:
+            None si se acepta, o el motivo para escalar al siguiente modelo
+        """
+        if not isinstance(result, dict) or "raw_response" in result or "error" in result:
+            return "unparseable"
+        if not schema_valid:
+            return "schema"
+        if typed:
+            null_fields = sum(
+                1 for field in self.required_fields if result.get(field) in (None, "")
+            )
+            if null_fields > self.max_null_fields:
+                return "null_fields"
+        if (
+            self.min_avg_logprobs is not None
+            and avg_logprobs is not None
+            and avg_logprobs < self.min_avg_logprobs
+        ):
+            return "low_confidence"
+        return None
+
+    def record(
+        self,
+        model: str,
+        latency: float,
+        reason: Optional[str],
+        avg_logprobs: Optional[float] = None,
+    ):
+        """
+        Registra el resultado de un nivel
+
+        Args:
+            model: Modelo del nivel
+            latency: Duracion de la llamada en segundos
+            reason: None si se acepto, o el motivo de rechazo
+            avg_logprobs: Confianza media devuelta por el modelo
+        """
+        tier = self._tiers[model]
+        tier["calls"] += 1
+        tier["total_ms"] += latency * 1000
+        if reason is None:
+            tier["accepted"] += 1
+        else:
+            tier["rejected"][reason] += 1
+        if avg_logprobs is not None:
+            tier["logprobs_sum"] += avg_logprobs
+            tier["logprobs_count"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Tasa de aceptacion, motivos de rechazo y latencia por nivel"""
+        tiers = []
+        for model in self.models:
+            tier = self._tiers[model]
+            calls = tier["calls"]
+            tiers.append({
+                "model": model,
+                "calls": calls,
+                "accepted": tier["accepted"],
+                "hit_rate": round(tier["accepted"] / calls, 4) if calls else 0.0,
+                "rejected": dict(tier["rejected"]),
+                "avg_latency_ms": round(tier["total_ms"] / calls, 2) if calls else 0.0,
+                "avg_logprobs": (
+                    round(tier["logprobs_sum"] / tier["logprobs_count"], 4)
+                    if tier["logprobs_count"] else None
+                ),
+            })
+        return {
+            "tiers": tiers,
+            "max_null_fields": self.max_null_fields,
+            "min_avg_logprobs": self.min_avg_logprobs,
+        }
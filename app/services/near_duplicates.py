@@ -0,0 +1,307 @@
+import asyncio
+import io
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from itertools import combinations
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from PIL import Image, ImageOps
+from pypdf import PdfReader
+
+from app.constants import Constants
+
+
+# Formatos de los que se calcula el hash perceptual
+HASHABLE_MIME_TYPES = ("image/jpeg", "image/png", "image/webp", "application/pdf")
+
+
+@dataclass(frozen=True)
+class Fingerprint:
+    """Hash perceptual de un documento y tamano en pixeles de la imagen de origen"""
+    value: int
+    size: Tuple[int, int]
+
+
+@dataclass
+class NearDuplicateMatch:
+    """Documento ya procesado parecido al actual
+
+    Attributes:
+        result_key: Clave del resultado anterior en ``ExtractionCache``
+        distance: Bits en los que difieren los dos hashes
+        same_size: True si las dos imagenes de origen miden lo mismo en pixeles
+    """
+    result_key: str
+    distance: int
+    same_size: bool
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """
+    Difference hash de ``hash_size * hash_size`` bits
+
+    Se reduce la imagen a ``(hash_size + 1) x hash_size`` en grises y cada
+    bit indica si un pixel es mas claro que su vecino de la derecha. Es
+    estable ante recompresion, cambios de escala y de brillo, que es lo que
+    cambia entre dos fotos o escaneos del mismo volante.
+    """
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = small.tobytes()
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for column in range(hash_size):
+            value = (value << 1) | (pixels[offset + column] > pixels[offset + column + 1])
+    return value
+
+
+class MultiIndexHashTable:
+    """Busqueda por distancia de Hamming con multi-index hashing
+
+    El hash de ``bits`` bits se parte en trozos de ``chunk_bits`` bits y cada
+    trozo indexa una tabla. Si dos hashes difieren en ``max_distance`` bits
+    o menos, por el principio del palomar algun trozo difiere en como mucho
+    ``max_distance // trozos`` bits: basta con mirar en cada tabla los cubos
+    a esa distancia del trozo buscado y comprobar la distancia real solo de
+    esos candidatos, en vez de recorrer todo el indice. Con trozos de 16 bits
+    cada cubo tiene del orden de ``entradas / 65536`` documentos, asi que la
+    busqueda sigue siendo de milisegundos con millones de entradas.
+
+    Las entradas mas antiguas se descartan al superar ``max_entries``.
+    """
+
+    def __init__(self, bits: int, max_distance: int, max_entries: int, chunk_bits: int = 16):
+        self.bits = bits
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        chunks = max(1, bits // chunk_bits)
+        base, extra = divmod(bits, chunks)
+        # (desplazamiento, mascara) de cada trozo; los primeros llevan un bit mas
+        self._chunks: List[Tuple[int, int]] = []
+        shift = 0
+        for index in range(chunks):
+            width = base + (1 if index < extra else 0)
+            self._chunks.append((shift, (1 << width) - 1))
+            shift += width
+        # Mascaras XOR con las que se visitan los cubos vecinos de cada trozo
+        radius = max_distance // chunks
+        self._probes: List[List[int]] = [
+            _flip_masks(mask.bit_length(), radius) for _, mask in self._chunks
+        ]
+        self._tables: List[Dict[int, Set[str]]] = [{} for _ in self._chunks]
+        self._entries: "OrderedDict[str, Tuple[int, str, Any]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, entry_id: str, value: int, scope: str, data: Any = None):
+        """
+        Anade (o refresca) una entrada; ``scope`` separa prompts y modelos
+
+        ``data`` se guarda con la entrada y se devuelve en ``nearest``.
+        """
+        if entry_id in self._entries:
+            self._remove(entry_id)
+        self._entries[entry_id] = (value, scope, data)
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            table.setdefault((value >> shift) & mask, set()).add(entry_id)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def nearest(self, value: int, scope: str) -> Optional[Tuple[str, int, Any]]:
+        """Entrada del mismo ``scope`` mas cercana dentro de ``max_distance``: (id, distancia, data)"""
+        best: Optional[Tuple[str, int, Any]] = None
+        seen: Set[str] = set()
+        for table, probes, (shift, mask) in zip(self._tables, self._probes, self._chunks):
+            chunk = (value >> shift) & mask
+            for probe in probes:
+                for entry_id in table.get(chunk ^ probe, ()):
+                    if entry_id in seen:
+                        continue
+                    seen.add(entry_id)
+                    entry_value, entry_scope, entry_data = self._entries[entry_id]
+                    if entry_scope != scope:
+                        continue
+                    distance = (entry_value ^ value).bit_count()
+                    if distance <= self.max_distance and (best is None or distance < best[1]):
+                        best = (entry_id, distance, entry_data)
+                        if distance == 0:
+                            return best
+        return best
+
+    def _remove(self, entry_id: str):
+        value, _, _ = self._entries.pop(entry_id)
+        for table, (shift, mask) in zip(self._tables, self._chunks):
+            chunk = (value >> shift) & mask
+            bucket = table.get(chunk)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del table[chunk]
+
+
+def _flip_masks(width: int, radius: int) -> List[int]:
+    """Todas las mascaras de ``width`` bits con ``radius`` bits a 1 o menos"""
+    masks = [0]
+    for count in range(1, radius + 1):
+        masks.extend(sum(1 << bit for bit in bits) for bits in combinations(range(width), count))
+    return masks
+
+
+class NearDuplicateIndex:
+    """Indice de documentos procesados recientemente por hash perceptual
+
+    Cada entrada enlaza el dHash del documento con la clave de su resultado
+    en ``ExtractionCache``. Otra foto o escaneo del mismo volante tiene
+    bytes distintos (la cache exacta falla) pero un hash a pocos bits de
+    distancia: se detecta como probable duplicado y, si se permite, se
+    responde con el resultado anterior sin llamar al modelo.
+
+    De los PDF se usa la imagen mas grande de la primera pagina (los
+    volantes escaneados son una imagen por pagina); los PDF sin imagenes no
+    se indexan. El calculo del hash se hace en un hilo.
+
+    Detectar y servir tienen umbrales distintos. Dos volantes de la misma
+    plantilla con pacientes distintos solo difieren en unas pocas zonas
+    escritas y pueden quedar a pocos bits: para marcar basta con
+    ``max_distance``, pero para responder con el resultado anterior
+    (``can_serve``) hace falta ademas ``serve_max_distance`` (mas estricto) y
+    que las dos imagenes de origen midan exactamente lo mismo.
+
+    El indice y los contadores solo se leen y actualizan bajo ``_lock``.
+    """
+
+    def __init__(
+        self,
+        logger,
+        max_distance: int = Constants.NEAR_DUPLICATE_MAX_DISTANCE,
+        max_entries: int = Constants.NEAR_DUPLICATE_MAX_ENTRIES,
+        serve: bool = Constants.NEAR_DUPLICATE_SERVE,
+        hash_size: int = Constants.NEAR_DUPLICATE_HASH_SIZE,
+        serve_max_distance: int = Constants.NEAR_DUPLICATE_SERVE_MAX_DISTANCE,
+    ):
+        self.logger = logger
+        self.name = "Near_Duplicate_Index"
+        self.max_distance = max_distance
+        self.serve = serve
+        self.hash_size = hash_size
+        self.serve_max_distance = min(serve_max_distance, max_distance)
+        self._table = MultiIndexHashTable(hash_size * hash_size, max_distance, max_entries)
+        self._lock = threading.Lock()
+        self._stats = {
+            "hashed": 0,
+            "hash_failures": 0,
+            "lookups": 0,
+            "matches": 0,
+            "served": 0,
+            "serve_rejected": 0,
+        }
+
+    def supports(self, mime_type: str) -> bool:
+        """True si se puede calcular el hash perceptual de este tipo de archivo"""
+        return mime_type in HASHABLE_MIME_TYPES
+
+    async def fingerprint(self, file_bytes: bytes, mime_type: str) -> Optional[Fingerprint]:
+        """
+        Hash perceptual del documento, o None si no se puede calcular
+
+        Nunca lanza: un archivo que no se puede abrir simplemente no se indexa.
+        """
+        try:
+            value = await asyncio.to_thread(self._fingerprint_sync, file_bytes, mime_type)
+        except Exception as e:
+            with self._lock:
+                self._stats["hash_failures"] += 1
+            self.logger.warning(
+                f"Perceptual hash failed: {e}",
+                logger_name=self.name
+            )
+            return None
+        if value is not None:
+            with self._lock:
+                self._stats["hashed"] += 1
+        return value
+
+    def _fingerprint_sync(self, file_bytes: bytes, mime_type: str) -> Optional[Fingerprint]:
+        if mime_type == "application/pdf":
+            file_bytes = self._first_page_image(file_bytes)
+            if file_bytes is None:
+                return None
+        with Image.open(io.BytesIO(file_bytes)) as image:
+            size = image.size
+            # Solo hacen falta (hash_size + 1) x hash_size pixeles: libjpeg
+            # puede decodificar ya reducido
+            draft_edge = 4 * (self.hash_size + 1)
+            image.draft("L", (draft_edge, draft_edge))
+            image = ImageOps.exif_transpose(image)
+            return Fingerprint(value=dhash(image, self.hash_size), size=size)
+
+    @staticmethod
+    def _first_page_image(file_bytes: bytes) -> Optional[bytes]:
+        reader = PdfReader(io.BytesIO(file_bytes))
+        if not reader.pages:
+            return None
+        images = reader.pages[0].images
+        if not images:
+            return None
+        largest = max(images, key=lambda image: len(image.data))
+        return largest.data
+
+    def find(self, fingerprint: Fingerprint, scope: str) -> Optional[NearDuplicateMatch]:
+        """
+        Documento indexado mas parecido dentro de ``max_distance`` bits
+
+        Args:
+            fingerprint: Hash perceptual del documento actual
+            scope: Prompt/modelo con el que se extrae; solo se comparan
+                documentos del mismo scope
+        """
+        with self._lock:
+            self._stats["lookups"] += 1
+            nearest = self._table.nearest(fingerprint.value, scope)
+            if nearest is None:
+                return None
+            self._stats["matches"] += 1
+        result_key, distance, size = nearest
+        return NearDuplicateMatch(
+            result_key=result_key,
+            distance=distance,
+            same_size=size == fingerprint.size,
+        )
+
+    def can_serve(self, match: NearDuplicateMatch) -> bool:
+        """
+        True si se puede responder con el resultado de ``match`` sin llamar al modelo
+
+        Ademas de ``serve``, el duplicado tiene que estar a ``serve_max_distance``
+        bits o menos y medir lo mismo en pixeles que el documento indexado.
+        """
+        if not self.serve:
+            return False
+        if match.distance <= self.serve_max_distance and match.same_size:
+            return True
+        with self._lock:
+            self._stats["serve_rejected"] += 1
+        return False
+
+    def add(self, fingerprint: Fingerprint, scope: str, result_key: str):
+        """Indexa un documento cuyo resultado esta en la cache con ``result_key``"""
+        with self._lock:
+            self._table.add(result_key, fingerprint.value, scope, fingerprint.size)
+
+    def record_served(self):
+        """Cuenta una respuesta servida desde el resultado de un duplicado"""
+        with self._lock:
+            self._stats["served"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Tamano del indice, busquedas y duplicados detectados/servidos"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._table)
+        stats["hash_bits"] = self.hash_size * self.hash_size
+        stats["max_distance"] = self.max_distance
+        stats["serve"] = self.serve
+        stats["serve_max_distance"] = self.serve_max_distance
+        return stats
@@ -0,0 +1,287 @@
+import asyncio
+import base64
+import binascii
+import hashlib
+import threading
+from functools import cached_property
+from typing import BinaryIO, Optional
+
+
+# MIME type de cada tipo detectado por magic numbers
+FILE_TYPE_MIME_TYPES = {
+    "PDF": "application/pdf",
+    "PNG": "image/png",
+    "JPEG": "image/jpeg",
+    "WEBP": "image/webp",
+    "TIFF": "image/tiff",
+    "HEIC": "image/heic",
+}
+
+# Marcas de la caja ``ftyp`` de un HEIF/HEIC
+HEIC_BRANDS = (b"heic", b"heix", b"heim", b"heis", b"hevc", b"hevx", b"mif1", b"msf1")
+
+# Un prefijo data URL ("data:application/pdf;base64,") nunca es mas largo que esto
+DATA_URL_PREFIX_MAX = 256
+
+# Bloque de lectura al hashear un archivo subido sin cargarlo entero
+FILE_HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def strip_data_url(file_base64: str) -> str:
+    """Quita el prefijo ``data:<mime>;base64,`` si lo hay"""
+    separator = file_base64.find(",", 0, DATA_URL_PREFIX_MAX)
+    if separator != -1:
+        return file_base64[separator + 1:]
+    return file_base64
+
+
+def normalize_base64(file_base64: str) -> str:
+    """Quita el prefijo data URL y los espacios y saltos de linea (Base64 MIME)"""
+    file_base64 = strip_data_url(file_base64).strip()
+    if "\n" in file_base64 or " " in file_base64 or "\r" in file_base64:
+        # Base64 con saltos de linea (MIME): se compacta una vez
+        file_base64 = "".join(file_base64.split())
+    return file_base64
+
+
+def sniff_file_type(header: bytes) -> str:
+    """
+    Detecta el tipo de archivo a partir de sus primeros bytes (magic numbers)
+
+    Args:
+        header: Archivo o, al menos, sus primeros bytes
+
+    Returns:
+        Tipo de archivo: "PDF", "JPEG", "PNG", "WEBP", "TIFF", "HEIC" o "UNKNOWN"
+    """
+    if header.startswith(b'%PDF'):
+        return "PDF"
+    elif header.startswith(b'\x89PNG'):
+        return "PNG"
+    elif header.startswith(b'\xff\xd8\xff'):
+        return "JPEG"
+    elif header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return "WEBP"
+    elif header[:4] in (b'II*\x00', b'MM\x00*'):
+        return "TIFF"
+    elif header[4:8] == b'ftyp' and header[8:12] in HEIC_BRANDS:
+        return "HEIC"
+    else:
+        return "UNKNOWN"
+
+
+def base64_decoded_size(file_base64: str) -> int:
+    """
+    Tamano en bytes del contenido de un Base64 sin decodificarlo
+
+    Cada 4 caracteres son 3 bytes, menos 1 o 2 por el relleno ``=``. Admite
+    Base64 sin relleno.
+
+    Args:
+        file_base64: Base64 sin prefijo data URL ni espacios
+
+    Returns:
+        Numero de bytes decodificados
+    """
+    length = len(file_base64)
+    padding = 0
+    if file_base64.endswith("=="):
+        padding = 2
+    elif file_base64.endswith("="):
+        padding = 1
+    full_blocks, remainder = divmod(length, 4)
+    return full_blocks * 3 - padding + {0: 0, 2: 1, 3: 2}.get(remainder, 0)
+
+
+class FilePayload:
+    """Archivo de una peticion, decodificado una sola vez
+
+    Se crea en el router (desde Base64 o desde el fichero temporal de
+    una subida binaria) y lo usan ``FileInfoService`` y
+    ``GeminiService``. Todo lo derivado se calcula la primera vez que se pide
+    y se reutiliza:
+
+        - ``size``: tamano en bytes; desde Base64 se calcula con la longitud y
+          el relleno, sin decodificar
+        - ``header()`` / ``tail()``: primeros y ultimos bytes; desde Base64
+          solo decodifica ese trozo y desde un fichero solo lee ese trozo
+        - ``data`` / ``view``: contenido completo (bytes y ``memoryview`` sin copia)
+        - ``file_type`` / ``mime_type``: tipo detectado por magic numbers
+        - ``sha256``: hash del contenido (clave de cache); desde un fichero se
+          calcula por bloques, sin cargarlo en memoria
+
+    Con un fichero, el contenido solo se lee entero si se pide ``data`` (por
+    ejemplo, al llamar al modelo tras fallar la cache). Desde codigo async
+    se usan ``load_sha256()`` y ``load()``, que leen el fichero en un hilo en
+    vez de bloquear el event loop. El fichero tiene que seguir abierto
+    mientras se use el payload: lo cierra quien lo creo.
+    """
+
+    def __init__(
+        self,
+        data: Optional[bytes] = None,
+        file_base64: Optional[str] = None,
+        mime_type: Optional[str] = None,
+        filename: Optional[str] = None,
+        file: Optional[BinaryIO] = None,
+        file_size: Optional[int] = None,
+    ):
+        if data is None and file_base64 is None and file is None:
+            raise ValueError("FilePayload needs data, file_base64 or file")
+        self._data = data
+        self._base64 = file_base64
+        self._file = file
+        self._file_size = file_size
+        # seek + read del fichero desde el event loop y desde hilos
+        self._file_lock = threading.Lock()
+        self.declared_mime_type = mime_type
+        self.filename = filename
+
+    @classmethod
+    def from_base64(
+        cls,
+        file_base64: str,
+        mime_type: Optional[str] = None,
+        filename: Optional[str] = None,
+    ) -> "FilePayload":
+        """Crea el payload desde un Base64, con o sin prefijo data URL"""
+        file_base64 = normalize_base64(file_base64)
+        return cls(file_base64=file_base64, mime_type=mime_type, filename=filename)
+
+    @classmethod
+    def from_file(
+        cls,
+        file: BinaryIO,
+        size: int,
+        mime_type: Optional[str] = None,
+        filename: Optional[str] = None,
+    ) -> "FilePayload":
+        """
+        Crea el payload sobre un fichero abierto (el ``SpooledTemporaryFile`` de una subida)
+
+        Args:
+            file: Fichero binario con ``seek``; no se cierra aqui
+            size: Tamano del contenido en bytes
+        """
+        return cls(file=file, file_size=size, mime_type=mime_type, filename=filename)
+
+    @property
+    def decoded(self) -> bool:
+        """True si el contenido ya esta en memoria decodificado"""
+        return self._data is not None
+
+    @cached_property
+    def size(self) -> int:
+        """Tamano del archivo en bytes"""
+        if self._data is not None:
+            return len(self._data)
+        if self._file is not None:
+            return self._file_size
+        return base64_decoded_size(self._base64)
+
+    @property
+    def data(self) -> bytes:
+        """
+        Contenido del archivo; el Base64 se decodifica (o el fichero se lee) la primera vez
+
+        Raises:
+            ValueError: Si el Base64 no es valido
+        """
+        if self._data is None and self._file is not None:
+            self._data = self._read_file(0, self._file_size)
+        elif self._data is None:
+            try:
+                self._data = base64.b64decode(self._base64)
+            except (binascii.Error, ValueError) as e:
+                raise ValueError(f"Invalid base64 data: {e}") from e
+            # El texto ya no hace falta: se libera la copia en Base64
+            self._base64 = None
+        return self._data
+
+    @property
+    def view(self) -> memoryview:
+        """``memoryview`` del contenido, para trocear y hashear sin copiar"""
+        return memoryview(self.data)
+
+    def header(self, length: int = 64) -> bytes:
+        """
+        Primeros ``length`` bytes del archivo
+
+        Si aun no se ha decodificado, decodifica solo los caracteres Base64
+        necesarios (4 por cada 3 bytes).
+        """
+        if self._data is not None:
+            return bytes(self.view[:length])
+        if self._file is not None:
+            return self._read_file(0, length)
+        chars = -(-length // 3) * 4
+        try:
+            return base64.b64decode(self._base64[:chars])[:length]
+        except (binascii.Error, ValueError):
+            return b""
+
+    def tail(self, length: int) -> bytes:
+        """
+        Ultimos ``length`` bytes del archivo
+
+        Si aun no se ha decodificado, decodifica solo el final del Base64
+        (alineado a bloques de 4 caracteres).
+        """
+        if self._data is not None:
+            return bytes(self.view[-length:])
+        if self._file is not None:
+            start = max(0, self._file_size - length)
+            return self._read_file(start, self._file_size - start)
+        chars = -(-length // 3) * 4
+        # Los bloques completos empiezan en multiplos de 4 desde el principio
+        start = max(0, len(self._base64) - chars)
+        start -= start % 4
+        chunk = self._base64[start:]
+        try:
+            return base64.b64decode(chunk + "=" * (-len(chunk) % 4))[-length:]
+        except (binascii.Error, ValueError):
+            return b""
+
+    @cached_property
+    def file_type(self) -> str:
+        """Tipo detectado por magic numbers (PDF, PNG, JPEG, WEBP, TIFF, HEIC o UNKNOWN)"""
+        return sniff_file_type(self.header(16))
+
+    @property
+    def mime_type(self) -> Optional[str]:
+        """MIME type declarado por el cliente o, si no hay, el detectado"""
+        return self.declared_mime_type or FILE_TYPE_MIME_TYPES.get(self.file_type)
+
+    @cached_property
+    def sha256(self) -> str:
+        """SHA-256 del contenido en hexadecimal"""
+        if self._data is None and self._file is not None:
+            return self._file_sha256()
+        return hashlib.sha256(self.view).hexdigest()
+
+    async def load_sha256(self) -> str:
+        """``sha256`` sin bloquear el event loop: un fichero se hashea en un hilo"""
+        if "sha256" not in self.__dict__ and self._data is None and self._file is not None:
+            self.__dict__["sha256"] = await asyncio.to_thread(self._file_sha256)
+        return self.sha256
+
+    async def load(self):
+        """Lee en un hilo el contenido de un fichero, para que ``data`` no bloquee el event loop
+
+        Con Base64 no hace nada: la decodificacion sigue siendo la de ``data``.
+        """
+        if self._data is None and self._file is not None:
+            self._data = await asyncio.to_thread(self._read_file, 0, self._file_size)
+
+    def _file_sha256(self) -> str:
+        digest = hashlib.sha256()
+        with self._file_lock:
+            self._file.seek(0)
+            while chunk := self._file.read(FILE_HASH_CHUNK_BYTES):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _read_file(self, start: int, length: int) -> bytes:
+        with self._file_lock:
+            self._file.seek(start)
+            return self._file.read(length)
@@ -0,0 +1,150 @@
+import io
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from pypdf import PdfReader, PdfWriter
+
+from app.constants import Constants
+
+
+@dataclass
+class PdfChunk:
+    """Rango de paginas de un PDF listo para enviarse al modelo"""
+    pages: List[int]
+    data: bytes
+
+
+class PdfSplitter:
+    """Divide PDFs multipagina en rangos de paginas y fusiona los resultados
+
+    Las paginas en blanco (sin texto ni imagenes y con un content stream
+    minimo) se descartan sin llamar al modelo. La deteccion es barata: solo
+    mira los recursos y la longitud del content stream, no renderiza.
+    """
+
+    # Un content stream mas corto que esto no dibuja nada util
+    BLANK_CONTENT_BYTES = 64
+
+    def __init__(
+        self,
+        logger,
+        pages_per_chunk: int = Constants.PDF_PAGES_PER_CHUNK,
+        max_pages: int = Constants.PDF_MAX_PAGES,
+    ):
+        self.logger = logger
+        self.name = "Pdf_Splitter"
+        self.pages_per_chunk = pages_per_chunk
+        self.max_pages = max_pages
+
+    @property
+    def signature(self) -> str:
+        """Identifica la configuracion; forma parte de la clave de cache"""
+        return f"split:{self.pages_per_chunk}:{self.max_pages}"
+
+    def split(self, file_bytes: bytes) -> Tuple[List[PdfChunk], int]:
+        """
+        Divide el PDF en rangos de ``pages_per_chunk`` paginas no vacias
+
+        Es CPU-bound: debe llamarse fuera del event loop.
+
+        Args:
+            file_bytes: Bytes del PDF
+
+        Returns:
+            Tupla (chunks, numero de paginas en blanco descartadas). Si el PDF
+            tiene una sola pagina util devuelve un unico chunk con el original.
+        """
+        reader = PdfReader(io.BytesIO(file_bytes))
+        total_pages = len(reader.pages)
+        if total_pages > self.max_pages:
+            raise ValueError(
+                f"PDF has {total_pages} pages, maximum allowed is {self.max_pages}"
+            )
+
+        content_pages = []
+        for index, page in enumerate(reader.pages):
+            if self.is_blank(page):
+                continue
+            content_pages.append((index + 1, page))
+        skipped = total_pages - len(content_pages)
+
+        if total_pages <= 1 or not content_pages:
+            # Nada que dividir (o todo parece en blanco): se envia el original
+            return [PdfChunk(pages=list(range(1, total_pages + 1)), data=file_bytes)], 0
+
+        chunks = []
+        for start in range(0, len(content_pages), self.pages_per_chunk):
+            group = content_pages[start:start + self.pages_per_chunk]
+            writer = PdfWriter()
+            for _, page in group:
+                writer.add_page(page)
+            output = io.BytesIO()
+            writer.write(output)
+            chunks.append(
+                PdfChunk(pages=[number for number, _ in group], data=output.getvalue())
+            )
+        return chunks, skipped
+
+    @classmethod
+    def is_blank(cls, page) -> bool:
+        """True si la pagina no tiene texto, imagenes ni dibujo apreciable"""
+        resources = page.get("/Resources")
+        if resources is not None:
+            resources = resources.get_object()
+            if resources.get("/XObject") or resources.get("/Font"):
+                return False
+        contents = page.get_contents()
+        if contents is None:
+            return True
+        return len(contents.get_data().strip()) < cls.BLANK_CONTENT_BYTES
+
+    @staticmethod
+    def merge(results: List[Tuple[PdfChunk, Dict[str, Any]]]) -> Dict[str, Any]:
+        """
+        Fusiona los JSON extraidos de cada rango en un unico ``extracted_data``
+
+        Reglas:
+            - Para cada campo gana el primer valor no nulo en orden de pagina
+            - Los booleanos (firmas) son True si alguna pagina los marca
+            - ``_provenance`` indica de que paginas sale cada campo
+            - ``_page_errors`` recoge los rangos que no se pudieron extraer
+
+        Args:
+            results: Pares (chunk, resultado) en orden de pagina; el resultado
+                puede ser una excepcion si ese rango fallo
+
+        Returns:
+            Dict con los campos fusionados
+        """
+        merged: Dict[str, Any] = {}
+        provenance: Dict[str, List[int]] = {}
+        page_errors = []
+
+        for chunk, result in results:
+            if isinstance(result, Exception):
+                page_errors.append({"pages": chunk.pages, "error": str(result)})
+                continue
+            if not isinstance(result, dict) or "raw_response" in result or "error" in result:
+                page_errors.append({
+                    "pages": chunk.pages,
+                    "error": result.get("error", "Unparseable model response")
+                    if isinstance(result, dict) else "Unexpected model response",
+                })
+                continue
+            for field, value in result.items():
+                if value is None or value == "":
+                    merged.setdefault(field, None)
+                    continue
+                current = merged.get(field)
+                if isinstance(value, bool):
+                    if current is None or (value and current is False):
+                        merged[field] = value
+                        provenance[field] = chunk.pages
+                elif current is None:
+                    merged[field] = value
+                    provenance[field] = chunk.pages
+
+        merged["_provenance"] = provenance
+        if page_errors:
+            merged["_page_errors"] = page_errors
+        return merged
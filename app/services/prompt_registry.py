@@ -0,0 +1,238 @@
+import asyncio
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Type
+
+from google.genai import errors as genai_errors
+from google.genai.types import GenerateContentConfig, Part
+from pydantic import BaseModel
+
+from app.constants import Constants, ImagePrompts
+from app.models.volante import VolanteData
+
+
+# Instruccion que se anade a todos los prompts para forzar salida JSON
+JSON_OUTPUT_INSTRUCTIONS = """
+                IMPORTANTE: Devuelve ÚNICAMENTE un objeto JSON válido con los campos solicitados. 
+                No incluyas explicaciones adicionales, solo el JSON.
+                """
+
+
+# Errores de Gemini cuando el contenido cacheado ha caducado o se ha borrado
+CACHED_CONTENT_MISSING_CODES = (403, 404)
+CACHED_CONTENT_MISSING_STATUSES = ("NOT_FOUND", "PERMISSION_DENIED")
+
+
+def is_cached_content_missing(error: Exception) -> bool:
+    """
+    True si Gemini rechaza la llamada porque el ``cachedContents`` ya no existe
+
+    Solo estos errores justifican repetir la llamada con el prompt completo;
+    un 400 por un archivo corrupto o no soportado fallaria igual.
+    """
+    if not isinstance(error, genai_errors.ClientError):
+        return False
+    if error.code not in CACHED_CONTENT_MISSING_CODES:
+        return False
+    if error.status is not None and error.status not in CACHED_CONTENT_MISSING_STATUSES:
+        return False
+    detail = f"{error.message} {error.details}".lower().replace(" ", "")
+    return "cachedcontent" in detail
+
+
+@dataclass(frozen=True)
+class CompiledPrompt:
+    """Objetos de peticion construidos una sola vez para un prompt
+
+    Si ``cached_content`` esta presente, el prompt ya vive en el backend como
+    contenido cacheado y solo hay que enviar el fichero. ``response_model`` es
+    el esquema tipado de la respuesta (solo para el prompt por defecto).
+    """
+    prompt: str
+    prompt_part: Part
+    config: GenerateContentConfig
+    response_model: Optional[Type[BaseModel]] = None
+    cached_content: Optional[str] = None
+    cached_config: Optional[GenerateContentConfig] = None
+
+    def contents(self, file_part: Part, use_cached: bool = True) -> List[Part]:
+        """Partes a enviar al modelo junto al fichero"""
+        if use_cached and self.cached_content:
+            return [file_part]
+        return [file_part, self.prompt_part]
+
+    def generation_config(self, use_cached: bool = True) -> GenerateContentConfig:
+        """Configuracion de generacion a usar"""
+        if use_cached and self.cached_config is not None:
+            return self.cached_config
+        return self.config
+
+
+class PromptRegistry:
+    """Registro de prompts precompilados
+
+    Construye una vez el texto final, el ``Part`` y el ``GenerateContentConfig``
+    de cada prompt (el de volante por defecto, con ``VolanteData`` como esquema
+    de respuesta, y un LRU acotado de prompts personalizados). Si ``context_cache`` esta activo registra ademas el prompt
+    por defecto como contenido cacheado en el backend, de modo que cada
+    peticion solo envia la imagen y el identificador de la cache. Si el
+    backend no lo soporta (o el prompt no llega al minimo de tokens) se sigue
+    enviando el prompt completo, como antes.
+    """
+
+    # Margen antes de la caducidad en el que se renueva la cache del backend
+    REFRESH_MARGIN_SECONDS = 300
+    # Espera antes de volver a intentar registrar la cache si el backend falla
+    RETRY_SECONDS = 600
+
+    def __init__(
+        self,
+        logger,
+        backend,
+        model_name: str,
+        context_cache: bool = Constants.CONTEXT_CACHE_ENABLED,
+        context_cache_ttl: int = Constants.CONTEXT_CACHE_TTL_SECONDS,
+        max_custom_prompts: int = 64,
+    ):
+        self.logger = logger
+        self.name = "Prompt_Registry"
+        self.backend = backend
+        self.model_name = model_name
+        self.context_cache = context_cache
+        self.context_cache_ttl = context_cache_ttl
+        self.max_custom_prompts = max_custom_prompts
+
+        self._default = self._compile_default()
+        self._custom: "OrderedDict[str, CompiledPrompt]" = OrderedDict()
+        self._cache_expires_at = 0.0
+        self._next_attempt_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._stats = {"context_cache_hits": 0, "context_cache_fallbacks": 0}
+
+    @staticmethod
+    def _compile(prompt: str, response_model: Type[BaseModel] = None) -> CompiledPrompt:
+        return CompiledPrompt(
+            prompt=prompt,
+            prompt_part=Part.from_text(text=f"{prompt}{JSON_OUTPUT_INSTRUCTIONS}"),
+            config=GenerateContentConfig(
+                temperature=0.1,
+                response_mime_type="application/json",
+                response_schema=response_model
+            ),
+            response_model=response_model,
+        )
+
+    @classmethod
+    def _compile_default(cls) -> CompiledPrompt:
+        return cls._compile(ImagePrompts.VOLANTE_MAPFRE_PROMPT, response_model=VolanteData)
+
+    def get(self, prompt: str) -> CompiledPrompt:
+        """
+        Devuelve el prompt compilado
+
+        Args:
+            prompt: Texto del prompt (por defecto o personalizado)
+
+        Returns:
+            CompiledPrompt listo para usar en generate_content
+        """
+        if prompt == self._default.prompt:
+            if self.context_cache:
+                self._maybe_refresh()
+            compiled = self._default
+            if compiled.cached_content:
+                if time.monotonic() < self._cache_expires_at:
+                    self._stats["context_cache_hits"] += 1
+                    return compiled
+                # Caducada y aun sin renovar: se envia el prompt completo
+                self._stats["context_cache_fallbacks"] += 1
+                return CompiledPrompt(
+                    prompt=compiled.prompt,
+                    prompt_part=compiled.prompt_part,
+                    config=compiled.config,
+                    response_model=compiled.response_model,
+                )
+            return compiled
+
+        compiled = self._custom.get(prompt)
+        if compiled is None:
+            compiled = self._compile(prompt)
+            self._custom[prompt] = compiled
+            if len(self._custom) > self.max_custom_prompts:
+                self._custom.popitem(last=False)
+        else:
+            self._custom.move_to_end(prompt)
+        return compiled
+
+    async def warm_up(self):
+        """Registra el prompt por defecto como contenido cacheado si esta activo"""
+        if not self.context_cache:
+            return
+        await self._register_default()
+
+    def invalidate(self):
+        """
+        Descarta la cache del backend (p.ej. si el backend la rechaza) y vuelve
+        al envio del prompt completo hasta que se renueve
+        """
+        self._stats["context_cache_fallbacks"] += 1
+        self._cache_expires_at = 0.0
+        self._default = self._compile_default()
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado de la cache de contexto y prompts compilados"""
+        stats = dict(self._stats)
+        stats["context_cache_enabled"] = self.context_cache
+        stats["context_cache_active"] = bool(self._default.cached_content) and (
+            time.monotonic() < self._cache_expires_at
+        )
+        stats["custom_prompts_compiled"] = len(self._custom)
+        return stats
+
+    def _maybe_refresh(self):
+        now = time.monotonic()
+        if now < self._cache_expires_at - self.REFRESH_MARGIN_SECONDS:
+            return
+        if now < self._next_attempt_at:
+            return
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.get_running_loop().create_task(self._register_default())
+
+    async def _register_default(self):
+        prompt_text = f"{ImagePrompts.VOLANTE_MAPFRE_PROMPT}{JSON_OUTPUT_INSTRUCTIONS}"
+        self._next_attempt_at = time.monotonic() + self.RETRY_SECONDS
+        try:
+            cached_name = await self.backend.create_cached_content(
+                model=self.model_name,
+                system_instruction=prompt_text,
+                ttl_seconds=self.context_cache_ttl,
+                display_name="volante-mapfre-prompt",
+            )
+        except Exception as e:
+            self.logger.warning(
+                f"Context caching not available, sending full prompt: {e}",
+                logger_name=self.name
+            )
+            return
+
+        base = self._compile_default()
+        self._default = CompiledPrompt(
+            prompt=base.prompt,
+            prompt_part=base.prompt_part,
+            config=base.config,
+            response_model=base.response_model,
+            cached_content=cached_name,
+            cached_config=GenerateContentConfig(
+                temperature=0.1,
+                response_mime_type="application/json",
+                response_schema=base.response_model,
+                cached_content=cached_name,
+            ),
+        )
+        self._cache_expires_at = time.monotonic() + self.context_cache_ttl
+        self.logger.info(
+            f"Default prompt registered as cached content {cached_name}",
+            logger_name=self.name
+        )
@@ -0,0 +1,299 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+
+import httpx
+from google.genai import errors as genai_errors
+
+from app.constants import Constants
+
+
+# Codigos de Gemini que indican cuota agotada o sobrecarga temporal
+RETRYABLE_STATUS_CODES = (429, 500, 503, 504)
+OVERLOAD_STATUS_CODES = (429, 503)
+
+
+class ModelUnavailableError(Exception):
+    """El modelo no ha podido atender la peticion dentro del plazo
+
+    ``status_code`` es el codigo HTTP que debe devolver la API (429 si Gemini
+    ha indicado cuota agotada, 503 en el resto de casos) y ``retry_after`` los
+    segundos sugeridos al cliente antes de reintentar.
+    """
+
+    def __init__(self, message: str, status_code: int = 503, retry_after: float = 1.0):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+def is_retryable(error: Exception) -> bool:
+    """True si el error de Gemini es transitorio y merece reintento"""
+    if isinstance(error, genai_errors.APIError):
+        return error.code in RETRYABLE_STATUS_CODES
+    return isinstance(error, (httpx.TimeoutException, httpx.TransportError))
+
+
+def is_overload(error: Exception) -> bool:
+    """True si el error indica que hay que reducir la concurrencia"""
+    if isinstance(error, genai_errors.APIError):
+        return error.code in OVERLOAD_STATUS_CODES
+    return isinstance(error, httpx.TimeoutException)
+
+
+class AdaptiveLimiter:
+    """Limitador de concurrencia adaptativo (AIMD) para las llamadas al modelo
+
+    - Incremento aditivo: cada respuesta correcta suma ``1 / limit`` al limite,
+      es decir, aproximadamente +1 por cada "ronda" completa de peticiones.
+    - Decremento multiplicativo: un 429/503 (o timeout) multiplica el limite
+      por ``backoff_ratio``. Si la latencia reciente supera ``latency_tolerance``
+      veces la latencia base, el limite se reduce ligeramente aunque no haya
+      errores (Gemini empieza a encolar antes de rechazar).
+
+    Las peticiones que no caben esperan en cola hasta su deadline.
+    """
+
+    def __init__(
+        self,
+        logger,
+        initial_limit: int = Constants.LIMITER_INITIAL,
+        min_limit: int = Constants.LIMITER_MIN,
+        max_limit: int = Constants.LIMITER_MAX,
+        backoff_ratio: float = Constants.LIMITER_BACKOFF_RATIO,
+        latency_tolerance: float = Constants.LIMITER_LATENCY_TOLERANCE,
+    ):
+        self.logger = logger
+        self.name = "Adaptive_Limiter"
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance
+        self._limit = float(initial_limit)
+        self._in_flight = 0
+        self._waiting = 0
+        self._condition: Optional[asyncio.Condition] = None
+        # Tareas que despiertan a la cola; se guardan para que no las recoja el GC
+        self._notify_tasks: Set[asyncio.Task] = set()
+        self._baseline_latency: Optional[float] = None
+        self._recent_latency: Optional[float] = None
+        self._stats = {
+            "successes": 0,
+            "overloads": 0,
+            "errors": 0,
+            "rejected": 0,
+            "latency_decreases": 0,
+        }
+
+    @property
+    def limit(self) -> int:
+        """Numero de llamadas simultaneas permitidas ahora mismo"""
+        return max(self.min_limit, int(self._limit))
+
+    @asynccontextmanager
+    async def slot(self, deadline: float):
+        """
+        Reserva un hueco de concurrencia hasta ``deadline`` (reloj monotonic del loop)
+
+        Raises:
+            ModelUnavailableError: Si no hay hueco antes del deadline
+        """
+        await self._acquire(deadline)
+        try:
+            yield
+        finally:
+            await self._release()
+
+    def record_success(self, latency: float):
+        """Registra una llamada correcta y su latencia en segundos"""
+        self._stats["successes"] += 1
+        if self._baseline_latency is None:
+            self._baseline_latency = self._recent_latency = latency
+        else:
+            # Media rapida para la latencia reciente y lenta para la base
+            self._recent_latency = 0.8 * self._recent_latency + 0.2 * latency
+            self._baseline_latency = 0.99 * self._baseline_latency + 0.01 * latency
+
+        if self._recent_latency > self.latency_tolerance * self._baseline_latency:
+            self._stats["latency_decreases"] += 1
+            self._set_limit(self._limit * 0.9)
+        else:
+            self._set_limit(self._limit + 1.0 / max(self._limit, 1.0))
+
+    def record_overload(self):
+        """Registra un 429/503 o timeout de Gemini y reduce el limite"""
+        self._stats["overloads"] += 1
+        self._set_limit(self._limit * self.backoff_ratio)
+        self.logger.warning(
+            f"Gemini overload detected, concurrency limit reduced to {self.limit}",
+            logger_name=self.name
+        )
+
+    def record_error(self):
+        """Registra un error que no afecta al limite"""
+        self._stats["errors"] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Limite actual, ocupacion, cola y contadores"""
+        stats = dict(self._stats)
+        stats.update(
+            {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "queue_depth": self._waiting,
+                "recent_latency_ms": (
+                    round(self._recent_latency * 1000, 1) if self._recent_latency else None
+                ),
+                "baseline_latency_ms": (
+                    round(self._baseline_latency * 1000, 1) if self._baseline_latency else None
+                ),
+            }
+        )
+        return stats
+
+    def _set_limit(self, value: float):
+        previous = self.limit
+        self._limit = min(float(self.max_limit), max(float(self.min_limit), value))
+        # Solo hace falta despertar a la cola cuando se abren huecos nuevos
+        if self.limit > previous and self._waiting and self._condition is not None:
+            task = asyncio.get_running_loop().create_task(self._notify_all())
+            self._notify_tasks.add(task)
+            task.add_done_callback(self._notify_tasks.discard)
+
+    async def _notify_all(self):
+        async with self._condition:
+            self._condition.notify_all()
+
+    async def _acquire(self, deadline: float):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        loop = asyncio.get_running_loop()
+        async with self._condition:
+            self._waiting += 1
+            try:
+                while self._in_flight >= self.limit:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        self._stats["rejected"] += 1
+                        raise ModelUnavailableError(
+                            "Gemini concurrency limit reached, try again later",
+                            status_code=503,
+                        )
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), timeout=remaining)
+                    except asyncio.TimeoutError:
+                        continue
+                self._in_flight += 1
+            finally:
+                self._waiting -= 1
+
+    async def _release(self):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+
+class RetryPolicy:
+    """Reintentos con backoff exponencial y jitter completo, acotados por deadline"""
+
+    def __init__(
+        self,
+        logger,
+        max_attempts: int = Constants.GEMINI_RETRY_MAX_ATTEMPTS,
+        base_delay: float = Constants.GEMINI_RETRY_BASE_DELAY,
+        max_delay: float = Constants.GEMINI_RETRY_MAX_DELAY,
+    ):
+        self.logger = logger
+        self.name = "Retry_Policy"
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._stats = {"retries": 0, "exhausted": 0, "deadline_exceeded": 0}
+
+    def backoff(self, attempt: int) -> float:
+        """Espera antes del reintento ``attempt`` (1 = primer reintento)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    async def run(
+        self,
+        func: Callable[[], Awaitable[Any]],
+        deadline: float,
+        limiter: Optional[AdaptiveLimiter] = None,
+    ) -> Any:
+        """
+        Ejecuta ``func`` reintentando errores transitorios sin pasarse del deadline
+
+        Args:
+            func: Funcion sin argumentos que devuelve la corrutina de la llamada
+            deadline: Instante limite (``loop.time()``) para toda la operacion
+            limiter: Limitador adaptativo que envuelve cada intento
+
+        Returns:
+            Resultado de ``func``
+
+        Raises:
+            ModelUnavailableError: Si se agotan los reintentos o el plazo
+        """
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                self._stats["deadline_exceeded"] += 1
+                raise ModelUnavailableError("Gemini request deadline exceeded", status_code=503)
+            try:
+                if limiter is None:
+                    return await asyncio.wait_for(func(), timeout=remaining)
+                async with limiter.slot(deadline):
+                    started = time.monotonic()
+                    try:
+                        result = await asyncio.wait_for(
+                            func(), timeout=deadline - loop.time()
+                        )
+                    except Exception as e:
+                        if is_overload(e) or isinstance(e, asyncio.TimeoutError):
+                            limiter.record_overload()
+                        else:
+                            limiter.record_error()
+                        raise
+                    limiter.record_success(time.monotonic() - started)
+                    return result
+            except asyncio.TimeoutError:
+                self._stats["deadline_exceeded"] += 1
+                raise ModelUnavailableError("Gemini request deadline exceeded", status_code=503)
+            except ModelUnavailableError:
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                status_code = 429 if getattr(e, "code", None) == 429 else 503
+                delay = self.backoff(attempt)
+                if attempt >= self.max_attempts:
+                    self._stats["exhausted"] += 1
+                    raise ModelUnavailableError(
+                        f"Gemini unavailable after {attempt} attempts: {e}",
+                        status_code=status_code,
+                        retry_after=max(delay, self.base_delay),
+                    ) from e
+                if loop.time() + delay >= deadline:
+                    # El reintento no cabe en el plazo del llamante
+                    self._stats["deadline_exceeded"] += 1
+                    raise ModelUnavailableError(
+                        f"Gemini unavailable and no time left to retry: {e}",
+                        status_code=status_code,
+                        retry_after=max(delay, self.base_delay),
+                    ) from e
+                self._stats["retries"] += 1
+                self.logger.warning(
+                    f"Retryable Gemini error ({e}), attempt {attempt}/{self.max_attempts},"
+                    f" retrying in {delay:.2f}s",
+                    logger_name=self.name
+                )
+                await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores de reintentos"""
+        return dict(self._stats)
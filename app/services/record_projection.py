@@ -0,0 +1,195 @@
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Optional, Tuple
+
+
+@dataclass(frozen=True)
+class Projection:
+    """Forma de salida de un dict (y de sus dicts anidados)
+
+    Attributes:
+        defaults: Claves que se anaden con este valor si faltan; el resto de
+            claves de la entrada se conservan
+        drop: Claves que se eliminan
+        only: Si se indica, solo se conservan estas claves (con su valor por
+            defecto si faltan) y se ignoran ``defaults`` y ``drop``
+        children: Proyeccion de los valores dict de algunas claves
+        required: En un hijo, se crea aunque falte en la entrada (con sus
+            valores por defecto)
+    """
+    defaults: Mapping[str, Any] = field(default_factory=dict)
+    drop: Tuple[str, ...] = ()
+    only: Optional[Mapping[str, Any]] = None
+    children: Mapping[str, "Projection"] = field(default_factory=dict)
+    required: bool = False
+
+
+def compile_projection(schema: Projection) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Convierte ``schema`` en una funcion que proyecta un dict en una pasada
+
+    Se genera el codigo de una unica funcion plana (como hacen
+    ``dataclasses`` y ``namedtuple``): los valores por defecto escalares van
+    como literales, los hijos van en linea y no hay bucles sobre el esquema
+    ni llamadas anidadas por registro. La funcion no modifica la entrada:
+    cada nivel con proyeccion es un dict nuevo.
+    """
+    builder = _ProjectionBuilder()
+    builder.build(schema, "record", "out", 1)
+    source = "def project(record):\n" + "\n".join(builder.lines) + "\n    return out\n"
+    namespace = dict(builder.namespace)
+    exec(compile(source, f"<projection {id(schema):x}>", "exec"), namespace)
+    project = namespace["project"]
+    project.__source__ = source
+    return project
+
+
+class _ProjectionBuilder:
+    """Genera las lineas de codigo de ``compile_projection``"""
+
+    def __init__(self):
+        self.lines: List[str] = []
+        # Los builtins van en el namespace: se resuelven como globales, sin pasar a builtins
+        self.namespace: Dict[str, Any] = {
+            "_copy_default": _copy_default,
+            "isinstance": isinstance,
+            "dict": dict,
+        }
+        self._names = 0
+
+    def build(self, schema: Projection, source: str, target: str, indent: int):
+        """Codigo que deja en ``target`` la proyeccion del dict ``source``"""
+        if schema.only is not None:
+            items = ", ".join(
+                f"{key!r}: {source}.get({key!r}, {self._constant(default)})"
+                for key, default in schema.only.items()
+            )
+            self._emit(indent, f"{target} = {{{items}}}")
+        else:
+            if schema.defaults:
+                names = {key: self._constant(default) for key, default in schema.defaults.items()}
+                items = ", ".join(f"{key!r}: {name}" for key, name in names.items())
+                self._emit(indent, f"{target} = {{{items}}}")
+                self._emit(indent, f"{target}.update({source})")
+                for key, default in schema.defaults.items():
+                    if isinstance(default, (dict, list)) and key not in schema.children:
+                        # No se comparten valores por defecto mutables entre registros
+                        name = names[key]
+                        self._emit(indent, f"if {target}[{key!r}] is {name}:")
+                        self._emit(indent + 1, f"{target}[{key!r}] = _copy_default({name})")
+            else:
+                self._emit(indent, f"{target} = {source}.copy()")
+            for key in schema.drop:
+                self._emit(indent, f"{target}.pop({key!r}, None)")
+        for key, child in schema.children.items():
+            value, projected = self._name(), self._name()
+            self._emit(indent, f"{value} = {target}.get({key!r})")
+            default = schema.defaults.get(key) if schema.only is None else None
+            if isinstance(default, (dict, list)):
+                # El valor por defecto se copia (el hijo solo copia su primer nivel)
+                self._emit(indent, f"if {value} is {names[key]}:")
+                self._emit(indent + 1, f"{value} = _copy_default({value})")
+            if child.required:
+                self._emit(indent, f"if not isinstance({value}, dict):")
+                self._emit(indent + 1, f"{value} = {{}}")
+                self.build(child, value, projected, indent)
+                self._emit(indent, f"{target}[{key!r}] = {projected}")
+            else:
+                self._emit(indent, f"if isinstance({value}, dict):")
+                self.build(child, value, projected, indent + 1)
+                self._emit(indent + 1, f"{target}[{key!r}] = {projected}")
+
+    def _constant(self, value: Any) -> str:
+        if value is None or isinstance(value, (str, int, float, bool)):
+            return repr(value)
+        name = self._name("_default")
+        self.namespace[name] = value
+        return name
+
+    def _name(self, prefix: str = "v") -> str:
+        self._names += 1
+        return f"{prefix}{self._names}"
+
+    def _emit(self, indent: int, line: str):
+        self.lines.append("    " * indent + line)
+
+
+def _copy_default(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _copy_default(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy_default(item) for item in value]
+    return value
+
+
+class RecordProjector:
+    """Proyeccion compilada de un esquema, para un registro o una lista"""
+
+    def __init__(self, schema: Projection):
+        self.schema = schema
+        self.project = compile_projection(schema)
+
+    def __call__(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        return self.project(record)
+
+    def many(self, records: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Proyecta todos los registros (sin resolver la funcion en cada uno)"""
+        project = self.project
+        return [project(record) for record in records]
+
+
+# Registro de Firehose de KinesisProccess.process_kinesis_json
+KINESIS_RECORD_SCHEMA = Projection(
+    defaults={
+        "callId": "",
+        "open_claim": 0,
+        "is_redirect": 0,
+        "reason_redirect": "",
+        "second_time": 0,
+        "interruptions_barge_in": 0,
+        "control_group": 0,
+        "claim_information": {
+            "policyId": "",
+            "claimTypeCode": "",
+            "effectiveDate": "",
+            "claimOcurrenceAddress": {
+                "zipCode": "",
+                "townDesc": "",
+                "provinceCode": "",
+            },
+            "claimCaller": {"relationshipCode": ""},
+            "correspondence": {
+                "address": {"zipCode": "", "townDesc": "", "provinceCode": ""},
+            },
+            "report": "",
+            "claimDamagesSpecific": {
+                "damage": {"damageCode": "", "damageDesc": ""},
+                "brandCode": "",
+                "modelName": "",
+                "years": "",
+                "warranty": "",
+            },
+        },
+        "datetime": "",
+    },
+    children={
+        "claim_information": Projection(
+            children={
+                # Sin datos personales del llamante
+                "claimOcurrenceAddress": Projection(drop=("addressName",)),
+                "claimCaller": Projection(drop=("contactName", "contactMethod")),
+                "correspondence": Projection(
+                    drop=("name", "contactMethod"),
+                    children={
+                        # Solo zipCode, townDesc y provinceCode
+                        "address": Projection(
+                            only={"zipCode": "", "townDesc": "", "provinceCode": ""},
+                            required=True,
+                        ),
+                    },
+                ),
+            },
+        ),
+    },
+)
+
+KINESIS_RECORD_PROJECTOR = RecordProjector(KINESIS_RECORD_SCHEMA)
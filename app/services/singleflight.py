@@ -0,0 +1,83 @@
+import asyncio
+import copy
+from typing import Any, Awaitable, Callable, Dict
+
+
+class SingleFlight:
+    """Agrupa llamadas identicas que estan en vuelo a la vez
+
+    La primera peticion para una clave lanza la llamada real como una tarea
+    independiente; las que llegan mientras sigue en curso esperan esa misma
+    tarea en lugar de repetir la llamada al modelo. El resultado (o la
+    excepcion) se comparte con todos los que esperan.
+
+    La tarea se protege con ``asyncio.shield`` para que la cancelacion de un
+    cliente (p.ej. desconexion) no cancele la llamada del resto. Se cuenta
+    cuantos esperan cada tarea: si se cancelan todos, se cancela tambien la
+    llamada, que ya no tiene a quien devolver el resultado.
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+        self.name = "Single_Flight"
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self._stats = {"leaders": 0, "coalesced": 0, "errors": 0, "abandoned": 0}
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Ejecuta ``func`` una sola vez por clave entre las llamadas concurrentes
+
+        Args:
+            key: Identificador de la peticion (fichero, prompt y modelo)
+            func: Funcion sin argumentos que devuelve la corrutina a ejecutar
+
+        Returns:
+            Resultado de la llamada; los seguidores reciben una copia propia
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self._stats["coalesced"] += 1
+            self.logger.info(
+                f"Coalescing request with in-flight extraction ({key[:12]})",
+                logger_name=self.name
+            )
+            result = await self._wait(key, task)
+            return copy.deepcopy(result)
+
+        self._stats["leaders"] += 1
+        task = asyncio.get_running_loop().create_task(func())
+        self._inflight[key] = task
+        task.add_done_callback(lambda done: self._finish(key, done))
+        return await self._wait(key, task)
+
+    async def _wait(self, key: str, task: asyncio.Task) -> Any:
+        """Espera ``task`` y la cancela si se va el ultimo que la esperaba"""
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                self._stats["abandoned"] += 1
+                # Las peticiones que lleguen a partir de ahora lanzan otra llamada
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+                task.cancel()
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def _finish(self, key: str, task: asyncio.Task):
+        """Libera la clave y consume la excepcion para que no quede sin recoger"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self._stats["errors"] += 1
+
+    def stats(self) -> Dict[str, int]:
+        """Devuelve los contadores de llamadas agrupadas"""
+        stats = dict(self._stats)
+        stats["in_flight"] = len(self._inflight)
+        return stats
@@ -0,0 +1,123 @@
+from tempfile import SpooledTemporaryFile
+from typing import Any, Dict, Tuple, Type, TypeVar
+
+from fastapi import Request
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, ValidationError
+from starlette.datastructures import Headers, UploadFile
+
+from app.constants import Constants
+
+
+JSON_CONTENT_TYPE = "application/json"
+MULTIPART_CONTENT_TYPE = "multipart/form-data"
+OCTET_STREAM_CONTENT_TYPE = "application/octet-stream"
+# Cuerpos binarios que no pasan por base64 ni por el parser JSON
+UPLOAD_CONTENT_TYPES = (MULTIPART_CONTENT_TYPE, OCTET_STREAM_CONTENT_TYPE)
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+def request_content_type(request: Request) -> str:
+    """Content-Type de la peticion sin parametros (``; boundary=...``)"""
+    return request.headers.get("content-type", "").split(";")[0].strip().lower()
+
+
+async def read_upload(
+    request: Request,
+    file_field: str = "file",
+    spool_max_memory: int = Constants.UPLOAD_SPOOL_MAX_MEMORY,
+) -> Tuple[UploadFile, Dict[str, str]]:
+    """
+    Lee un fichero enviado como ``multipart/form-data`` o ``application/octet-stream``
+
+    El contenido se guarda en un ``SpooledTemporaryFile``: en memoria hasta
+    ``spool_max_memory`` bytes y en un fichero temporal a partir de ahi, de
+    modo que un PDF grande no se acumula en memoria mientras se recibe.
+
+    Args:
+        request: Peticion con el cuerpo sin leer
+        file_field: Campo del formulario con el fichero (solo multipart)
+        spool_max_memory: Bytes que se mantienen en memoria antes de volcar a disco
+
+    Returns:
+        Tupla (fichero, parametros). Con multipart los parametros son los
+        campos de texto del formulario; con octet-stream, los query params.
+        El llamante debe cerrar el fichero.
+
+    Raises:
+        ValueError: Si el formulario no trae el fichero o el cuerpo esta vacio
+    """
+    if request_content_type(request) == MULTIPART_CONTENT_TYPE:
+        form = await request.form()
+        upload = form.get(file_field)
+        fields = {key: value for key, value in form.items() if isinstance(value, str)}
+        if not isinstance(upload, UploadFile):
+            await form.close()
+            raise ValueError(f"Multipart body must include the '{file_field}' file field")
+        return upload, fields
+
+    fields = dict(request.query_params)
+    upload = UploadFile(
+        file=SpooledTemporaryFile(max_size=spool_max_memory),
+        size=0,
+        filename=fields.get("filename"),
+        headers=Headers({"content-type": fields.get("mime_type", OCTET_STREAM_CONTENT_TYPE)}),
+    )
+    async for chunk in request.stream():
+        # UploadFile.write pasa a un hilo cuando el spool ya esta en disco
+        await upload.write(chunk)
+    if not upload.size:
+        await upload.close()
+        raise ValueError("Request body is empty")
+    await upload.seek(0)
+    return upload, fields
+
+
+async def parse_json_body(request: Request, model: Type[ModelT]) -> ModelT:
+    """
+    Valida el cuerpo JSON con ``model`` como lo haria FastAPI con un parametro de body
+
+    Raises:
+        RequestValidationError: Cuerpo invalido (FastAPI responde 422)
+    """
+    try:
+        return model.model_validate_json(await request.body())
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
+
+
+def upload_openapi(json_model: Type[BaseModel], form_fields: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    ``openapi_extra`` para documentar un endpoint que acepta JSON, multipart y binario
+
+    Args:
+        json_model: Modelo del cuerpo JSON
+        form_fields: Campos de texto del formulario multipart (nombre -> esquema)
+
+    Returns:
+        Diccionario con el ``requestBody`` para ``openapi_extra``
+    """
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                JSON_CONTENT_TYPE: {"schema": json_model.model_json_schema()},
+                MULTIPART_CONTENT_TYPE: {
+                    "schema": {
+                        "type": "object",
+                        "required": ["file"],
+                        "properties": {
+                            "file": {"type": "string", "format": "binary"},
+                            **form_fields,
+                        },
+                    }
+                },
+                OCTET_STREAM_CONTENT_TYPE: {
+                    "schema": {"type": "string", "format": "binary"}
+                },
+            },
+        }
+    }
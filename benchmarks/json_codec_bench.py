@@ -0,0 +1,82 @@
+"""Micro-benchmark de json_codec frente a la libreria estandar
+
+Mide los tres caminos calientes con un volante realista:
+
+    - respuesta de /process-image (``ImageResponse`` -> bytes)
+    - parseo de la respuesta de Gemini (texto -> dict)
+    - registro de Firehose (dict con input, output y metadatos -> str)
+
+Uso (desde la raiz del proyecto)::
+
+    python -m benchmarks.json_codec_bench [--number 20000]
+"""
+import argparse
+import copy
+import json
+import timeit
+from datetime import datetime
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from app.routers.agent import ImageResponse
+from app.services import json_codec
+from app.services.json_codec import FastJSONResponse
+from app.services.model_backends import FAKE_VOLANTE_RESPONSE
+
+
+def firehose_record() -> dict:
+    """Registro tipico de save_model_info_to_firehose"""
+    return {
+        "callId": "3f1c2a9e-5b7d-4c1e-9a8f-0d2b6e4f7a10",
+        "request": {"mime_type": "application/pdf", "prompt": "default", "use_cache": True},
+        "response": copy.deepcopy(FAKE_VOLANTE_RESPONSE),
+        "latency_ms": 1843.2,
+        "model": "gemini-2.5-flash",
+        "datetime": datetime.now().strftime("%Y/%m/%d %H:%M:%S.%f"),
+    }
+
+
+def _normalize(value):
+    return json.loads(value) if isinstance(value, (str, bytes)) else value
+
+
+def run(number: int):
+    response = ImageResponse(extracted_data=copy.deepcopy(FAKE_VOLANTE_RESPONSE))
+    encoded_response = jsonable_encoder(response)
+    gemini_text = json.dumps(FAKE_VOLANTE_RESPONSE, ensure_ascii=False, indent=2)
+    record = firehose_record()
+
+    cases = [
+        (
+            "response render",
+            lambda: JSONResponse(encoded_response).body,
+            lambda: FastJSONResponse(encoded_response).body,
+        ),
+        (
+            "gemini parse",
+            lambda: json.loads(gemini_text),
+            lambda: json_codec.loads(gemini_text),
+        ),
+        (
+            "firehose record",
+            lambda: json.dumps(record),
+            lambda: json_codec.dumps(record),
+        ),
+    ]
+
+    backend = "orjson" if json_codec.HAS_ORJSON else "stdlib (orjson no instalado)"
+    print(f"json_codec backend: {backend}, {number} iteraciones por caso\n")
+    print(f"{'caso':<18}{'stdlib us':>12}{'codec us':>12}{'speedup':>10}")
+    for name, baseline, candidate in cases:
+        # Misma salida (salvo espacios y escapes) antes de medir
+        assert _normalize(candidate()) == _normalize(baseline()), name
+        stdlib_time = min(timeit.repeat(baseline, number=number, repeat=5)) / number * 1e6
+        codec_time = min(timeit.repeat(candidate, number=number, repeat=5)) / number * 1e6
+        print(f"{name:<18}{stdlib_time:>12.2f}{codec_time:>12.2f}{stdlib_time / codec_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="Iteraciones por medida")
+    run(parser.parse_args().number)
@@ -0,0 +1,218 @@
+"""Micro-benchmark de la proyeccion del registro de Firehose
+
+Compara ``KINESIS_RECORD_PROJECTOR`` (esquema compilado) con la
+implementacion anterior de ``KinesisProccess.process_kinesis_json`` (literal
+de ``base_schema`` por llamada, ``update`` y ``pop``/``get`` anidados), para
+un registro y para una lista de registros. Se comprueba antes que las dos
+dan el mismo resultado.
+
+Uso (desde la raiz del proyecto)::
+
+    python -m benchmarks.kinesis_projection_bench [--number 20000] [--batch 500]
+"""
+import argparse
+import copy
+import timeit
+from types import SimpleNamespace
+
+from app.services.record_projection import KINESIS_RECORD_PROJECTOR
+
+
+CLAIM_INFORMATION = {
+    "policyId": "0981234567",
+    "claimTypeCode": "AGUA",
+    "effectiveDate": "2024-03-11",
+    "claimOcurrenceAddress": {
+        "addressName": "Calle Mayor 12, 3B",
+        "zipCode": "28013",
+        "townDesc": "MADRID",
+        "provinceCode": "28",
+    },
+    "claimCaller": {
+        "relationshipCode": "TOMADOR",
+        "contactName": "Maria Garcia",
+        "contactMethod": "600123123",
+    },
+    "correspondence": {
+        "name": "Maria Garcia",
+        "contactMethod": "EMAIL",
+        "address": {
+            "addressName": "Calle Mayor 12, 3B",
+            "zipCode": "28013",
+            "townDesc": "MADRID",
+            "provinceCode": "28",
+            "countryCode": "ES",
+        },
+    },
+    "report": "Fuga de agua en el bano que afecta al piso inferior",
+    "claimDamagesSpecific": {
+        "damage": {"damageCode": "D01", "damageDesc": "Danos por agua"},
+        "brandCode": "",
+        "modelName": "",
+        "years": "",
+        "warranty": "",
+    },
+}
+
+
+def call_output() -> dict:
+    return {
+        "callId": "3f1c2a9e-5b7d-4c1e-9a8f-0d2b6e4f7a10",
+        "second_time": 1,
+        "interruptions_barge_in": 2,
+        "datetime": "2024/03/11 10:15:42.123456",
+    }
+
+
+def information_api() -> SimpleNamespace:
+    return SimpleNamespace(
+        patrimoniales_service=SimpleNamespace(
+            claim_opened=1,
+            claim_information=copy.deepcopy(CLAIM_INFORMATION),
+        ),
+        flag_redirect_agent={"flag": 1, "reason": "cliente_vip"},
+    )
+
+
+def legacy_project(output_json):
+    """Proyeccion de process_kinesis_json anterior (modifica claim_information en sitio)"""
+    base_schema = {
+        "callId": "",
+        "open_claim": 0,
+        "is_redirect": 0,
+        "reason_redirect": "",
+        "second_time": 0,
+        "interruptions_barge_in": 0,
+        "control_group": 0,
+        "claim_information": {
+            "policyId": "",
+            "claimTypeCode": "",
+            "effectiveDate": "",
+            "claimOcurrenceAddress": {
+                "zipCode": "",
+                "townDesc": "",
+                "provinceCode": "",
+            },
+            "claimCaller": {"relationshipCode": ""},
+            "correspondence": {
+                "address": {"zipCode": "", "townDesc": "", "provinceCode": ""},
+            },
+            "report": "",
+            "claimDamagesSpecific": {
+                "damage": {"damageCode": "", "damageDesc": ""},
+                "brandCode": "",
+                "modelName": "",
+                "years": "",
+                "warranty": "",
+            },
+        },
+        "datetime": "",
+    }
+    base_schema.update(output_json)
+    output_json = base_schema
+    output_json["callId"] = output_json.get("callId", "")
+    if "claimOcurrenceAddress" in output_json["claim_information"]:
+        output_json["claim_information"]["claimOcurrenceAddress"].pop("addressName", None)
+    if "claimCaller" in output_json["claim_information"]:
+        output_json["claim_information"]["claimCaller"].pop("contactName", None)
+        output_json["claim_information"]["claimCaller"].pop("contactMethod", None)
+    if "correspondence" in output_json["claim_information"]:
+        correspondence = output_json["claim_information"]["correspondence"]
+        correspondence["address"] = {
+            "zipCode": correspondence.get("address", {}).get("zipCode", ""),
+            "townDesc": correspondence.get("address", {}).get("townDesc", ""),
+            "provinceCode": correspondence.get("address", {}).get("provinceCode", ""),
+        }
+        correspondence.pop("name", None)
+        correspondence.pop("contactMethod", None)
+        output_json["claim_information"]["correspondence"] = correspondence
+    return output_json
+
+
+def legacy_process_kinesis_json(output_json, information_api, control_group):
+    """process_kinesis_json anterior, sin logs"""
+    output_json["control_group"] = control_group
+    output_json = dict(output_json)
+    output_json["open_claim"] = information_api.patrimoniales_service.claim_opened
+    output_json["is_redirect"] = information_api.flag_redirect_agent.get("flag", 0)
+    output_json["reason_redirect"] = information_api.flag_redirect_agent.get("reason", None)
+    output_json["claim_information"] = information_api.patrimoniales_service.claim_information
+    return legacy_project(output_json)
+
+
+def projected_process_kinesis_json(output_json, information_api, control_group):
+    """process_kinesis_json actual, sin logs"""
+    output_json["control_group"] = control_group
+    record = dict(output_json)
+    record["open_claim"] = information_api.patrimoniales_service.claim_opened
+    record["is_redirect"] = information_api.flag_redirect_agent.get("flag", 0)
+    record["reason_redirect"] = information_api.flag_redirect_agent.get("reason", None)
+    record["claim_information"] = information_api.patrimoniales_service.claim_information
+    return KINESIS_RECORD_PROJECTOR(record)
+
+
+def assembled_records(count: int) -> list:
+    """Registros ya montados (con claim_information), como en la entrada de many()"""
+    return [
+        {**call_output(), "control_group": 1, "claim_information": copy.deepcopy(CLAIM_INFORMATION)}
+        for _ in range(count)
+    ]
+
+
+def best_time(function, make_args, chunks: int) -> float:
+    """
+    Mejor tiempo de ``function(args)`` entre ``chunks`` repeticiones
+
+    La version anterior modifica claim_information en sitio, asi que no se
+    pueden reutilizar las entradas: se preparan otras en cada repeticion,
+    fuera del tiempo medido
+    """
+    best = float("inf")
+    for _ in range(chunks):
+        args = make_args()
+        best = min(best, timeit.timeit(lambda: function(args), number=1))
+    return best
+
+
+def run(number: int, batch: int):
+    assert projected_process_kinesis_json(call_output(), information_api(), 1) == (
+        legacy_process_kinesis_json(call_output(), information_api(), 1)
+    )
+    assert KINESIS_RECORD_PROJECTOR.many(assembled_records(2)) == [
+        legacy_project(record) for record in assembled_records(2)
+    ]
+
+    # ``number`` registros por caso, medidos en bloques de ``batch``
+    chunks = max(1, number // batch)
+
+    def calls():
+        return [(call_output(), information_api(), 1) for _ in range(batch)]
+
+    def records():
+        return assembled_records(batch)
+
+    cases = [
+        (
+            "process_kinesis_json",
+            best_time(lambda args: [legacy_process_kinesis_json(*item) for item in args], calls, chunks),
+            best_time(lambda args: [projected_process_kinesis_json(*item) for item in args], calls, chunks),
+        ),
+        (
+            f"lista de {batch} (many)",
+            best_time(lambda args: [legacy_project(record) for record in args], records, chunks),
+            best_time(KINESIS_RECORD_PROJECTOR.many, records, chunks),
+        ),
+    ]
+
+    print(f"{number} registros por caso en bloques de {batch} (us por registro)\n")
+    print(f"{'caso':<30}{'anterior us':>13}{'compilado us':>14}{'speedup':>10}")
+    for name, legacy, projected in cases:
+        print(f"{name:<30}{legacy / batch * 1e6:>13.2f}{projected / batch * 1e6:>14.2f}{legacy / projected:>9.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="Registros por caso")
+    parser.add_argument("--batch", type=int, default=500, help="Registros por lista")
+    args = parser.parse_args()
+    run(args.number, args.batch)
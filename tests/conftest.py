@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+
+# Antes de importar app: el hilo de logs escribiria en el stderr que pytest ya ha cerrado al salir
+os.environ.setdefault("LOG_QUEUE_ENABLED", "false")
+
+
+class RecordingLogger:
+    """Logger con la interfaz de ParrotLogger que guarda los mensajes en memoria"""
+
+    def __init__(self):
+        self.records = []
+
+    def _record(self, level, message, *args, logger_name="N/A", req_id=None):
+        self.records.append((level, logger_name, message))
+
+    def info(self, message, *args, **kwargs):
+        self._record("INFO", message, *args, **kwargs)
+
+    def warning(self, message, *args, **kwargs):
+        self._record("WARNING", message, *args, **kwargs)
+
+    def error(self, message, *args, **kwargs):
+        self._record("ERROR", message, *args, **kwargs)
+
+    def debug(self, message, *args, **kwargs):
+        self._record("DEBUG", message, *args, **kwargs)
+
+    def messages(self, level):
+        return [message for record_level, _, message in self.records if record_level == level]
+
+
+@pytest.fixture
+def logger():
+    return RecordingLogger()
@@ -0,0 +1,107 @@
+import asyncio
+import base64
+import io
+
+from PIL import Image
+
+from app.constants import ImagePrompts
+from app.services.ai_service import GeminiService
+from app.services.cache_service import ExtractionCache
+from app.services.model_backends import FAKE_VOLANTE_RESPONSE, FakeBackend
+
+
+PROMPT = ImagePrompts.VOLANTE_MAPFRE_PROMPT
+
+
+class CountingBackend(FakeBackend):
+    """FakeBackend que cuenta las llamadas al modelo"""
+
+    def __init__(self):
+        super().__init__(latency_ms=0, latency_distribution="fixed", error_rate=0.0, rate_limit_rate=0.0)
+        self.calls = 0
+
+    async def generate(self, model, contents, config):
+        self.calls += 1
+        return await super().generate(model, contents, config)
+
+
+def image_base64(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, "JPEG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def process(service, file_base64, **kwargs):
+    return asyncio.run(service.process_image(file_base64, PROMPT, **kwargs))
+
+
+def test_repeated_document_is_served_from_memory(logger):
+    backend = CountingBackend()
+    cache = ExtractionCache(logger, disk_path=None)
+    service = GeminiService(logger, backend=backend, cache=cache)
+
+    first = process(service, image_base64("white"))
+    # El mismo fichero con prefijo data URL tiene la misma clave
+    second = process(service, "data:image/jpeg;base64," + image_base64("white"))
+
+    assert backend.calls == 1
+    assert first == second == FAKE_VOLANTE_RESPONSE
+    stats = cache.stats()
+    assert (stats["memory_hits"], stats["misses"], stats["sets"]) == (1, 1, 1)
+
+
+def test_other_file_or_prompt_misses(logger):
+    backend = CountingBackend()
+    cache = ExtractionCache(logger, disk_path=None)
+    service = GeminiService(logger, backend=backend, cache=cache)
+
+    process(service, image_base64("white"))
+    process(service, image_base64("black"))
+    asyncio.run(service.process_image(image_base64("white"), "Devuelve un JSON con el color"))
+
+    assert backend.calls == 3
+    assert cache.stats()["memory_hits"] == 0
+
+
+def test_use_cache_false_always_calls_the_model(logger):
+    backend = CountingBackend()
+    cache = ExtractionCache(logger, disk_path=None)
+    service = GeminiService(logger, backend=backend, cache=cache)
+
+    process(service, image_base64("white"))
+    process(service, image_base64("white"), use_cache=False)
+
+    assert backend.calls == 2
+    assert cache.stats()["bypassed"] == 1
+
+
+def test_disk_tier_is_shared_between_instances(logger, tmp_path):
+    disk_path = str(tmp_path / "cache.sqlite")
+    first_backend = CountingBackend()
+    process(
+        GeminiService(logger, backend=first_backend, cache=ExtractionCache(logger, disk_path=disk_path)),
+        image_base64("white"),
+    )
+
+    # Otro worker (o un reinicio): memoria vacia, pero el resultado esta en disco
+    second_backend = CountingBackend()
+    cache = ExtractionCache(logger, disk_path=disk_path)
+    result = process(GeminiService(logger, backend=second_backend, cache=cache), image_base64("white"))
+
+    assert (first_backend.calls, second_backend.calls) == (1, 0)
+    assert result == FAKE_VOLANTE_RESPONSE
+    assert cache.stats()["disk_hits"] == 1
+    cache.close()
+
+
+def test_memory_tier_evicts_the_least_recently_used(logger):
+    cache = ExtractionCache(logger, max_entries=2, disk_path=None)
+    cache.set("a", {"value": 1})
+    cache.set("b", {"value": 2})
+    cache.get("a")
+    cache.set("c", {"value": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"value": 1}
+    assert cache.get("c") == {"value": 3}
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,107 @@
+import io
+
+import pytest
+from PIL import Image
+from pypdf import PdfReader, PdfWriter
+
+from app.services.file_probe import PROBE_HEAD_BYTES, PROBE_TAIL_BYTES, probe_file
+
+
+def image_bytes(image_format, size, **save_options):
+    buffer = io.BytesIO()
+    mode = "RGB" if image_format != "PNG" else "RGBA"
+    Image.new(mode, size, "white").save(buffer, image_format, **save_options)
+    return buffer.getvalue()
+
+
+def pdf_bytes(pages):
+    writer = PdfWriter()
+    for index in range(pages):
+        writer.add_blank_page(width=595 + index, height=842)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def probe_like_upload(data):
+    """Como el router: solo la cabecera y la cola, sin el archivo entero"""
+    return probe_file(data[:PROBE_HEAD_BYTES], data[-PROBE_TAIL_BYTES:], len(data))
+
+
+@pytest.mark.parametrize(
+    "image_format,save_options",
+    [
+        ("JPEG", {}),
+        ("JPEG", {"progressive": True}),
+        ("JPEG", {"exif": b"Exif\x00\x00" + b"\x00" * 40000}),
+        ("PNG", {}),
+        ("WEBP", {"lossless": True}),
+        ("WEBP", {"quality": 80}),
+        ("TIFF", {}),
+    ],
+)
+@pytest.mark.parametrize("size", [(1, 1), (640, 480), (1241, 1754)])
+def test_image_dimensions_match_pillow(image_format, save_options, size):
+    data = image_bytes(image_format, size, **save_options)
+
+    metadata = probe_like_upload(data)
+
+    with Image.open(io.BytesIO(data)) as image:
+        assert (metadata.width, metadata.height) == image.size
+        assert metadata.mime_type == Image.MIME[image.format]
+
+
+@pytest.mark.parametrize("pages", [1, 2, 7, 60])
+def test_pdf_page_count_matches_pypdf(pages):
+    data = pdf_bytes(pages)
+
+    metadata = probe_like_upload(data)
+
+    assert metadata.file_type == "PDF"
+    assert metadata.page_count == len(PdfReader(io.BytesIO(data)).pages)
+    assert metadata.pdf_version == PdfReader(io.BytesIO(data)).pdf_header[5:]
+
+
+def pdf_with_page_tree_at_the_end(pages, padding):
+    """PDF escrito a mano: un stream grande primero y el arbol de paginas al final"""
+    objects = [b"<< /Length %d >>\nstream\n" % padding + b"x" * padding + b"\nendstream"]
+    page_numbers = list(range(len(objects) + 1, len(objects) + 1 + pages))
+    pages_number = page_numbers[-1] + 1
+    catalog_number = pages_number + 1
+    for _ in range(pages):
+        objects.append(b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] >>" % pages_number)
+    kids = b" ".join(b"%d 0 R" % number for number in page_numbers)
+    objects.append(b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages))
+    objects.append(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_number)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_number, xref
+    )
+    return bytes(out)
+
+
+def test_pdf_larger_than_head_and_tail_uses_the_trailer():
+    data = pdf_with_page_tree_at_the_end(pages=4, padding=2 * PROBE_HEAD_BYTES)
+    reader = PdfReader(io.BytesIO(data))
+
+    metadata = probe_like_upload(data)
+
+    assert not metadata.complete
+    assert b"/Type /Pages" not in data[:PROBE_HEAD_BYTES]
+    assert metadata.page_count == len(reader.pages) == 4
+
+
+@pytest.mark.parametrize("data", [b"", b"\xff\xd8\xff", b"%PDF-1.7\n", b"\x89PNG\r\n", b"not a file"])
+def test_truncated_or_unknown_input_never_raises(data):
+    metadata = probe_file(data, b"", len(data))
+    assert metadata.width is None
+    assert metadata.page_count is None
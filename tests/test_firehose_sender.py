@@ -0,0 +1,186 @@
+import asyncio
+import threading
+
+from app.services.firehose_sender import FirehoseBatchSender, LocalFirehoseStub
+from app.services.firehose_spool import FirehoseSpool
+
+
+STREAM = "volantes-test"
+
+
+def make_sender(logger, stub, spool=None, **kwargs):
+    options = {"flush_interval": 0.01, "base_delay": 0.0, "max_delay": 0.0}
+    options.update(kwargs)
+    return FirehoseBatchSender(logger, stub, spool=spool, **options)
+
+
+def spooled_records(spool):
+    records, _ = spool.read(100000, max_bytes=1 << 30)
+    return [data for _, data in records]
+
+
+def submit_all(sender, count):
+    for index in range(count):
+        assert sender.submit(STREAM, f"record-{index}")
+
+
+def test_partial_failures_retry_only_rejected_entries(logger):
+    stub = LocalFirehoseStub(entry_failure_rate=0.3, seed=7)
+    sender = make_sender(logger, stub, max_batch_records=100, max_attempts=20)
+
+    async def run():
+        sender.start()
+        submit_all(sender, 1000)
+        await sender.stop()
+
+    asyncio.run(run())
+
+    delivered = stub.records[STREAM]
+    # Cada registro llega exactamente una vez, aunque su lote fallara en parte
+    assert sorted(delivered) == sorted(f"record-{index}".encode() for index in range(1000))
+    stats = sender.stats()
+    assert stats["sent"] == 1000
+    assert stats["retried_entries"] > 0
+    assert stats["failed"] == 0
+
+
+def test_records_that_exhaust_retries_go_to_the_spool(logger, tmp_path):
+    stub = LocalFirehoseStub(call_failure_rate=1.0, seed=7)
+    spool = FirehoseSpool(logger, str(tmp_path), fsync=False)
+    sender = make_sender(logger, stub, spool=spool, max_attempts=2)
+
+    async def run():
+        sender.start()
+        submit_all(sender, 50)
+        await sender.stop()
+
+    asyncio.run(run())
+
+    assert STREAM not in stub.records
+    assert spooled_records(spool) == [f"record-{index}".encode() for index in range(50)]
+    assert sender.stats()["spooled"] == 50
+    spool.close()
+
+
+def test_stop_timeout_spools_only_what_firehose_did_not_accept(logger, tmp_path):
+    # La llamada en curso tarda mas que el timeout de stop() y rechaza parte del lote
+    stub = LocalFirehoseStub(entry_failure_rate=0.3, latency_ms=300, seed=3)
+    spool = FirehoseSpool(logger, str(tmp_path), fsync=False)
+    sender = make_sender(logger, stub, spool=spool, max_batch_records=100)
+
+    async def run():
+        sender.start()
+        submit_all(sender, 1000)
+        await asyncio.sleep(0.05)
+        await sender.stop(timeout=0.1)
+
+    asyncio.run(run())
+
+    delivered = stub.records.get(STREAM, [])
+    spooled = spooled_records(spool)
+    assert delivered
+    assert not set(delivered) & set(spooled)
+    assert len(delivered) + len(spooled) == 1000
+    spool.close()
+
+
+def test_submit_from_several_threads(logger):
+    stub = LocalFirehoseStub(seed=7)
+    sender = make_sender(logger, stub, max_queue_records=100000)
+
+    async def run():
+        sender.start()
+        threads = [
+            threading.Thread(target=lambda: [sender.submit(STREAM, b"x" * 16) for _ in range(5000)])
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        await asyncio.to_thread(lambda: [thread.join() for thread in threads])
+        await sender.stop()
+
+    asyncio.run(run())
+
+    stats = sender.stats()
+    assert stats["submitted"] == 40000
+    assert stats["sent"] == 40000
+    assert len(stub.records[STREAM]) == 40000
+    assert sender._pending_bytes == 0
+
+
+class FlakyClient(LocalFirehoseStub):
+    """Stub cuyas primeras llamadas fallan con ``errors`` o devuelven respuestas truncadas"""
+
+    def __init__(self, errors=(), truncate=0):
+        super().__init__(seed=7)
+        self.errors = list(errors)
+        self.truncate = truncate
+
+    def put_record_batch(self, DeliveryStreamName, Records):
+        if self.errors:
+            raise self.errors.pop(0)
+        response = super().put_record_batch(DeliveryStreamName, Records)
+        if self.truncate:
+            self.truncate -= 1
+            # Respuesta sin las dos ultimas entradas: esos registros no se dan por entregados
+            response["RequestResponses"] = response["RequestResponses"][:-2]
+        return response
+
+
+def test_unexpected_errors_are_retried_and_do_not_stop_the_sender(logger):
+    client = FlakyClient(errors=[TypeError("cannot serialize"), KeyError("RequestResponses")])
+    sender = make_sender(logger, client, max_attempts=5)
+
+    async def run():
+        sender.start()
+        submit_all(sender, 10)
+        await asyncio.sleep(0.1)
+        # La tarea sigue viva y envia lo que llega despues
+        assert not sender._task.done()
+        sender.submit(STREAM, "late")
+        await sender.stop()
+
+    asyncio.run(run())
+
+    assert sorted(client.records[STREAM]) == sorted(
+        [f"record-{index}".encode() for index in range(10)] + [b"late"]
+    )
+
+
+def test_spool_failure_is_logged_and_the_sender_keeps_running(logger):
+    class BrokenSpool:
+        def append(self, stream_name, records):
+            raise OSError("disk full")
+
+    client = LocalFirehoseStub(call_failure_rate=1.0, seed=7)
+    sender = make_sender(logger, client, spool=BrokenSpool(), max_attempts=1)
+
+    async def run():
+        sender.start()
+        submit_all(sender, 5)
+        await asyncio.sleep(0.1)
+        assert not sender._task.done()
+        await sender.stop(timeout=0.5)
+
+    asyncio.run(run())
+
+    assert sender.stats()["failed"] == 5
+    assert any("disk full" in message for message in logger.messages("ERROR"))
+
+
+def test_missing_request_responses_count_as_failed(logger):
+    client = FlakyClient(truncate=1)
+    sender = make_sender(logger, client, max_batch_records=10)
+
+    async def run():
+        sender.start()
+        submit_all(sender, 10)
+        await sender.stop()
+
+    asyncio.run(run())
+
+    delivered = client.records[STREAM]
+    # Las dos sin respuesta se reenvian: llegan (como minimo) una vez y se cuentan como reintento
+    assert set(delivered) == {f"record-{index}".encode() for index in range(10)}
+    assert len(delivered) == 12
+    assert sender.stats()["retried_entries"] == 2
@@ -0,0 +1,153 @@
+import asyncio
+import os
+
+from app.services.firehose_sender import LocalFirehoseStub
+from app.services.firehose_spool import FirehoseSpool, FirehoseSpoolReplayer
+
+
+STREAM = "volantes-test"
+
+
+def make_replayer(logger, spool, client, batch_records=10):
+    replayer = FirehoseSpoolReplayer(
+        logger, spool, client, max_records_per_second=1000, idle_interval=0.01
+    )
+    replayer.batch_records = batch_records
+    return replayer
+
+
+def expected(count, prefix="record"):
+    return [f"{prefix}-{index}".encode() for index in range(count)]
+
+
+async def wait_for(condition, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition():
+        assert loop.time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+def test_restart_resumes_from_the_cursor(logger, tmp_path):
+    spool = FirehoseSpool(logger, str(tmp_path), fsync=False)
+    spool.append(STREAM, expected(10))
+    records, position = spool.read(4)
+    spool.commit(position, len(records))
+    spool.close()
+
+    spool = FirehoseSpool(logger, str(tmp_path), fsync=False)
+    records, _ = spool.read(100)
+    assert [data for _, data in records] == expected(10)[4:]
+    spool.close()
+
+
+def test_replayer_restart_delivers_each_record_once(logger, tmp_path):
+    stub = LocalFirehoseStub(entry_failure_rate=0.2, seed=5)
+    spool = FirehoseSpool(logger, str(tmp_path), segment_bytes=512, fsync=False)
+    spool.append(STREAM, expected(200))
+
+    async def run(spool, until):
+        replayer = make_replayer(logger, spool, stub)
+        replayer.start()
+        await wait_for(lambda: len(stub.records.get(STREAM, [])) >= until)
+        await replayer.stop()
+
+    asyncio.run(run(spool, 50))
+    spool.close()
+    # Al reiniciar se sigue desde el cursor guardado: nada se reenvia dos veces
+    spool = FirehoseSpool(logger, str(tmp_path), segment_bytes=512, fsync=False)
+    asyncio.run(run(spool, 200))
+
+    assert sorted(stub.records[STREAM]) == sorted(expected(200))
+    assert spool.read(100) == ([], spool._cursor)
+    spool.close()
+
+
+def test_corrupted_tail_is_skipped_once(logger, tmp_path):
+    stub = LocalFirehoseStub(seed=5)
+    spool = FirehoseSpool(logger, str(tmp_path), fsync=False)
+    spool.append(STREAM, [b"corrupted"])
+    spool._writer.flush()
+    # Se cambia el ultimo byte del dato: el crc ya no coincide
+    path = spool._segment_path(spool._segments[-1])
+    with open(path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"X")
+
+    async def run():
+        replayer = make_replayer(logger, spool, stub)
+        replayer.start()
+        await asyncio.sleep(0.1)
+        spool.append(STREAM, expected(3))
+        await wait_for(lambda: len(stub.records.get(STREAM, [])) == 3)
+        await replayer.stop()
+
+    asyncio.run(run())
+
+    assert stub.records[STREAM] == expected(3)
+    # El cursor ha pasado los bytes corruptos: no se vuelven a leer en cada ciclo
+    assert spool.stats()["corrupted"] == 1
+    assert len([m for m in logger.messages("ERROR") if "Corrupted record" in m]) == 1
+    spool.close()
+
+
+def test_incomplete_write_is_truncated_on_restart(logger, tmp_path):
+    spool = FirehoseSpool(logger, str(tmp_path), fsync=False)
+    spool.append(STREAM, expected(3))
+    spool.close()
+    path = spool._segment_path(spool._segments[-1])
+    with open(path, "ab") as f:
+        f.write(b"\x00\x00\x01")
+
+    spool = FirehoseSpool(logger, str(tmp_path), fsync=False)
+    spool.append(STREAM, [b"after"])
+    records, _ = spool.read(100)
+    assert [data for _, data in records] == expected(3) + [b"after"]
+    spool.close()
+
+
+def test_replayer_survives_unexpected_errors(logger, tmp_path):
+    class FlakyClient(LocalFirehoseStub):
+        def __init__(self):
+            super().__init__(seed=5)
+            self.errors = [TypeError("cannot serialize")]
+            self.truncate = 1
+
+        def put_record_batch(self, DeliveryStreamName, Records):
+            if self.errors:
+                raise self.errors.pop(0)
+            response = super().put_record_batch(DeliveryStreamName, Records)
+            if self.truncate:
+                self.truncate -= 1
+                # Respuesta truncada: el registro sin entrada vuelve al spool
+                response["RequestResponses"] = response["RequestResponses"][:-1]
+            return response
+
+    class FlakySpool(FirehoseSpool):
+        fail_reads = 1
+
+        def read(self, *args, **kwargs):
+            if self.fail_reads:
+                self.fail_reads -= 1
+                raise OSError("disk error")
+            return super().read(*args, **kwargs)
+
+    client = FlakyClient()
+    spool = FlakySpool(logger, str(tmp_path), fsync=False)
+    spool.append(STREAM, expected(5))
+    replayer = make_replayer(logger, spool, client)
+    replayer.max_backoff = 0.05
+
+    async def run():
+        replayer.start()
+        await wait_for(lambda: len(client.records.get(STREAM, [])) >= 5)
+        assert not replayer._task.done()
+        await replayer.stop()
+
+    asyncio.run(run())
+
+    assert set(client.records[STREAM]) == set(expected(5))
+    stats = replayer.stats()
+    assert stats["failed_batches"] == 2
+    assert stats["requeued"] == 1
+    assert any("disk error" in message for message in logger.messages("ERROR"))
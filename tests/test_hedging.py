@@ -0,0 +1,116 @@
+import asyncio
+import base64
+import io
+
+from PIL import Image
+
+from app.constants import ImagePrompts
+from app.services.ai_service import GeminiService
+from app.services.hedging import HedgePolicy
+from app.services.model_backends import FAKE_VOLANTE_RESPONSE, FakeBackend
+
+
+MODEL = "gemini-test"
+PROMPT = ImagePrompts.VOLANTE_MAPFRE_PROMPT
+
+
+class ScriptedBackend(FakeBackend):
+    """FakeBackend con latencias fijadas por llamada que cuenta las llamadas en curso"""
+
+    def __init__(self, latencies_ms, default_ms):
+        super().__init__(latency_ms=default_ms, latency_distribution="fixed", error_rate=0.0, rate_limit_rate=0.0)
+        self.latencies_ms = list(latencies_ms)
+        self.calls = 0
+        self.in_flight = 0
+
+    def sample_latency(self):
+        if self.latencies_ms:
+            return self.latencies_ms.pop(0) / 1000
+        return super().sample_latency()
+
+    async def generate(self, model, contents, config):
+        self.calls += 1
+        self.in_flight += 1
+        try:
+            return await super().generate(model, contents, config)
+        finally:
+            self.in_flight -= 1
+
+
+def image_base64(index):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), (index, index, index)).save(buffer, "JPEG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def warmed_policy(logger, latency=0.01, samples=1000, **kwargs):
+    """Politica con ``samples`` latencias ya observadas de ``latency`` segundos"""
+    options = {"percentile": 95, "min_delay_ms": 1, "min_samples": 20, "window": samples}
+    options.update(kwargs)
+    policy = HedgePolicy(logger, **options)
+    for _ in range(samples):
+        policy.record_latency(MODEL, latency)
+    return policy
+
+
+def make_service(logger, backend, policy):
+    service = GeminiService(logger, backend=backend, hedging=policy)
+    service.model_name = MODEL
+    return service
+
+
+def test_slow_call_is_hedged_and_the_loser_cancelled(logger):
+    backend = ScriptedBackend([2000, 20], default_ms=20)
+    policy = warmed_policy(logger)
+    service = make_service(logger, backend, policy)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        result = await service.process_image(image_base64(0), PROMPT)
+        return result, loop.time() - started
+
+    result, elapsed = asyncio.run(run())
+
+    assert result == FAKE_VOLANTE_RESPONSE
+    assert elapsed < 1.0
+    assert backend.calls == 2
+    # La llamada lenta no sigue consumiendo cuota
+    assert backend.in_flight == 0
+    stats = policy.stats()
+    assert (stats["hedged"], stats["hedge_wins"]) == (1, 1)
+
+
+def test_budget_bounds_the_extra_calls(logger):
+    # Todas las llamadas superan el percentil: sin presupuesto se cubririan todas
+    backend = ScriptedBackend([], default_ms=30)
+    policy = warmed_policy(logger, budget_ratio=0.1, budget_burst=1.0)
+    service = make_service(logger, backend, policy)
+    calls = 30
+
+    async def run():
+        for index in range(calls):
+            await service.process_image(image_base64(index), PROMPT)
+
+    asyncio.run(run())
+
+    stats = policy.stats()
+    assert 2 <= stats["hedged"] <= 1.0 + 0.1 * calls
+    assert stats["budget_exhausted"] == calls - stats["hedged"]
+    assert backend.calls == calls + stats["hedged"]
+
+
+def test_no_hedging_until_enough_latencies_are_known(logger):
+    backend = ScriptedBackend([], default_ms=30)
+    policy = warmed_policy(logger, samples=5, window=100)
+    service = make_service(logger, backend, policy)
+
+    async def run():
+        for index in range(10):
+            await service.process_image(image_base64(index), PROMPT)
+
+    asyncio.run(run())
+
+    # 5 latencias iniciales + 10 llamadas: no se llega a min_samples (20)
+    assert policy.stats()["hedged"] == 0
+    assert backend.calls == 10
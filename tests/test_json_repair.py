@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from app.services.json_repair import repair_json, strip_fences
+
+
+VALID_DOCUMENTS = [
+    {"numero_documento": "12345678", "prescripcion": "RM rodilla", "firma_sello_prescriptor": True},
+    {"a": [1, 2, {"b": None}], "c": "llave } y corchete ] en una cadena", "d": "comillas \"escapadas\""},
+    [{"campo": 1}, {"campo": 2}],
+    {"vacio": {}, "lista": [], "numero": -1.5e3, "unicode": "Jose Garcia Nunez"},
+]
+
+
+@pytest.mark.parametrize("document", VALID_DOCUMENTS)
+def test_valid_json_parses_like_json_loads(document):
+    text = json.dumps(document, ensure_ascii=False)
+    assert repair_json(text) == json.loads(text)
+    assert repair_json(json.dumps(document, indent=2)) == document
+
+
+@pytest.mark.parametrize("document", VALID_DOCUMENTS)
+def test_fences_and_surrounding_text_are_ignored(document):
+    text = json.dumps(document, ensure_ascii=False)
+    assert repair_json(f"```json\n{text}\n```") == document
+    assert repair_json(f"Aqui tienes el JSON:\n{text}\nEspero que sirva.") == document
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ('{"a": 1, "b": 2,}', {"a": 1, "b": 2}),
+        ('{"a": [1, 2,], }', {"a": [1, 2]}),
+        # Truncadas: se cierra lo abierto o se descarta el ultimo miembro a medias
+        ('{"a": 1, "b": {"c": 2', {"a": 1, "b": {"c": 2}}),
+        ('{"a": 1, "b": "sin cerr', {"a": 1}),
+        ('{"a": 1, "b": ', {"a": 1}),
+        ('{"a": [1, 2, 3', {"a": [1, 2, 3]}),
+        ('```json\n{"a": 1, "b": tr', {"a": 1}),
+    ],
+)
+def test_near_miss_responses_are_repaired(text, expected):
+    assert repair_json(text) == expected
+
+
+@pytest.mark.parametrize("text", ["", "sin json", '{"a": "sin cerrar'])
+def test_unrepairable_text_raises_value_error(text):
+    with pytest.raises(ValueError):
+        repair_json(text)
+
+
+def test_strip_fences():
+    assert strip_fences('```json\n{"a": 1}\n```') == '{"a": 1}'
+    assert strip_fences('```\n{"a": 1}') == '{"a": 1}'
+    assert strip_fences(' {"a": 1} ') == '{"a": 1}'
@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import pytest
+from google.genai import errors as genai_errors
+
+from app.services.model_backends import FAKE_VOLANTE_RESPONSE, FakeBackend
+
+
+def outcomes(backend, calls):
+    """Latencia simulada y desenlace (ok, 429 o 503) de ``calls`` llamadas"""
+    sequence = []
+    for _ in range(calls):
+        latency = backend.sample_latency()
+        try:
+            backend._maybe_fail()
+            sequence.append((latency, "ok"))
+        except genai_errors.APIError as e:
+            sequence.append((latency, e.code))
+    return sequence
+
+
+def make_backend(**kwargs):
+    options = {
+        "latency_ms": 100,
+        "latency_distribution": "lognormal",
+        "latency_sigma": 0.5,
+        "error_rate": 0.1,
+        "rate_limit_rate": 0.1,
+        "seed": 42,
+        "response_path": None,
+    }
+    options.update(kwargs)
+    return FakeBackend(**options)
+
+
+def test_same_seed_gives_the_same_latencies_and_errors():
+    first = outcomes(make_backend(), 200)
+
+    assert first == outcomes(make_backend(), 200)
+    assert first != outcomes(make_backend(seed=43), 200)
+    results = [result for _, result in first]
+    # Con 10% de 429 y 10% de 503 salen los tres desenlaces
+    assert {"ok", 429, 503} <= set(results)
+    assert 0.6 < results.count("ok") / len(results) < 0.95
+
+
+def test_generate_fails_like_gemini():
+    with pytest.raises(genai_errors.ClientError) as rate_limited:
+        asyncio.run(make_backend(latency_ms=0, rate_limit_rate=1.0).generate("model", [], None))
+    with pytest.raises(genai_errors.ServerError) as overloaded:
+        asyncio.run(make_backend(latency_ms=0, error_rate=1.0, rate_limit_rate=0.0).generate("model", [], None))
+
+    assert rate_limited.value.code == 429
+    assert overloaded.value.code == 503
+
+
+def test_stream_chunks_add_up_to_the_configured_response(tmp_path):
+    response = {"numero_documento": "87654321", "prescripcion": "Resonancia"}
+    response_path = tmp_path / "response.json"
+    response_path.write_text(json.dumps(response), encoding="utf-8")
+    backend = make_backend(latency_ms=0, error_rate=0.0, rate_limit_rate=0.0, response_path=str(response_path))
+
+    async def run():
+        chunks = [chunk async for chunk in backend.generate_stream("model", [], None)]
+        return chunks, await backend.generate("model", [], None)
+
+    chunks, full = asyncio.run(run())
+
+    assert len(chunks) > 1
+    assert json.loads("".join(chunks)) == json.loads(full.text) == response
+    # Sin response_path devuelve el volante de ejemplo
+    assert make_backend().response == FAKE_VOLANTE_RESPONSE
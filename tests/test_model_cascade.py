@@ -0,0 +1,133 @@
+import asyncio
+import base64
+import io
+import json
+
+from google.genai import errors as genai_errors
+from PIL import Image
+
+from app.constants import ImagePrompts
+from app.services.ai_service import GeminiService
+from app.services.model_backends import FAKE_VOLANTE_RESPONSE, FakeBackend, ModelResponse
+from app.services.model_cascade import ModelCascade
+
+
+CHEAP = "gemini-lite"
+STRONG = "gemini-pro"
+PROMPT = ImagePrompts.VOLANTE_MAPFRE_PROMPT
+
+
+class TieredBackend(FakeBackend):
+    """FakeBackend con una respuesta (o excepcion) distinta por modelo"""
+
+    def __init__(self, responses):
+        super().__init__(latency_ms=0, latency_distribution="fixed", error_rate=0.0, rate_limit_rate=0.0)
+        self.responses = responses
+        self.calls = []
+
+    async def generate(self, model, contents, config):
+        self.calls.append(model)
+        response = self.responses[model]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def answer(result, avg_logprobs=None):
+    text = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+    return ModelResponse(text=text, avg_logprobs=avg_logprobs)
+
+
+def incomplete(*fields):
+    return {**FAKE_VOLANTE_RESPONSE, **{field: None for field in fields}}
+
+
+def image_base64():
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), "white").save(buffer, "JPEG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def run_cascade(logger, responses, prompt=PROMPT, **cascade_options):
+    backend = TieredBackend(responses)
+    cascade = ModelCascade(logger, models=[CHEAP, STRONG], **cascade_options)
+    service = GeminiService(logger, backend=backend, cascade=cascade)
+    result = asyncio.run(service.process_image(image_base64(), prompt))
+    return result, backend.calls, {tier["model"]: tier for tier in cascade.stats()["tiers"]}
+
+
+def test_good_cheap_result_is_not_escalated(logger):
+    result, calls, tiers = run_cascade(logger, {
+        CHEAP: answer(incomplete("numero_autorizacion", "fecha_realizacion")),
+        STRONG: answer(FAKE_VOLANTE_RESPONSE),
+    })
+
+    # Un solo campo obligatorio a null: dentro de max_null_fields
+    assert calls == [CHEAP]
+    assert result["fecha_realizacion"] is None
+    assert tiers[CHEAP]["accepted"] == 1
+
+
+def test_null_required_fields_escalate_to_the_next_model(logger):
+    result, calls, tiers = run_cascade(logger, {
+        CHEAP: answer(incomplete("filiacion_asegurado", "numero_documento", "prescripcion")),
+        STRONG: answer(FAKE_VOLANTE_RESPONSE),
+    })
+
+    assert calls == [CHEAP, STRONG]
+    assert result == FAKE_VOLANTE_RESPONSE
+    assert tiers[CHEAP]["rejected"]["null_fields"] == 1
+    assert tiers[STRONG]["accepted"] == 1
+
+
+def test_errors_and_unparseable_answers_escalate(logger):
+    overloaded = genai_errors.ServerError(503, {"error": {"message": "overloaded", "status": "UNAVAILABLE"}})
+    result, calls, tiers = run_cascade(logger, {CHEAP: overloaded, STRONG: answer(FAKE_VOLANTE_RESPONSE)})
+    assert calls == [CHEAP, STRONG]
+    assert result == FAKE_VOLANTE_RESPONSE
+    assert tiers[CHEAP]["rejected"]["error"] == 1
+
+    result, calls, tiers = run_cascade(logger, {
+        CHEAP: answer("No puedo leer este documento"),
+        STRONG: answer(FAKE_VOLANTE_RESPONSE),
+    })
+    assert calls == [CHEAP, STRONG]
+    assert result == FAKE_VOLANTE_RESPONSE
+    assert tiers[CHEAP]["rejected"]["unparseable"] == 1
+
+
+def test_low_confidence_escalates_only_with_a_threshold(logger):
+    responses = {
+        CHEAP: answer(FAKE_VOLANTE_RESPONSE, avg_logprobs=-1.2),
+        STRONG: answer(FAKE_VOLANTE_RESPONSE, avg_logprobs=-0.1),
+    }
+
+    _, calls, _ = run_cascade(logger, responses, min_avg_logprobs=None)
+    assert calls == [CHEAP]
+
+    _, calls, tiers = run_cascade(logger, responses, min_avg_logprobs=-0.5)
+    assert calls == [CHEAP, STRONG]
+    assert tiers[CHEAP]["rejected"]["low_confidence"] == 1
+    assert tiers[CHEAP]["avg_logprobs"] == -1.2
+
+
+def test_last_tier_result_is_returned_even_if_rejected(logger):
+    poor = incomplete("filiacion_asegurado", "numero_documento", "prescripcion")
+    result, calls, tiers = run_cascade(logger, {CHEAP: answer(poor), STRONG: answer(poor)})
+
+    assert calls == [CHEAP, STRONG]
+    assert result == poor
+    assert tiers[STRONG]["rejected"]["null_fields"] == 1
+
+
+def test_custom_prompt_is_not_escalated_for_null_fields(logger):
+    custom = {"color": None, "texto": None, "firmas": None}
+    result, calls, _ = run_cascade(
+        logger,
+        {CHEAP: answer(custom), STRONG: answer(FAKE_VOLANTE_RESPONSE)},
+        prompt="Devuelve un JSON con color, texto y firmas",
+        required_fields=["color", "texto", "firmas"],
+    )
+
+    assert calls == [CHEAP]
+    assert result == custom
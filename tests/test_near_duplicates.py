@@ -0,0 +1,94 @@
+import asyncio
+import io
+
+from PIL import Image, ImageDraw
+
+from app.services.near_duplicates import Fingerprint, NearDuplicateIndex
+
+
+SCOPE = "volante-mapfre"
+
+
+def form_image(text, size=(800, 1100), quality=90):
+    """Volante sintetico: misma plantilla, cambia el texto escrito"""
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for y in range(50, size[1] - 100, 60):
+        draw.line((40, y, size[0] - 40, y), fill="black", width=2)
+    draw.rectangle((40, 40, size[0] - 40, 120), outline="black", width=4)
+    draw.text((60, 200), text, fill="black")
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+def make_index(logger, **kwargs):
+    options = {"max_distance": 24, "serve_max_distance": 4, "hash_size": 16, "serve": True}
+    options.update(kwargs)
+    return NearDuplicateIndex(logger, **options)
+
+
+def fingerprint(index, data):
+    return asyncio.run(index.fingerprint(data, "image/jpeg"))
+
+
+def test_recompressed_copy_can_be_served(logger):
+    index = make_index(logger)
+    index.add(fingerprint(index, form_image("Paciente: Ana Perez")), SCOPE, "result-1")
+
+    match = index.find(fingerprint(index, form_image("Paciente: Ana Perez", quality=60)), SCOPE)
+
+    assert match.result_key == "result-1"
+    assert match.same_size
+    assert index.can_serve(match)
+
+
+def test_same_template_with_another_size_is_not_served(logger):
+    index = make_index(logger)
+    index.add(fingerprint(index, form_image("Paciente: Ana Perez")), SCOPE, "result-1")
+
+    # Misma plantilla reescalada: se marca como duplicado, pero no se sirve
+    match = index.find(fingerprint(index, form_image("Paciente: Ana Perez", size=(820, 1128))), SCOPE)
+
+    assert match is not None
+    assert not match.same_size
+    assert not index.can_serve(match)
+    assert index.stats()["serve_rejected"] == 1
+
+
+def test_match_beyond_serve_distance_is_not_served(logger):
+    index = make_index(logger)
+    index.add(Fingerprint(value=0, size=(800, 1100)), SCOPE, "result-1")
+
+    near = index.find(Fingerprint(value=0b1111, size=(800, 1100)), SCOPE)
+    far = index.find(Fingerprint(value=0b11111, size=(800, 1100)), SCOPE)
+
+    assert (near.distance, far.distance) == (4, 5)
+    assert index.can_serve(near)
+    # Dentro de max_distance (se detecta) pero por encima de serve_max_distance
+    assert not index.can_serve(far)
+
+
+def test_nothing_is_served_when_serving_is_disabled(logger):
+    index = make_index(logger, serve=False)
+    index.add(Fingerprint(value=0, size=(800, 1100)), SCOPE, "result-1")
+
+    match = index.find(Fingerprint(value=0, size=(800, 1100)), SCOPE)
+
+    assert match.distance == 0
+    assert not index.can_serve(match)
+
+
+def test_scopes_are_kept_apart(logger):
+    index = make_index(logger)
+    value = fingerprint(index, form_image("Paciente: Ana Perez"))
+    index.add(value, SCOPE, "result-1")
+
+    # Otro prompt o modelo: el resultado anterior no sirve
+    assert index.find(value, "custom-prompt") is None
+
+    index.add(value, "custom-prompt", "result-2")
+    assert index.find(value, SCOPE).result_key == "result-1"
+    assert index.find(value, "custom-prompt").result_key == "result-2"
+    stats = index.stats()
+    assert (stats["entries"], stats["lookups"], stats["matches"]) == (2, 3, 2)
@@ -0,0 +1,66 @@
+import asyncio
+import base64
+import hashlib
+import os
+import threading
+from tempfile import SpooledTemporaryFile
+
+from app.services.payload import FilePayload
+
+
+class ThreadRecordingFile:
+    """Fichero que anota en que hilo se hace cada ``read``"""
+
+    def __init__(self, data):
+        self._file = SpooledTemporaryFile(max_size=1024)
+        self._file.write(data)
+        self._file.seek(0)
+        self.read_threads = set()
+
+    def seek(self, *args):
+        return self._file.seek(*args)
+
+    def read(self, *args):
+        self.read_threads.add(threading.get_ident())
+        return self._file.read(*args)
+
+
+def test_file_payload_hashes_and_loads_off_the_event_loop():
+    data = os.urandom(3 * 1024 * 1024 + 17)
+    upload = ThreadRecordingFile(data)
+    payload = FilePayload.from_file(upload, len(data), "application/pdf", "volante.pdf")
+
+    async def run():
+        loop_thread = threading.get_ident()
+        digest = await payload.load_sha256()
+        await payload.load()
+        return loop_thread, digest
+
+    loop_thread, digest = asyncio.run(run())
+
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert payload.decoded and payload.data == data
+    assert upload.read_threads and loop_thread not in upload.read_threads
+
+
+def test_file_payload_reads_only_header_and_tail():
+    data = b"%PDF-1.7\n" + os.urandom(100000) + b"%%EOF\n"
+    upload = ThreadRecordingFile(data)
+    payload = FilePayload.from_file(upload, len(data))
+
+    assert payload.size == len(data)
+    assert payload.header(16) == data[:16]
+    assert payload.tail(6) == b"%%EOF\n"
+    assert payload.file_type == "PDF"
+    assert not payload.decoded
+
+
+def test_base64_payload_matches_file_payload():
+    data = os.urandom(5000)
+    wrapped = base64.encodebytes(data).decode()
+    from_base64 = FilePayload.from_base64("data:image/png;base64," + wrapped)
+    from_file = FilePayload.from_file(ThreadRecordingFile(data), len(data))
+
+    assert from_base64.size == from_file.size == len(data)
+    assert from_base64.tail(10) == from_file.tail(10) == data[-10:]
+    assert from_base64.sha256 == asyncio.run(from_file.load_sha256())
@@ -0,0 +1,104 @@
+import asyncio
+import base64
+import io
+
+import pytest
+from google.genai import errors as genai_errors
+from PIL import Image
+
+from app.constants import ImagePrompts
+from app.services.ai_service import GeminiService
+from app.services.model_backends import FakeBackend
+from app.services.prompt_registry import PromptRegistry, is_cached_content_missing
+
+
+MODEL = "gemini-test"
+
+
+class CachedContentErrorBackend(FakeBackend):
+    """FakeBackend que rechaza las llamadas con ``cached_content`` con ``error``"""
+
+    def __init__(self, error):
+        super().__init__(latency_ms=0, latency_distribution="fixed", error_rate=0.0, rate_limit_rate=0.0)
+        self.error = error
+        self.cached_calls = 0
+        self.full_prompt_calls = 0
+
+    async def generate(self, model, contents, config):
+        if config.cached_content:
+            self.cached_calls += 1
+            raise self.error
+        self.full_prompt_calls += 1
+        return await super().generate(model, contents, config)
+
+
+def cached_content_missing(code=404, status="NOT_FOUND"):
+    return genai_errors.ClientError(
+        code, {"error": {"message": "CachedContent not found (or permission denied)", "status": status}}
+    )
+
+
+def image_base64():
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), "white").save(buffer, "JPEG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def make_service(logger, backend):
+    registry = PromptRegistry(logger, backend, MODEL, context_cache=True)
+    service = GeminiService(logger, backend=backend, prompt_registry=registry)
+    service.model_name = MODEL
+    return service
+
+
+async def process(service):
+    await service.prompt_registry.warm_up()
+    assert service.prompt_registry.stats()["context_cache_active"]
+    return await service.process_image(image_base64(), ImagePrompts.VOLANTE_MAPFRE_PROMPT)
+
+
+@pytest.mark.parametrize("code,status", [(404, "NOT_FOUND"), (403, "PERMISSION_DENIED")])
+def test_missing_cached_content_falls_back_to_full_prompt(logger, code, status):
+    backend = CachedContentErrorBackend(cached_content_missing(code, status))
+    service = make_service(logger, backend)
+
+    result = asyncio.run(process(service))
+
+    assert result["numero_documento"] == "12345678"
+    assert backend.cached_calls == 1
+    assert backend.full_prompt_calls == 1
+    # El registro vuelve al prompt completo hasta que se renueve la cache
+    assert not service.prompt_registry.stats()["context_cache_active"]
+    assert service.prompt_registry.stats()["context_cache_fallbacks"] == 1
+
+
+def test_other_client_errors_are_raised_without_touching_the_registry(logger):
+    error = genai_errors.ClientError(
+        400, {"error": {"message": "Unsupported MIME type", "status": "INVALID_ARGUMENT"}}
+    )
+    backend = CachedContentErrorBackend(error)
+    service = make_service(logger, backend)
+
+    with pytest.raises(genai_errors.ClientError):
+        asyncio.run(process(service))
+
+    assert backend.cached_calls == 1
+    assert backend.full_prompt_calls == 0
+    assert service.prompt_registry.stats()["context_cache_fallbacks"] == 0
+
+
+@pytest.mark.parametrize(
+    "error,expected",
+    [
+        (cached_content_missing(404, "NOT_FOUND"), True),
+        (cached_content_missing(403, "PERMISSION_DENIED"), True),
+        (genai_errors.ClientError(404, {"error": {"message": "cachedContents/abc not found"}}), True),
+        (genai_errors.ClientError(400, {"error": {"message": "CachedContent is invalid", "status": "INVALID_ARGUMENT"}}), False),
+        (genai_errors.ClientError(403, {"error": {"message": "API key not valid", "status": "PERMISSION_DENIED"}}), False),
+        (genai_errors.ClientError(429, {"error": {"message": "Quota", "status": "RESOURCE_EXHAUSTED"}}), False),
+        (genai_errors.ServerError(503, {"error": {"message": "CachedContent unavailable", "status": "UNAVAILABLE"}}), False),
+        (ValueError("cachedContent"), False),
+    ],
+)
+def test_is_cached_content_missing(error, expected):
+    assert is_cached_content_missing(error) is expected
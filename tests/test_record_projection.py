@@ -0,0 +1,98 @@
+import copy
+
+import pytest
+
+from app.services.record_projection import (
+    KINESIS_RECORD_PROJECTOR,
+    Projection,
+    RecordProjector,
+    compile_projection,
+)
+from benchmarks.kinesis_projection_bench import (
+    CLAIM_INFORMATION,
+    assembled_records,
+    call_output,
+    information_api,
+    legacy_process_kinesis_json,
+    legacy_project,
+    projected_process_kinesis_json,
+)
+
+
+def without(mapping, *path):
+    """Copia de ``mapping`` sin la clave de ``path`` (anidada)"""
+    result = copy.deepcopy(mapping)
+    target = result
+    for key in path[:-1]:
+        target = target[key]
+    target.pop(path[-1])
+    return result
+
+
+CLAIM_VARIANTS = {
+    "completo": CLAIM_INFORMATION,
+    "sin_direccion_siniestro": without(CLAIM_INFORMATION, "claimOcurrenceAddress"),
+    "sin_llamante": without(CLAIM_INFORMATION, "claimCaller"),
+    "sin_correspondencia": without(CLAIM_INFORMATION, "correspondence"),
+    "correspondencia_sin_direccion": without(CLAIM_INFORMATION, "correspondence", "address"),
+    "direccion_incompleta": without(CLAIM_INFORMATION, "correspondence", "address", "zipCode"),
+    "claves_extra": {**CLAIM_INFORMATION, "extra": {"nested": [1, 2]}},
+    "vacio": {},
+}
+
+
+@pytest.mark.parametrize("variant", CLAIM_VARIANTS)
+def test_projection_matches_legacy_process_kinesis_json(variant):
+    record = {**call_output(), "control_group": 1, "claim_information": CLAIM_VARIANTS[variant]}
+
+    projected = KINESIS_RECORD_PROJECTOR(copy.deepcopy(record))
+
+    assert projected == legacy_project(copy.deepcopy(record))
+
+
+@pytest.mark.parametrize("missing", ["callId", "second_time", "datetime", "claim_information"])
+def test_defaults_match_legacy_when_top_level_keys_are_missing(missing):
+    record = without({**call_output(), "claim_information": CLAIM_INFORMATION}, missing)
+
+    assert KINESIS_RECORD_PROJECTOR(copy.deepcopy(record)) == legacy_project(copy.deepcopy(record))
+
+
+def test_full_process_kinesis_json_matches_legacy():
+    assert projected_process_kinesis_json(call_output(), information_api(), 1) == (
+        legacy_process_kinesis_json(call_output(), information_api(), 1)
+    )
+
+
+def test_many_matches_one_by_one():
+    records = assembled_records(20)
+    assert KINESIS_RECORD_PROJECTOR.many(copy.deepcopy(records)) == [
+        legacy_project(record) for record in records
+    ]
+
+
+def test_projection_does_not_modify_input_or_share_defaults():
+    record = {**call_output(), "claim_information": copy.deepcopy(CLAIM_INFORMATION)}
+    original = copy.deepcopy(record)
+
+    first = KINESIS_RECORD_PROJECTOR(record)
+    second = KINESIS_RECORD_PROJECTOR({})
+    second["claim_information"]["claimCaller"]["relationshipCode"] = "CAMBIADO"
+
+    assert record == original
+    assert "contactName" not in first["claim_information"]["claimCaller"]
+    assert KINESIS_RECORD_PROJECTOR({})["claim_information"]["claimCaller"]["relationshipCode"] == ""
+
+
+def test_only_and_required_children():
+    project = compile_projection(Projection(
+        defaults={"list": []},
+        drop=("secret",),
+        children={"address": Projection(only={"zip": "", "town": ""}, required=True)},
+    ))
+
+    projected = project({"secret": 1, "keep": 2, "address": {"zip": "28013", "street": "Mayor"}})
+
+    assert projected == {"list": [], "keep": 2, "address": {"zip": "28013", "town": ""}}
+    assert project({})["address"] == {"zip": "", "town": ""}
+    assert project({})["list"] is not project({})["list"]
+    assert RecordProjector(Projection()).many([{"a": 1}]) == [{"a": 1}]
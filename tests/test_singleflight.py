@@ -0,0 +1,86 @@
+import asyncio
+import base64
+import io
+
+from PIL import Image
+
+from app.routers.agent import BatchImageRequest, process_batch
+from app.services.ai_service import GeminiService
+from app.services.model_backends import FakeBackend
+from app.services.singleflight import SingleFlight
+
+
+class CountingBackend(FakeBackend):
+    """FakeBackend que cuenta las llamadas empezadas y las que siguen en curso"""
+
+    def __init__(self, latency_ms):
+        super().__init__(latency_ms=latency_ms, latency_distribution="fixed", error_rate=0.0, rate_limit_rate=0.0)
+        self.started = 0
+        self.in_flight = 0
+
+    async def generate(self, model, contents, config):
+        self.started += 1
+        self.in_flight += 1
+        try:
+            return await super().generate(model, contents, config)
+        finally:
+            self.in_flight -= 1
+
+
+def image_base64(color):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, "JPEG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def test_cancelled_batch_leaves_no_backend_calls_running(logger):
+    backend = CountingBackend(latency_ms=2000)
+    single_flight = SingleFlight(logger)
+    service = GeminiService(logger, backend=backend, single_flight=single_flight)
+    # Documentos repetidos: varias peticiones esperan la misma llamada
+    request = BatchImageRequest(items=[
+        {"file_base64": image_base64(color)} for color in ("white", "white", "black", "black", "red")
+    ])
+
+    async def run():
+        response = await process_batch(request, service)
+        first_line = asyncio.ensure_future(response.body_iterator.__anext__())
+        await asyncio.sleep(0.1)
+        assert backend.in_flight == 3
+        # Desconexion del cliente: se cierra el stream con el lote a medias
+        first_line.cancel()
+        await asyncio.gather(first_line, return_exceptions=True)
+        await response.body_iterator.aclose()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+
+    assert backend.started == 3
+    assert backend.in_flight == 0
+    assert single_flight.stats()["in_flight"] == 0
+    assert single_flight.stats()["abandoned"] == 3
+
+
+def test_call_continues_while_another_waiter_remains(logger):
+    single_flight = SingleFlight(logger)
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"value": 1}
+
+    async def run():
+        leader = asyncio.ensure_future(single_flight.do("key", call))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(single_flight.do("key", call))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        return await follower, leader
+
+    result, leader = asyncio.run(run())
+
+    assert leader.cancelled()
+    assert result == {"value": 1}
+    assert len(calls) == 1
+    assert single_flight.stats()["abandoned"] == 0
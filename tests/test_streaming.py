@@ -0,0 +1,104 @@
+import asyncio
+import base64
+import io
+import json
+
+from PIL import Image
+
+from app.constants import ImagePrompts
+from app.routers.agent import ImageRequest, process_image_stream
+from app.services.ai_service import GeminiService
+from app.services.cache_service import ExtractionCache
+from app.services.model_backends import FAKE_VOLANTE_RESPONSE, FakeBackend
+
+
+PROMPT = ImagePrompts.VOLANTE_MAPFRE_PROMPT
+
+
+def image_base64(color="white"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32), color).save(buffer, "JPEG")
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def make_service(logger, latency_ms, **kwargs):
+    backend = FakeBackend(latency_ms=latency_ms, latency_distribution="fixed", error_rate=0.0, rate_limit_rate=0.0)
+    return GeminiService(logger, backend=backend, **kwargs)
+
+
+def parse_sse(body):
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def test_fields_are_emitted_before_the_response_is_complete(logger):
+    service = make_service(logger, latency_ms=600)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        events = []
+        async for event, data in service.process_image_stream(image_base64(), PROMPT):
+            events.append((loop.time() - started, event, data))
+        return events
+
+    events = asyncio.run(run())
+
+    fields = [(elapsed, data) for elapsed, event, data in events if event == "field"]
+    result_elapsed, last_event, result = events[-1]
+    assert last_event == "result"
+    assert result == FAKE_VOLANTE_RESPONSE
+    # Cada campo sale en cuanto se completa, en el orden en que lo escribe el modelo
+    assert [data["name"] for _, data in fields] == list(FAKE_VOLANTE_RESPONSE)
+    assert {data["name"]: data["value"] for _, data in fields} == FAKE_VOLANTE_RESPONSE
+    assert fields[0][0] < 0.5 * result_elapsed
+    assert len({round(elapsed, 2) for elapsed, _ in fields}) > 3
+
+
+def test_sse_endpoint_sends_field_events_and_a_final_result(logger):
+    service = make_service(logger, latency_ms=20)
+
+    async def run():
+        response = await process_image_stream(ImageRequest(file_base64=image_base64()), service)
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    events = parse_sse(asyncio.run(run()))
+
+    assert [event for event, _ in events] == ["field"] * len(FAKE_VOLANTE_RESPONSE) + ["result"]
+    assert events[0][1] == {
+        "name": "filiacion_asegurado",
+        "value": FAKE_VOLANTE_RESPONSE["filiacion_asegurado"],
+    }
+    assert events[-1][1]["extracted_data"]["numero_documento"] == "12345678"
+
+
+def test_cache_hit_replays_the_fields(logger):
+    service = make_service(logger, latency_ms=20, cache=ExtractionCache(logger, disk_path=None))
+
+    async def run():
+        return [
+            [event async for event in service.process_image_stream(image_base64(), PROMPT)]
+            for _ in range(2)
+        ]
+
+    first, second = asyncio.run(run())
+
+    assert first == second
+    assert service.cache.stats()["memory_hits"] == 1
+
+
+def test_backend_failure_is_sent_as_an_error_event(logger):
+    backend = FakeBackend(latency_ms=0, latency_distribution="fixed", error_rate=1.0, rate_limit_rate=0.0)
+    service = GeminiService(logger, backend=backend)
+
+    async def run():
+        response = await process_image_stream(ImageRequest(file_base64=image_base64()), service)
+        return "".join([chunk async for chunk in response.body_iterator])
+
+    events = parse_sse(asyncio.run(run()))
+
+    assert [event for event, _ in events] == ["error"]
+    assert events[0][1]["status_code"] in (500, 503)